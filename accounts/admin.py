@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Wallet, WalletTransaction, MarketplaceWallet, MarketplaceTransaction
+from .models import User, Wallet, WalletTransaction, WalletSnapshot, MarketplaceWallet, MarketplaceTransaction
 
 
 @admin.register(User)
@@ -31,10 +31,11 @@ class WalletAdmin(admin.ModelAdmin):
     """
     Admin for Wallet model
     """
-    list_display = ('user', 'balance', 'created_at', 'updated_at')
+    list_display = ('user', 'balance', 'total_credits', 'total_debits', 'created_at', 'updated_at')
     list_filter = ('created_at', 'updated_at')
     search_fields = ('user__username', 'user__email')
-    readonly_fields = ('created_at', 'updated_at')
+    # Balances only change through ledger postings
+    readonly_fields = ('balance', 'total_credits', 'total_debits', 'created_at', 'updated_at')
     ordering = ('-updated_at',)
     
     def has_add_permission(self, request):
@@ -47,17 +48,38 @@ class WalletTransactionAdmin(admin.ModelAdmin):
     """
     Admin for WalletTransaction model
     """
-    list_display = ('wallet', 'transaction_type', 'amount', 'description', 'date')
+    list_display = ('wallet', 'transaction_type', 'amount', 'balance_after', 'description', 'date')
     list_filter = ('transaction_type', 'date')
-    search_fields = ('wallet__user__username', 'description')
+    search_fields = ('wallet__user__username', 'description', 'posting')
     readonly_fields = ('date',)
     ordering = ('-date',)
     
+    def has_add_permission(self, request):
+        # Entries are posted through the ledger, which keeps balances in step
+        return False
+    
     def has_change_permission(self, request, obj=None):
         # Transactions should not be editable once created
         return False
 
 
+@admin.register(WalletSnapshot)
+class WalletSnapshotAdmin(admin.ModelAdmin):
+    """
+    Admin for WalletSnapshot model
+    """
+    list_display = ('wallet', 'balance', 'total_credits', 'total_debits', 'through', 'taken_at')
+    search_fields = ('wallet__user__username',)
+    ordering = ('-taken_at',)
+    
+    def has_add_permission(self, request):
+        # Snapshots are taken by snapshot_wallets
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(MarketplaceWallet)
 class MarketplaceWalletAdmin(admin.ModelAdmin):
     """
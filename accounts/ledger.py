@@ -0,0 +1,99 @@
+"""
+Wallet ledger.
+
+WalletTransaction is an append-only journal: rows are only ever inserted,
+through post(). A posting is a set of legs (debits and credits) that is
+written atomically and shares one posting id; for a purchase the buyer's
+debit equals the vendors' credits plus the marketplace commission recorded
+in MarketplaceTransaction under the same order. Deposits and withdrawals
+are single legs against money entering or leaving the platform.
+
+post() locks the affected wallet rows in primary key order, so concurrent
+postings to the same wallets queue instead of losing updates or
+deadlocking, and stores on every leg the wallet balance after it. The
+wallet row carries the current balance and lifetime credit/debit totals,
+and WalletSnapshot checkpoints them periodically (snapshot_wallets), so
+balances, totals and statements are read without summing the journal.
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, DecimalField
+from django.utils import timezone
+
+from .models import Wallet, WalletTransaction
+
+
+class InsufficientFunds(Exception):
+    """
+    A debit leg would take a wallet below zero; nothing was posted
+    """
+
+    def __init__(self, wallet, amount):
+        super().__init__(f'Insufficient balance. Required: ${amount}, Available: ${wallet.balance}')
+        self.wallet = wallet
+        self.amount = amount
+
+
+def _per_wallet(deltas):
+    return Case(
+        *[When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()],
+        default=Value(Decimal('0.00')),
+        output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+
+
+def post(legs):
+    """
+    Post legs of (wallet_id, transaction_type, amount, description) as one
+    posting and return the created transactions. Raises InsufficientFunds if
+    a debit exceeds the balance at that point.
+    """
+    legs = [(wallet_id, kind, Decimal(str(amount)), description) for wallet_id, kind, amount, description in legs]
+    posting = uuid.uuid4()
+
+    shortfall = None
+    # No savepoint: a shortfall is found before anything is written and is
+    # raised only after the block, so a caller's transaction stays usable
+    with transaction.atomic(savepoint=False):
+        wallets = {
+            wallet.pk: wallet
+            for wallet in Wallet.objects.select_for_update().filter(
+                pk__in={leg[0] for leg in legs}).order_by('pk')
+        }
+        balances = {pk: wallet.balance for pk, wallet in wallets.items()}
+        credits = dict.fromkeys(wallets, Decimal('0.00'))
+        debits = dict.fromkeys(wallets, Decimal('0.00'))
+        entries = []
+        for wallet_id, kind, amount, description in legs:
+            if kind == 'debit':
+                if balances[wallet_id] < amount:
+                    shortfall = InsufficientFunds(wallets[wallet_id], amount)
+                    break
+                balances[wallet_id] -= amount
+                debits[wallet_id] += amount
+            else:
+                balances[wallet_id] += amount
+                credits[wallet_id] += amount
+            entries.append(WalletTransaction(
+                wallet_id=wallet_id,
+                transaction_type=kind,
+                amount=amount,
+                description=description,
+                balance_after=balances[wallet_id],
+                posting=posting
+            ))
+
+        if shortfall is None:
+            Wallet.objects.filter(pk__in=wallets).update(
+                balance=F('balance') + _per_wallet({pk: credits[pk] - debits[pk] for pk in wallets}),
+                total_credits=F('total_credits') + _per_wallet(credits),
+                total_debits=F('total_debits') + _per_wallet(debits),
+                updated_at=timezone.now(),
+            )
+            WalletTransaction.objects.bulk_create(entries)
+
+    if shortfall is not None:
+        raise shortfall
+    return entries
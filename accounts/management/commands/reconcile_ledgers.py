@@ -0,0 +1,85 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from accounts import reconcile
+
+
+REPORT_FIELDS = ['ledger', 'wallet_id', 'username', 'field', 'stored', 'ledger_value']
+
+
+class Command(BaseCommand):
+    help = 'Checks stored wallet and marketplace balances against their transaction ledgers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (1 runs in this process)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Wallet ids per unit of work',
+        )
+        parser.add_argument(
+            '--report',
+            help='Also write the discrepancies to this CSV file',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        started = time.monotonic()
+        ranges = reconcile.wallet_id_ranges(options['chunk_size'])
+        workers = max(1, min(options['workers'], len(ranges)))
+
+        if workers == 1:
+            results = map(reconcile.reconcile_wallets, ranges)
+            totals = self.collect(results, len(ranges))
+        else:
+            # Workers must open their own connections, not share this one
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=reconcile.init_worker) as pool:
+                totals = self.collect(pool.map(reconcile.reconcile_wallets, ranges), len(ranges))
+        wallets_elapsed = time.monotonic() - started
+
+        marketplace = reconcile.reconcile_marketplace()
+        discrepancies = totals['discrepancies'] + marketplace['discrepancies']
+        elapsed = time.monotonic() - started
+
+        for row in discrepancies:
+            owner = f" ({row['username']})" if row['username'] else ''
+            self.stdout.write(self.style.WARNING(
+                f"{row['ledger'].title()} wallet #{row['wallet_id']}{owner}: "
+                f"{row['field']} stored ${row['stored']}, ledger ${row['ledger_value']}"
+            ))
+        if options['report']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.DictWriter(report, fieldnames=REPORT_FIELDS)
+                writer.writeheader()
+                writer.writerows(discrepancies)
+
+        rate = totals['transactions'] / wallets_elapsed if wallets_elapsed else 0
+        self.stdout.write(
+            f"Checked {totals['wallets']} wallets and {totals['transactions']} wallet transactions "
+            f"in {len(ranges)} chunks on {workers} worker(s): {wallets_elapsed:.1f}s, {rate:,.0f} transactions/s. "
+            f"Checked {marketplace['transactions']} marketplace transactions; {elapsed:.1f}s in total."
+        )
+        if discrepancies:
+            raise CommandError(f'{len(discrepancies)} discrepancies found.')
+        self.stdout.write(self.style.SUCCESS('Ledgers reconcile.'))
+
+    def collect(self, results, chunks):
+        totals = {'wallets': 0, 'transactions': 0, 'discrepancies': []}
+        for done, result in enumerate(results, 1):
+            totals['wallets'] += result['wallets']
+            totals['transactions'] += result['transactions']
+            totals['discrepancies'].extend(result['discrepancies'])
+            if self.verbosity > 1:
+                self.stdout.write(f'{done}/{chunks} chunks reconciled')
+        return totals
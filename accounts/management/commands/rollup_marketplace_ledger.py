@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.models import MarketplaceWallet
+
+
+class Command(BaseCommand):
+    help = 'Folds new marketplace transactions into the marketplace wallet balance snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and roll up every N seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            wallet = MarketplaceWallet.get_instance()
+            rolled_up = wallet.rollup()
+            if not rolled_up:
+                self.stdout.write('No new marketplace transactions.')
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Rolled up {rolled_up} transaction(s): '
+                    f'balance ${wallet.balance}, commission earned ${wallet.total_commission_earned}'
+                ))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts import sessions
+
+
+class Command(BaseCommand):
+    help = 'Shows how many session saves were written to the database and how many were skipped'
+
+    def handle(self, *args, **options):
+        counters = sessions.stats()
+        self.stdout.write(
+            f"Flushes: {counters['flushes']}  Skips: {counters['skips']}  "
+            f"Skip rate: {counters['skip_rate']:.1%}"
+        )
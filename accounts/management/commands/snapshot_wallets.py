@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.models import WalletSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Checkpoints wallet balances and credit/debit totals for statements'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and take snapshots every N seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            taken = WalletSnapshot.take()
+            if taken:
+                self.stdout.write(self.style.SUCCESS(f'Snapshotted {taken} wallet(s).'))
+            else:
+                self.stdout.write('No wallet activity since the last snapshot.')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,135 @@
+"""
+Authentication middleware with a shared user cache.
+
+Drop-in replacement for django.contrib.auth's AuthenticationMiddleware: the
+fields of the session's user that every page reads (username, names, role,
+flags) are kept in the cache together with the user's session auth hash, so
+authenticated page views normally resolve request.user without a query.
+The password hash and the wallet are never cached; request.user.wallet is
+loaded fresh on each request, and any other field loads on first access.
+
+Entries live for AUTH_USER_CACHE_TIMEOUT seconds only, so changes made with
+QuerySet.update() (deactivation, role changes) take effect within that time;
+User saves drop the entry at once. The cache is only used when it is shared
+between workers (AUTH_USER_CACHE, by default on for anything but the local
+memory and dummy backends), otherwise one worker's invalidation would leave
+the others serving stale users.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, load_backend
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import User
+
+
+# In model field order, as Model.from_db expects
+CACHED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in {
+        'id', 'username', 'first_name', 'last_name', 'email', 'role',
+        'is_active', 'is_staff', 'is_superuser', 'date_joined', 'created_at',
+    }
+)
+
+
+def _cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def cache_enabled():
+    enabled = getattr(settings, 'AUTH_USER_CACHE', None)
+    if enabled is None:
+        # Per-process caches cannot be invalidated from other workers
+        return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+    return enabled
+
+
+def invalidate_users(user_ids):
+    """
+    Forget cached users, e.g. after they were changed without a save()
+    """
+    if cache_enabled():
+        cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def _load_user(backend, user_id):
+    """
+    Return (user, session auth hash); cached users carry only CACHED_FIELDS,
+    the rest are deferred
+    """
+    if not isinstance(backend, ModelBackend) or not cache_enabled():
+        user = backend.get_user(user_id)
+        return user, getattr(user, 'get_session_auth_hash', lambda: None)()
+
+    key = _cache_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        try:
+            user = User._default_manager.get(pk=user_id)
+        except User.DoesNotExist:
+            return None, None
+        entry = {
+            'fields': [getattr(user, field) for field in CACHED_FIELDS],
+            'session_auth_hash': user.get_session_auth_hash(),
+        }
+        cache.set(key, entry, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+    # from_db marks the other fields deferred, so a save() of this instance
+    # writes only these fields and never blanks the password
+    user = User.from_db(User._default_manager.db, CACHED_FIELDS, entry['fields'])
+    if not backend.user_can_authenticate(user):
+        return None, None
+    return user, entry['session_auth_hash']
+
+
+def get_user(request):
+    """
+    django.contrib.auth.get_user, loading the user through the cache
+    """
+    user = None
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend_path = request.session[BACKEND_SESSION_KEY]
+    except KeyError:
+        pass
+    else:
+        if backend_path in settings.AUTHENTICATION_BACKENDS:
+            user, session_auth_hash = _load_user(load_backend(backend_path), user_id)
+            # Verify the session against the (possibly cached) session auth hash
+            if session_auth_hash is not None:
+                session_hash = request.session.get(HASH_SESSION_KEY)
+                if not (session_hash and constant_time_compare(session_hash, session_auth_hash)):
+                    if session_hash and any(
+                        constant_time_compare(session_hash, fallback_auth_hash)
+                        for fallback_auth_hash in user.get_session_auth_fallback_hash()
+                    ):
+                        request.session.cycle_key()
+                        request.session[HASH_SESSION_KEY] = session_auth_hash
+                    else:
+                        request.session.flush()
+                        user = None
+
+    return user or AnonymousUser()
+
+
+def _get_cached_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    AuthenticationMiddleware that resolves request.user through the cache
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_cached_user(request))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:45
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def mark_existing_transactions_rolled_up(apps, schema_editor):
+    # Existing balances were updated in place at checkout, so they already
+    # include every transaction recorded so far
+    MarketplaceTransaction = apps.get_model('accounts', 'MarketplaceTransaction')
+    MarketplaceTransaction.objects.update(rolled_up=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_marketplacetransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='marketplacewallet',
+            name='rolled_up_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='marketplacetransaction',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_existing_transactions_rolled_up, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='marketplacetransaction',
+            index=models.Index(condition=Q(rolled_up=False), fields=['marketplace_wallet'], name='marketplace_txn_pending'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:01
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def fill_running_balances(apps, schema_editor):
+    # Totals from the journal; running balances start from whatever part of
+    # the stored balance predates it, so current balances are unchanged
+    Wallet = apps.get_model('accounts', 'Wallet')
+    WalletTransaction = apps.get_model('accounts', 'WalletTransaction')
+    for wallet in Wallet.objects.iterator():
+        entries = list(wallet.transactions.order_by('date', 'id'))
+        credits = sum((e.amount for e in entries if e.transaction_type == 'credit'), Decimal('0.00'))
+        debits = sum((e.amount for e in entries if e.transaction_type == 'debit'), Decimal('0.00'))
+        running = wallet.balance - credits + debits
+        for entry in entries:
+            running += entry.amount if entry.transaction_type == 'credit' else -entry.amount
+            entry.balance_after = running
+            entry.posting = uuid.uuid4()
+        WalletTransaction.objects.bulk_update(entries, ['balance_after', 'posting'], batch_size=1000)
+        Wallet.objects.filter(pk=wallet.pk).update(total_credits=credits, total_debits=debits)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_marketplace_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('through', models.BigIntegerField(help_text='Last transaction id included in the snapshot')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('total_credits', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total_debits', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('taken_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='total_credits',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='total_debits',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='balance_after',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='wallettransaction',
+            name='posting',
+            field=models.UUIDField(db_index=True, default=uuid.uuid4, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransaction',
+            index=models.Index(fields=['wallet', 'date'], name='accounts_wa_wallet__2ac325_idx'),
+        ),
+        migrations.AddField(
+            model_name='walletsnapshot',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='accounts.wallet'),
+        ),
+        migrations.RunPython(fill_running_balances, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='walletsnapshot',
+            index=models.Index(fields=['wallet', 'taken_at'], name='accounts_wa_wallet__d2a72b_idx'),
+        ),
+    ]
@@ -1,7 +1,13 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Sum, Max, Q
 from django.utils import timezone
 from decimal import Decimal
+import uuid
+
+
+# Marketplace transactions folded per statement by MarketplaceWallet.rollup
+ROLLUP_BATCH_SIZE = 5000
 
 
 class User(AbstractUser):
@@ -33,16 +39,37 @@ class User(AbstractUser):
         return self.role == 'admin'
 
 
+class WalletManager(models.Manager):
+    def for_user(self, user):
+        """
+        Return the user's wallet, creating it on first use.
+        This is the only place wallets are provisioned; concurrent first uses
+        resolve to the same row through get_or_create.
+        """
+        try:
+            return user.wallet
+        except Wallet.DoesNotExist:
+            pass
+        wallet, created = self.get_or_create(user=user)
+        user.wallet = wallet
+        return wallet
+
+
 class Wallet(models.Model):
     """
     Wallet model for dummy payment system
-    Each user has one wallet
+    Each user has one wallet. balance and the lifetime totals are kept in
+    step with the WalletTransaction journal by accounts.ledger.post().
     """
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='wallet')
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    total_credits = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
+    total_debits = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = WalletManager()
+    
     def __str__(self):
         return f"{self.user.username}'s Wallet - Balance: ${self.balance}"
     
@@ -51,26 +78,85 @@ class Wallet(models.Model):
         amount = Decimal(str(amount))
         return self.balance >= amount
     
-    def add_money(self, amount):
-        """Add money to wallet"""
+    def _post(self, transaction_type, amount, description):
+        from .ledger import post
+        entry, = post([(self.pk, transaction_type, amount, description)])
+        self.balance = entry.balance_after
+        if transaction_type == 'credit':
+            self.total_credits += entry.amount
+        else:
+            self.total_debits += entry.amount
+        return entry
+    
+    def add_money(self, amount, description=None):
+        """Credit the wallet through the ledger"""
         amount = Decimal(str(amount))
-        self.balance += amount
-        self.save()
+        self._post('credit', amount, description or f'Added ${amount} to wallet')
         return self.balance
     
-    def deduct_money(self, amount):
-        """Deduct money from wallet if sufficient balance"""
+    def deduct_money(self, amount, description=None):
+        """Debit the wallet through the ledger if the locked balance covers it"""
+        from .ledger import InsufficientFunds
         amount = Decimal(str(amount))
-        if self.can_deduct(amount):
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+        try:
+            self._post('debit', amount, description or f'Deducted ${amount} from wallet')
+        except InsufficientFunds as e:
+            self.balance = e.wallet.balance
+            return False
+        return True
+    
+    def totals_at(self, moment):
+        """
+        Balance and credit/debit totals as of moment: the latest snapshot
+        taken before it plus the few transactions posted in between
+        """
+        snapshot = self.snapshots.filter(taken_at__lte=moment).order_by('-taken_at').first()
+        transactions = self.transactions.filter(date__lt=moment)
+        if snapshot is not None:
+            transactions = transactions.filter(id__gt=snapshot.through)
+        pending = transactions.aggregate(
+            credits=Sum('amount', filter=Q(transaction_type='credit')),
+            debits=Sum('amount', filter=Q(transaction_type='debit')),
+        )
+        credits = pending['credits'] or Decimal('0.00')
+        debits = pending['debits'] or Decimal('0.00')
+        if snapshot is not None:
+            credits += snapshot.total_credits
+            debits += snapshot.total_debits
+        return {
+            'balance': credits - debits + self.opening_balance(),
+            'total_credits': credits,
+            'total_debits': debits,
+        }
+    
+    def opening_balance(self):
+        """Balance not explained by the journal (pre-ledger wallets)"""
+        return self.balance - self.total_credits + self.total_debits
+    
+    def statement(self, start, end=None):
+        """Opening/closing balance and credits/debits for [start, end)"""
+        opening = self.totals_at(start)
+        if end is None:
+            closing = {
+                'balance': self.balance,
+                'total_credits': self.total_credits,
+                'total_debits': self.total_debits,
+            }
+        else:
+            closing = self.totals_at(end)
+        return {
+            'opening_balance': opening['balance'],
+            'closing_balance': closing['balance'],
+            'credits': closing['total_credits'] - opening['total_credits'],
+            'debits': closing['total_debits'] - opening['total_debits'],
+        }
 
 
 class WalletTransaction(models.Model):
     """
-    Track all wallet transactions
+    Append-only wallet journal, written only through accounts.ledger.post()
+    balance_after is the wallet balance once this entry was applied; legs
+    of one posting share the posting id.
     """
     TRANSACTION_TYPES = [
         ('credit', 'Credit'),
@@ -81,6 +167,8 @@ class WalletTransaction(models.Model):
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255, blank=True, null=True)
+    balance_after = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    posting = models.UUIDField(default=uuid.uuid4, editable=False, db_index=True)
     date = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
@@ -88,28 +176,131 @@ class WalletTransaction(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['wallet', 'date']),
+        ]
+
+
+class WalletSnapshot(models.Model):
+    """
+    Periodic checkpoint of a wallet's balance and lifetime totals, taken by
+    snapshot_wallets. through is the last transaction id it includes.
+    """
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='snapshots')
+    through = models.BigIntegerField(help_text="Last transaction id included in the snapshot")
+    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    total_credits = models.DecimalField(max_digits=12, decimal_places=2)
+    total_debits = models.DecimalField(max_digits=12, decimal_places=2)
+    taken_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'taken_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.wallet.user.username} @ {self.taken_at:%Y-%m-%d %H:%M} - ${self.balance}"
+    
+    @classmethod
+    def take(cls):
+        """
+        Snapshot every wallet with transactions since its last snapshot.
+        Wallets are locked while read so no posting lands in between.
+        Returns the number of snapshots written.
+        """
+        snapshotted = dict(
+            cls.objects.order_by().values_list('wallet').annotate(through=Max('through'))
+        )
+        with transaction.atomic():
+            # Lock first, then read the last ids: no posting can slip in between
+            wallets = list(Wallet.objects.select_for_update().order_by('pk'))
+            last_ids = dict(
+                WalletTransaction.objects.order_by().values_list('wallet').annotate(last=Max('id'))
+            )
+            wallets = [wallet for wallet in wallets if last_ids.get(wallet.pk, 0) > snapshotted.get(wallet.pk, 0)]
+            now = timezone.now()
+            snapshots = [
+                cls(
+                    wallet=wallet,
+                    through=last_ids[wallet.pk],
+                    balance=wallet.balance,
+                    total_credits=wallet.total_credits,
+                    total_debits=wallet.total_debits,
+                    taken_at=now
+                )
+                for wallet in wallets
+            ]
+            cls.objects.bulk_create(snapshots)
+        return len(snapshots)
 
 
 class MarketplaceWallet(models.Model):
     """
     Marketplace commission wallet - tracks platform earnings
+    Commissions are appended to MarketplaceTransaction; balance and
+    total_commission_earned are a snapshot rolled up periodically
+    (see rollup_marketplace_ledger) from the rows not yet marked rolled_up.
     """
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     total_commission_earned = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0.00'))
     commission_rate = models.DecimalField(max_digits=5, decimal_places=4, default=Decimal('0.0800'))  # 8%
+    rolled_up_at = models.DateTimeField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Marketplace Wallet - Balance: ${self.balance}"
     
-    def add_commission(self, amount):
-        """Add commission to marketplace wallet"""
-        amount = Decimal(str(amount))
-        self.balance += amount
-        self.total_commission_earned += amount
-        self.save()
-        return self.balance
+    @staticmethod
+    def _totals(transactions):
+        totals = transactions.aggregate(
+            commission=Sum('amount', filter=Q(transaction_type='commission')),
+            outgoing=Sum('amount', filter=Q(transaction_type__in=['expense', 'withdrawal'])),
+        )
+        commission = totals['commission'] or Decimal('0.00')
+        outgoing = totals['outgoing'] or Decimal('0.00')
+        return {
+            'balance': commission - outgoing,
+            'total_commission_earned': commission,
+        }
+    
+    def pending_totals(self):
+        """Sum transactions not yet rolled into the snapshot"""
+        return self._totals(self.transactions.filter(rolled_up=False))
+    
+    def live_totals(self):
+        """Snapshot plus the delta appended since the last rollup"""
+        pending = self.pending_totals()
+        return {
+            'balance': self.balance + pending['balance'],
+            'total_commission_earned': self.total_commission_earned + pending['total_commission_earned'],
+        }
+    
+    def rollup(self):
+        """
+        Fold appended transactions into the snapshot columns and return how
+        many were folded. Rows are picked by id and marked rolled_up in the
+        same transaction, so a row committed while this runs is simply left
+        for the next rollup; ids are not commit-ordered and are no watermark.
+        """
+        rolled_up = 0
+        with transaction.atomic():
+            wallet = MarketplaceWallet.objects.select_for_update().get(pk=self.pk)
+            while True:
+                ids = list(wallet.transactions.filter(rolled_up=False)
+                           .order_by('id').values_list('id', flat=True)[:ROLLUP_BATCH_SIZE])
+                if not ids:
+                    break
+                batch = MarketplaceTransaction.objects.filter(id__in=ids)
+                pending = self._totals(batch)
+                batch.update(rolled_up=True)
+                wallet.balance += pending['balance']
+                wallet.total_commission_earned += pending['total_commission_earned']
+                rolled_up += len(ids)
+            wallet.rolled_up_at = timezone.now()
+            wallet.save()
+        self.refresh_from_db()
+        return rolled_up
     
     def calculate_commission(self, amount):
         """Calculate commission from vendor payment"""
@@ -149,6 +340,8 @@ class MarketplaceTransaction(models.Model):
     description = models.CharField(max_length=255)
     related_order_id = models.CharField(max_length=100, blank=True, null=True)
     vendor_username = models.CharField(max_length=150, blank=True, null=True)
+    # Set once the row is folded into the MarketplaceWallet snapshot
+    rolled_up = models.BooleanField(default=False)
     date = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
@@ -156,3 +349,7 @@ class MarketplaceTransaction(models.Model):
     
     class Meta:
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['marketplace_wallet'], condition=Q(rolled_up=False),
+                         name='marketplace_txn_pending'),
+        ]
@@ -0,0 +1,126 @@
+"""
+Ledger reconciliation.
+
+Checks that the balances and totals stored on wallets agree with the
+journals they are derived from. Wallets are checked in id ranges so the
+work can be spread over a process pool (see reconcile_ledgers); each range
+is one aggregate query, streamed from a server-side cursor, in which the
+database sums every wallet's credits and debits and picks its latest
+running balance, so no transaction row is ever loaded into Python.
+"""
+from decimal import Decimal
+
+import django
+from django.db.models import Sum, Count, Min, Max, Q, OuterRef, Subquery
+
+from .models import Wallet, WalletTransaction, MarketplaceWallet
+
+
+ZERO = Decimal('0.00')
+
+
+def init_worker():
+    """
+    Process pool initializer; a no-op for forked workers, needed for spawned ones
+    """
+    django.setup()
+
+
+def wallet_id_ranges(chunk_size):
+    """
+    Split the wallet id space into inclusive (first, last) ranges
+    """
+    bounds = Wallet.objects.order_by().aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return []
+    return [
+        (first, min(first + chunk_size - 1, bounds['last']))
+        for first in range(bounds['first'], bounds['last'] + 1, chunk_size)
+    ]
+
+
+def _discrepancy(row, field, stored, ledger):
+    return {
+        'ledger': 'wallet',
+        'wallet_id': row['id'],
+        'username': row['user__username'],
+        'field': field,
+        'stored': stored,
+        'ledger_value': ledger,
+    }
+
+
+def reconcile_wallets(id_range):
+    """
+    Reconcile the wallets with ids in the inclusive id_range against
+    WalletTransaction. Returns the number of wallets and transactions
+    checked and the discrepancies found.
+    """
+    first, last = id_range
+    latest = WalletTransaction.objects.filter(wallet=OuterRef('pk')).order_by('-id').values('balance_after')[:1]
+    rows = (
+        Wallet.objects.filter(pk__gte=first, pk__lte=last)
+        .annotate(
+            ledger_credits=Sum('transactions__amount', filter=Q(transactions__transaction_type='credit')),
+            ledger_debits=Sum('transactions__amount', filter=Q(transactions__transaction_type='debit')),
+            entries=Count('transactions'),
+            last_balance=Subquery(latest),
+        )
+        .values('id', 'user__username', 'balance', 'total_credits', 'total_debits',
+                'ledger_credits', 'ledger_debits', 'entries', 'last_balance')
+        .order_by()
+    )
+
+    wallets = transactions = 0
+    discrepancies = []
+    for row in rows.iterator(chunk_size=2000):
+        wallets += 1
+        transactions += row['entries']
+        credits = row['ledger_credits'] or ZERO
+        debits = row['ledger_debits'] or ZERO
+        if row['total_credits'] != credits:
+            discrepancies.append(_discrepancy(row, 'total_credits', row['total_credits'], credits))
+        if row['total_debits'] != debits:
+            discrepancies.append(_discrepancy(row, 'total_debits', row['total_debits'], debits))
+        if row['last_balance'] is not None and row['balance'] != row['last_balance']:
+            discrepancies.append(_discrepancy(row, 'balance', row['balance'], row['last_balance']))
+        if row['balance'] < 0:
+            discrepancies.append(_discrepancy(row, 'balance', row['balance'], ZERO))
+
+    return {'wallets': wallets, 'transactions': transactions, 'discrepancies': discrepancies}
+
+
+def reconcile_marketplace():
+    """
+    Reconcile the marketplace wallet snapshot against MarketplaceTransaction.
+    One aggregate sums both the whole journal and the part not yet rolled
+    up, so the snapshot is compared with exactly the rows it covers.
+    """
+    commission = Q(transactions__transaction_type='commission')
+    outgoing = Q(transactions__transaction_type__in=['expense', 'withdrawal'])
+    pending = Q(transactions__rolled_up=False)
+    result = {'transactions': 0, 'discrepancies': []}
+    for wallet in MarketplaceWallet.objects.annotate(
+        commission=Sum('transactions__amount', filter=commission),
+        outgoing=Sum('transactions__amount', filter=outgoing),
+        pending_commission=Sum('transactions__amount', filter=commission & pending),
+        pending_outgoing=Sum('transactions__amount', filter=outgoing & pending),
+        entries=Count('transactions'),
+    ):
+        result['transactions'] += wallet.entries
+        earned = (wallet.commission or ZERO) - (wallet.pending_commission or ZERO)
+        balance = earned - ((wallet.outgoing or ZERO) - (wallet.pending_outgoing or ZERO))
+        for field, stored, ledger in (
+            ('balance', wallet.balance, balance),
+            ('total_commission_earned', wallet.total_commission_earned, earned),
+        ):
+            if stored != ledger:
+                result['discrepancies'].append({
+                    'ledger': 'marketplace',
+                    'wallet_id': wallet.pk,
+                    'username': '',
+                    'field': field,
+                    'stored': stored,
+                    'ledger_value': ledger,
+                })
+    return result
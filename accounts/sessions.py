@@ -0,0 +1,104 @@
+"""
+Write-coalescing session engine (SESSION_ENGINE = 'accounts.sessions').
+
+Extends Django's cached_db engine: sessions are read from the cache and
+only written through to django_session when their data actually changed,
+or when the last write is older than SESSION_FLUSH_THRESHOLD (a fraction of
+SESSION_COOKIE_AGE) so the stored expiry keeps sliding forward. With
+SESSION_SAVE_EVERY_REQUEST the cookie is still refreshed on every response,
+but most requests cost no database write. stats() reports how many saves
+were flushed and how many were skipped.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends import cached_db
+from django.core.cache import cache
+
+
+FLUSHES_KEY = 'sessions:flushes'
+SKIPS_KEY = 'sessions:skips'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def stats():
+    """
+    Flush/skip counters since the cache was last cleared
+    """
+    counters = cache.get_many([FLUSHES_KEY, SKIPS_KEY])
+    flushes = counters.get(FLUSHES_KEY, 0)
+    skips = counters.get(SKIPS_KEY, 0)
+    total = flushes + skips
+    return {
+        'flushes': flushes,
+        'skips': skips,
+        'skip_rate': skips / total if total else 0.0,
+    }
+
+
+class SessionStore(cached_db.SessionStore):
+    """
+    cached_db sessions that skip writes which would not change anything
+    """
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._loaded_digest = None
+        self._flushed_at = None
+
+    def _digest(self, data):
+        return hashlib.md5(self.serializer().dumps(data)).digest()
+
+    @property
+    def _flushed_key(self):
+        return f'{self.cache_key}:flushed'
+
+    def load(self):
+        data = super().load()
+        self._loaded_digest = self._digest(data)
+        return data
+
+    def _get_session_from_db(self):
+        # On a cache miss the stored expiry tells when the row was last written
+        session = super()._get_session_from_db()
+        if session:
+            self._flushed_at = session.expire_date.timestamp() - self.get_session_cookie_age()
+        return session
+
+    def _last_flush(self):
+        if self._flushed_at is None:
+            self._flushed_at = self._cache.get(self._flushed_key)
+        return self._flushed_at
+
+    def _needs_flush(self):
+        if self._digest(self._session) != self._loaded_digest:
+            return True
+        last_flush = self._last_flush()
+        if last_flush is None:
+            return True
+        threshold = self.get_session_cookie_age() * getattr(settings, 'SESSION_FLUSH_THRESHOLD', 0.1)
+        return time.time() - last_flush >= threshold
+
+    def save(self, must_create=False):
+        if not must_create and self.session_key is not None and not self._needs_flush():
+            _count(SKIPS_KEY)
+            return
+
+        super().save(must_create)
+        self._flushed_at = time.time()
+        self._cache.set(self._flushed_key, self._flushed_at, self.get_expiry_age())
+        self._loaded_digest = self._digest(self._session)
+        _count(FLUSHES_KEY)
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        super().delete(session_key)
+        if key:
+            self._cache.delete(f'{self.cache_key_prefix}{key}:flushed')
@@ -1,25 +1,24 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.conf import settings
 from .models import User, Wallet
+from .middleware import invalidate_users
 
 
 @receiver(post_save, sender=User)
 def create_user_wallet(sender, instance, created, **kwargs):
     """
-    Create wallet automatically when a new user is created
+    Provision the wallet when a new user is created.
+    Later saves (e.g. last_login on every login) leave the wallet alone.
     """
     if created:
-        Wallet.objects.create(user=instance)
+        Wallet.objects.for_user(instance)
 
 
 @receiver(post_save, sender=User)
-def save_user_wallet(sender, instance, **kwargs):
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
     """
-    Save the user's wallet when the user is saved
+    Drop the user from the authentication cache
     """
-    if hasattr(instance, 'wallet'):
-        instance.wallet.save()
-    else:
-        # Create wallet if it doesn't exist
-        Wallet.objects.create(user=instance) 
\ No newline at end of file
+    invalidate_users([instance.pk])
+
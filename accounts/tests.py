@@ -1,3 +1,271 @@
-from django.test import TestCase
+import time
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .ledger import post, InsufficientFunds
+from .middleware import _cache_key, _load_user, cache_enabled
+from .models import User, Wallet, WalletTransaction, WalletSnapshot, MarketplaceWallet, MarketplaceTransaction
+from .reconcile import reconcile_wallets
+from .sessions import SessionStore
+
+
+def session_writes(queries):
+    return [query for query in queries if 'django_session' in query['sql'] and not query['sql'].startswith('SELECT')]
+
+
+class SessionStoreTests(TestCase):
+    """
+    Tests for the write-coalescing session engine
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.session = SessionStore()
+        self.session['cart_count'] = [None, 1]
+        self.session.save()
+
+    def reload(self):
+        return SessionStore(self.session.session_key)
+
+    def test_unchanged_session_is_not_written(self):
+        session = self.reload()
+        session['cart_count']
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(session_writes(queries), [])
+
+    def test_changed_session_is_written(self):
+        session = self.reload()
+        session['cart_count'] = [None, 2]
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(len(session_writes(queries)), 1)
+        self.assertEqual(self.reload()['cart_count'], [None, 2])
+
+    @override_settings(SESSION_COOKIE_AGE=1000, SESSION_FLUSH_THRESHOLD=0.1)
+    def test_expiry_refreshed_after_threshold(self):
+        session = self.reload()
+        with CaptureQueriesContext(connection) as queries:
+            with mock.patch('accounts.sessions.time.time', return_value=time.time() + 50):
+                session.save()
+        self.assertEqual(session_writes(queries), [])
+
+        session = self.reload()
+        with CaptureQueriesContext(connection) as queries:
+            with mock.patch('accounts.sessions.time.time', return_value=time.time() + 101):
+                session.save()
+        self.assertEqual(len(session_writes(queries)), 1)
+
+    def test_cache_miss_uses_stored_expiry(self):
+        cache.clear()
+        session = self.reload()
+        session['cart_count']
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertEqual(session_writes(queries), [])
+
+
+@override_settings(AUTH_USER_CACHE=True)
+class CachedAuthenticationTests(TestCase):
+    """
+    Tests for the cached authentication middleware
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('shopper', password='pass', role='user')
+        self.client.force_login(self.user)
+
+    def queries(self, path, table):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        return response, [query for query in queries if f'FROM "{table}"' in query['sql']]
+
+    def test_user_served_from_cache(self):
+        self.client.get('/accounts/wallet/')
+        response, queries = self.queries('/accounts/wallet/', 'accounts_user')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_wallet_loaded_fresh(self):
+        self.client.get('/accounts/wallet/')
+        self.user.wallet.add_money(25)
+        response, queries = self.queries('/accounts/wallet/', 'accounts_wallet')
+        self.assertTrue(queries)
+        self.assertEqual(response.context['wallet'].balance, 25)
+
+    def test_password_hash_not_cached(self):
+        self.client.get('/accounts/wallet/')
+        entry = cache.get(_cache_key(self.user.pk))
+        self.assertNotIn(self.user.password, entry['fields'])
+
+        # Saving the cached instance writes only the cached fields
+        user, session_auth_hash = _load_user(ModelBackend(), self.user.pk)
+        user.first_name = 'Sam'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Sam')
+        self.assertTrue(self.user.check_password('pass'))
+
+    def test_password_change_ends_sessions(self):
+        self.client.get('/accounts/wallet/')
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get('/accounts/wallet/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_update_expires_with_timeout(self):
+        self.client.get('/accounts/wallet/')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/accounts/wallet/').status_code, 200)
+        # The entry's short lifetime bounds how long the change goes unseen
+        cache.delete(_cache_key(self.user.pk))
+        self.assertEqual(self.client.get('/accounts/wallet/').status_code, 302)
+
+    @override_settings(AUTH_USER_CACHE=None)
+    def test_off_for_per_process_cache(self):
+        self.assertFalse(cache_enabled())
+        self.client.get('/accounts/wallet/')
+        response, queries = self.queries('/accounts/wallet/', 'accounts_user')
+        self.assertEqual(len(queries), 1)
+
+
+class WalletLedgerTests(TestCase):
+    """
+    Tests for the wallet ledger
+    """
+
+    def setUp(self):
+        self.wallet = User.objects.create_user('saver', password='pass', role='user').wallet
+        self.other = User.objects.create_user('seller', password='pass', role='vendor').wallet
+
+    def test_running_balance_and_totals(self):
+        self.wallet.add_money('100.00')
+        self.assertTrue(self.wallet.deduct_money('30.00'))
+        self.wallet.add_money('5.00')
+
+        self.assertEqual(
+            list(self.wallet.transactions.order_by('id').values_list('balance_after', flat=True)),
+            [Decimal('100.00'), Decimal('70.00'), Decimal('75.00')]
+        )
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('75.00'))
+        self.assertEqual(self.wallet.total_credits, Decimal('105.00'))
+        self.assertEqual(self.wallet.total_debits, Decimal('30.00'))
+
+    def test_overdraft_writes_nothing(self):
+        self.wallet.add_money('10.00')
+        self.assertFalse(self.wallet.deduct_money('10.01'))
+        with self.assertRaises(InsufficientFunds):
+            post([(self.other.pk, 'credit', '5.00', 'Sale'), (self.wallet.pk, 'debit', '20.00', 'Purchase')])
+
+        self.assertEqual(WalletTransaction.objects.count(), 1)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.balance, Decimal('0.00'))
+
+    def test_posting_legs_share_id(self):
+        self.wallet.add_money('50.00')
+        entries = post([(self.wallet.pk, 'debit', '20.00', 'Purchase'), (self.other.pk, 'credit', '20.00', 'Sale')])
+        self.assertEqual(len({entry.posting for entry in entries}), 1)
+        self.assertEqual([entry.balance_after for entry in entries], [Decimal('30.00'), Decimal('20.00')])
+
+    def test_statement_from_snapshot(self):
+        self.wallet.add_money('100.00')
+        self.assertEqual(WalletSnapshot.take(), 1)
+        self.assertEqual(WalletSnapshot.take(), 0)
+        start = timezone.now()
+        self.wallet.deduct_money('40.00')
+        self.wallet.add_money('15.00')
+
+        with self.assertNumQueries(2):
+            statement = self.wallet.statement(start)
+        self.assertEqual(statement, {
+            'opening_balance': Decimal('100.00'),
+            'closing_balance': Decimal('75.00'),
+            'credits': Decimal('15.00'),
+            'debits': Decimal('40.00'),
+        })
+        self.assertEqual(self.wallet.statement(start - timedelta(days=1))['credits'], Decimal('115.00'))
+
+
+class MarketplaceRollupTests(TestCase):
+    """
+    Tests for the marketplace wallet rollup
+    """
+
+    def setUp(self):
+        self.wallet = MarketplaceWallet.get_instance()
+
+    def append(self, amount, transaction_type='commission'):
+        return MarketplaceTransaction.objects.create(
+            marketplace_wallet=self.wallet, transaction_type=transaction_type,
+            amount=Decimal(amount), description='test'
+        )
+
+    def test_rollup_folds_pending_rows(self):
+        self.append('8.00')
+        self.append('3.00', 'expense')
+
+        self.assertEqual(self.wallet.rollup(), 2)
+        self.assertEqual((self.wallet.balance, self.wallet.total_commission_earned), (Decimal('5.00'), Decimal('8.00')))
+        self.assertEqual(self.wallet.rollup(), 0)
+        self.assertEqual(self.wallet.live_totals()['balance'], Decimal('5.00'))
+
+    def test_row_committed_late_with_lower_id_is_not_lost(self):
+        late = self.append('2.00')
+        self.append('8.00')
+        # As if `late` had not been committed when the rollup ran
+        MarketplaceTransaction.objects.filter(pk=late.pk).delete()
+        self.wallet.rollup()
+        MarketplaceTransaction.objects.create(
+            pk=late.pk, marketplace_wallet=self.wallet, transaction_type='commission',
+            amount=Decimal('2.00'), description='test'
+        )
+
+        self.assertEqual(self.wallet.live_totals()['total_commission_earned'], Decimal('10.00'))
+        self.wallet.rollup()
+        self.assertEqual(self.wallet.total_commission_earned, Decimal('10.00'))
+
+
+class ReconcileLedgersTests(TestCase):
+    """
+    Tests for the reconcile_ledgers command
+    """
+
+    def setUp(self):
+        self.wallet = User.objects.create_user('saver', password='pass', role='user').wallet
+        self.wallet.add_money('40.00')
+        self.wallet.deduct_money('15.00')
+
+    def reconcile(self):
+        out = StringIO()
+        call_command('reconcile_ledgers', workers=1, chunk_size=1, stdout=out)
+        return out.getvalue()
+
+    def test_consistent_ledgers_reconcile(self):
+        self.assertIn('Ledgers reconcile.', self.reconcile())
+
+    def test_reports_discrepancies(self):
+        Wallet.objects.filter(pk=self.wallet.pk).update(balance=Decimal('30.00'))
+        MarketplaceWallet.get_instance()
+        MarketplaceWallet.objects.update(total_commission_earned=Decimal('1.00'))
+
+        with self.assertRaisesMessage(CommandError, '2 discrepancies found.'):
+            self.reconcile()
+        result = reconcile_wallets((self.wallet.pk, self.wallet.pk))
+        self.assertEqual(result['transactions'], 2)
+        self.assertEqual(
+            [(row['field'], row['stored'], row['ledger_value']) for row in result['discrepancies']],
+            [('balance', Decimal('30.00'), Decimal('25.00'))]
+        )
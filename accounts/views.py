@@ -7,9 +7,8 @@ from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib.auth import update_session_auth_hash
-from django.db import transaction
 import json
-from .models import User, Wallet, WalletTransaction
+from .models import User, Wallet
 from .forms import UserRegistrationForm, VendorRegistrationForm, UserProfileForm
 
 
@@ -158,7 +157,7 @@ def wallet_view(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    wallet = request.user.wallet
+    wallet = Wallet.objects.for_user(request.user)
     transactions = wallet.transactions.all()[:20]  # Latest 20 transactions
     
     return render(request, 'accounts/wallet.html', {
@@ -186,17 +185,8 @@ def add_money(request):
         if amount > 10000:  # Maximum limit
             return JsonResponse({'success': False, 'message': 'Maximum amount is $10,000'})
         
-        with transaction.atomic():
-            wallet = request.user.wallet
-            wallet.add_money(amount)
-            
-            # Create transaction record
-            WalletTransaction.objects.create(
-                wallet=wallet,
-                transaction_type='credit',
-                amount=amount,
-                description=f'Added ${amount} to wallet'
-            )
+        wallet = Wallet.objects.for_user(request.user)
+        wallet.add_money(amount, f'Added ${amount} to wallet')
         
         return JsonResponse({
             'success': True, 
@@ -1,3 +1,33 @@
 from django.contrib import admin
+from .models import VendorStats, DailySales, VendorOrderCount
 
-# Register your models here.
+
+@admin.register(VendorStats)
+class VendorStatsAdmin(admin.ModelAdmin):
+    """
+    Admin for the pre-aggregated vendor sales statistics
+    """
+    list_display = ('vendor', 'units_sold', 'revenue', 'order_count', 'active_product_count', 'updated_at')
+    search_fields = ('vendor__username',)
+    readonly_fields = ('updated_at',)
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """
+    Admin for the daily sales rollup
+    """
+    list_display = ('day', 'vendor', 'product', 'units', 'revenue', 'order_count')
+    list_filter = ('day',)
+    search_fields = ('vendor__username', 'product__name')
+    raw_id_fields = ('vendor', 'product')
+
+
+@admin.register(VendorOrderCount)
+class VendorOrderCountAdmin(admin.ModelAdmin):
+    """
+    Admin for the per-vendor order status counters
+    """
+    list_display = ('vendor', 'status', 'count')
+    list_filter = ('status',)
+    search_fields = ('vendor__username',)
@@ -0,0 +1,129 @@
+"""
+Streaming CSV/JSON Lines exports of the admin listings.
+
+Rows are read with QuerySet.iterator(), which fetches from the database
+cursor in chunks instead of caching the whole result on the queryset, and
+are encoded and sent to the client as they are read. Memory stays flat
+however many rows an export has.
+"""
+import csv
+from operator import attrgetter
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+# Text starting with these is run as a formula by spreadsheet apps
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# Bytes gathered before handing a piece of the body to the server
+BUFFER_SIZE = 64 * 1024
+
+USER_COLUMNS = [
+    ('id', 'id'),
+    ('username', 'username'),
+    ('email', 'email'),
+    ('first_name', 'first_name'),
+    ('last_name', 'last_name'),
+    ('role', 'role'),
+    ('phone_number', 'phone_number'),
+    ('is_active', 'is_active'),
+    ('date_joined', 'date_joined'),
+    ('last_login', 'last_login'),
+]
+PRODUCT_COLUMNS = [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('vendor', 'vendor.username'),
+    ('category', 'category.name'),
+    ('price', 'price'),
+    ('stock', 'stock'),
+    ('is_active', 'is_active'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+ORDER_COLUMNS = [
+    ('order_id', 'order_id'),
+    ('tracking_id', 'tracking_id'),
+    ('customer', 'user.username'),
+    ('email', 'user.email'),
+    ('status', 'status'),
+    ('total_amount', 'total_amount'),
+    ('item_count', 'item_count'),
+    ('vendor_count', 'vendor_count'),
+    ('created_at', 'created_at'),
+    ('updated_at', 'updated_at'),
+]
+
+
+class Echo:
+    """
+    File-like object whose write() returns the line, so csv.writer
+    encodes rows without buffering them
+    """
+
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Quoted so a product or user name like =HYPERLINK(...) stays text
+        return "'" + value
+    return value
+
+
+def _csv_lines(rows, headers):
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow(_csv_cell(value) for value in row)
+
+
+def _jsonl_lines(rows, headers):
+    encoder = DjangoJSONEncoder(separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(headers, row))) + '\n'
+
+
+def _buffered(lines):
+    buffer, size = [], 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream(queryset, columns, fmt):
+    """
+    Yield the encoded export of `queryset`, one piece of the body at a time
+    """
+    headers = [header for header, path in columns]
+    # Load only the exported columns, joined tables included
+    queryset = queryset.only(*[path.replace('.', '__') for header, path in columns])
+    getters = [attrgetter(path) for header, path in columns]
+    rows = ([getter(obj) for getter in getters] for obj in queryset.iterator(chunk_size=CHUNK_SIZE))
+    lines = _csv_lines(rows, headers) if fmt == 'csv' else _jsonl_lines(rows, headers)
+    return _buffered(lines)
+
+
+def export_response(queryset, columns, fmt, name):
+    """
+    StreamingHttpResponse downloading the export as <name>-<date>.<fmt>
+    """
+    response = StreamingHttpResponse(stream(queryset, columns, fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y-%m-%d}.{fmt}"'
+    return response
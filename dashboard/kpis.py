@@ -0,0 +1,132 @@
+"""
+Admin dashboard KPI snapshot.
+
+The platform-wide counts and sums behind the admin dashboard are computed in
+three aggregate queries and stored as one snapshot in the shared cache. The
+dashboard always serves the stored snapshot along with its age; when it is
+older than KPI_SNAPSHOT_MAX_AGE the first request to notice takes a short
+cache lock and recomputes it in a background thread, so any number of admins
+loading the page cause at most one recompute. With no snapshot at all (first
+start, cache eviction, a fresh per-process cache after a deploy) the same lock
+lets one request compute it inline while the others wait briefly for its
+result and otherwise render placeholders. The refresh_kpis command keeps the
+snapshot warm from a scheduler or loop.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Sum, Q
+
+from accounts.models import User
+from shop.models import Product, Order
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'dashboard:kpis'
+LOCK_KEY = 'dashboard:kpis:refreshing'
+
+
+def _max_age():
+    return getattr(settings, 'KPI_SNAPSHOT_MAX_AGE', 60)
+
+
+def _lock_timeout():
+    return getattr(settings, 'KPI_REFRESH_LOCK_TIMEOUT', 300)
+
+
+def _cold_wait():
+    return getattr(settings, 'KPI_COLD_WAIT_SECONDS', 2)
+
+
+def compute():
+    """
+    Compute the KPIs from the database, one conditional aggregate per table
+    """
+    users = User.objects.aggregate(
+        total_users=Count('id', filter=Q(role='user')),
+        total_vendors=Count('id', filter=Q(role='vendor')),
+        total_admins=Count('id', filter=Q(role='admin')),
+    )
+    products = Product.objects.aggregate(
+        total_products=Count('id'),
+        active_products=Count('id', filter=Q(is_active=True)),
+    )
+    orders = Order.objects.aggregate(
+        total_orders=Count('id'),
+        total_revenue=Sum('total_amount'),
+    )
+    orders['total_revenue'] = orders['total_revenue'] or 0
+    return {**users, **products, **orders}
+
+
+def refresh():
+    """
+    Recompute and store the snapshot now; returns it
+    """
+    snapshot = {'kpis': compute(), 'computed_at': time.time()}
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+
+def _refresh_in_background():
+    try:
+        refresh()
+    except Exception:
+        logger.exception('KPI snapshot refresh failed')
+    finally:
+        cache.delete(LOCK_KEY)
+        connection.close()
+
+
+def trigger_refresh():
+    """
+    Start a background recompute unless one is already running anywhere.
+    Returns True if this call started it.
+    """
+    # cache.add is atomic: only one caller per lock timeout gets True
+    if not cache.add(LOCK_KEY, True, _lock_timeout()):
+        return False
+    threading.Thread(target=_refresh_in_background, name='kpi-refresh', daemon=True).start()
+    return True
+
+
+def _cold_snapshot():
+    """
+    Compute the missing snapshot in one request only; the others wait for
+    it up to KPI_COLD_WAIT_SECONDS and get None if it is still not there
+    """
+    if cache.add(LOCK_KEY, True, _lock_timeout()):
+        try:
+            return refresh()
+        finally:
+            cache.delete(LOCK_KEY)
+    deadline = time.monotonic() + _cold_wait()
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        snapshot = cache.get(SNAPSHOT_KEY)
+        if snapshot is not None:
+            return snapshot
+    return None
+
+
+def get_snapshot():
+    """
+    Return (kpis, age in seconds) from the stored snapshot, starting a
+    background refresh if it is stale. Without a snapshot one caller
+    computes it inline; returns (None, None) to callers that gave up
+    waiting for it.
+    """
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = _cold_snapshot()
+        if snapshot is None:
+            return None, None
+    age = time.time() - snapshot['computed_at']
+    if age > _max_age():
+        trigger_refresh()
+    return snapshot['kpis'], age
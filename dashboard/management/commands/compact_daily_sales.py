@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from dashboard.models import DailySales
+
+
+class Command(BaseCommand):
+    help = 'Merges daily sales rollup rows appended at checkout'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute the whole rollup from order history (backfill)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and compact every N seconds',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            started = time.monotonic()
+            with transaction.atomic():
+                rows = DailySales.rebuild()
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {rows} daily sales rows in {elapsed:.1f}s.'
+            ))
+            return
+
+        while True:
+            merged, removed = DailySales.compact()
+            if merged:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Compacted {merged} daily sales keys, removed {removed} rows.'
+                ))
+            else:
+                self.stdout.write('Nothing to compact.')
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
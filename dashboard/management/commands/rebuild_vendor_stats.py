@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from dashboard.models import VendorStats, VendorOrderCount
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the per-vendor sales statistics and order status counters from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--vendor',
+            type=int,
+            action='append',
+            dest='vendor_ids',
+            help='Only rebuild this vendor id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            rows = VendorStats.rebuild(options['vendor_ids'])
+            counters = VendorOrderCount.rebuild(options['vendor_ids'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {rows} vendors and {counters} order status counters in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from dashboard import kpis
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the admin dashboard KPI snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Keep running and refresh every N seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            snapshot = kpis.refresh()
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed KPI snapshot in {elapsed:.2f}s: "
+                f"{snapshot['kpis']['total_orders']} orders, ${snapshot['kpis']['total_revenue']} revenue"
+            ))
+
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
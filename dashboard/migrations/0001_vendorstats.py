@@ -0,0 +1,70 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+
+def fill_vendor_stats(apps, schema_editor):
+    # Same totals as VendorStats.rebuild(), from the order and product history
+    VendorStats = apps.get_model('dashboard', 'VendorStats')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    Product = apps.get_model('shop', 'Product')
+
+    stats = {}
+    sales = OrderItem.objects.values('product__vendor_id').annotate(
+        units_sold=Sum('quantity'),
+        revenue=Sum(F('price') * F('quantity')),
+        order_count=Count('order_id', distinct=True)
+    ).order_by()
+    for row in sales.iterator():
+        stats[row['product__vendor_id']] = VendorStats(
+            vendor_id=row['product__vendor_id'],
+            units_sold=row['units_sold'] or 0,
+            revenue=row['revenue'] or Decimal('0.00'),
+            order_count=row['order_count']
+        )
+
+    counts = Product.objects.values('vendor_id').annotate(
+        product_count=Count('id'),
+        active_product_count=Count('id', filter=Q(is_active=True))
+    ).order_by()
+    for row in counts.iterator():
+        row_stats = stats.setdefault(row['vendor_id'], VendorStats(vendor_id=row['vendor_id']))
+        row_stats.product_count = row['product_count']
+        row_stats.active_product_count = row['active_product_count']
+
+    VendorStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('shop', '0004_productrecommendation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units_sold', models.PositiveBigIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('active_product_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('vendor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='sales_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Vendor stats',
+            },
+        ),
+        migrations.RunPython(fill_vendor_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:48
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_sales(apps, schema_editor):
+    # Same rows as DailySales.rebuild(): one per product and day plus the
+    # vendor's total for the day
+    DailySales = apps.get_model('dashboard', 'DailySales')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    totals = dict(
+        units=Sum('quantity'),
+        revenue=Sum(F('price') * F('quantity')),
+        orders=Count('order_id', distinct=True)
+    )
+    lines = OrderItem.objects.annotate(day=TruncDate('order__created_at'))
+    DailySales.objects.bulk_create([
+        DailySales(vendor_id=row['product__vendor_id'], product_id=row.get('product_id'), day=row['day'],
+                   units=row['units'], revenue=row['revenue'], order_count=row['orders'])
+        for grouping in (('product__vendor_id', 'product_id', 'day'), ('product__vendor_id', 'day'))
+        for row in lines.values(*grouping).annotate(**totals).order_by().iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_vendorstats'),
+        ('shop', '0004_productrecommendation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.product')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'indexes': [models.Index(fields=['vendor', 'product', 'day'], name='dashboard_d_vendor__85573b_idx')],
+            },
+        ),
+        migrations.RunPython(fill_daily_sales, migrations.RunPython.noop),
+    ]
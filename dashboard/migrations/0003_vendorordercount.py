@@ -0,0 +1,44 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_order_counts(apps, schema_editor):
+    # Each vendor's orders by status, counting an order once however many
+    # of the vendor's products it holds
+    VendorOrderCount = apps.get_model('dashboard', 'VendorOrderCount')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    counts = OrderItem.objects.values('product__vendor_id', 'order__status').annotate(
+        orders=Count('order_id', distinct=True)
+    ).order_by()
+    VendorOrderCount.objects.bulk_create([
+        VendorOrderCount(vendor_id=row['product__vendor_id'], status=row['order__status'], count=row['orders'])
+        for row in counts.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_dailysales'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorOrderCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('vendor', 'status'), name='unique_vendor_order_status')],
+            },
+        ),
+        migrations.RunPython(fill_order_counts, migrations.RunPython.noop),
+    ]
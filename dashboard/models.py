@@ -1,3 +1,350 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Case, When, Value, F, Sum, Count, Q
+from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
+from django.utils import timezone
+from decimal import Decimal
 
-# Create your models here.
+from shop.models import Product, Order, OrderItem, VendorOrder
+
+
+ORDER_STATUSES = [status for status, label in Order.ORDER_STATUS_CHOICES]
+
+class VendorStats(models.Model):
+    """
+    Running sales totals for one vendor.
+    Sales are added inside the checkout transaction and product counts follow
+    product saves, so the vendor dashboard reads one row instead of scanning
+    the whole order history. rebuild() recomputes everything from scratch.
+    """
+    vendor = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                  related_name='sales_stats')
+    units_sold = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+    product_count = models.PositiveIntegerField(default=0)
+    active_product_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'Vendor stats'
+
+    def __str__(self):
+        return f"{self.vendor.username} - {self.units_sold} sold, ${self.revenue}"
+
+    @classmethod
+    def for_vendor(cls, vendor):
+        """Stats row for a vendor, or an empty unsaved one if it has none yet"""
+        try:
+            return cls.objects.get(vendor=vendor)
+        except cls.DoesNotExist:
+            return cls(vendor=vendor)
+
+    @classmethod
+    def record_sales(cls, sales):
+        """
+        Add one order's sales, given as {vendor_id: (units, revenue)}.
+        Two queries however many vendors are involved; call inside the
+        checkout transaction so the totals commit with the order.
+        """
+        if not sales:
+            return
+        cls.objects.bulk_create([cls(vendor_id=vendor_id) for vendor_id in sales], ignore_conflicts=True)
+
+        def per_vendor(index, output_field):
+            return Case(
+                *[When(vendor_id=vendor_id, then=Value(amounts[index])) for vendor_id, amounts in sales.items()],
+                output_field=output_field
+            )
+
+        cls.objects.filter(vendor_id__in=sales).update(
+            units_sold=F('units_sold') + per_vendor(0, models.PositiveBigIntegerField()),
+            revenue=F('revenue') + per_vendor(1, models.DecimalField(max_digits=14, decimal_places=2)),
+            order_count=F('order_count') + 1,
+            updated_at=timezone.now()
+        )
+
+    @staticmethod
+    def _product_counts(vendor_id):
+        return Product.objects.filter(vendor_id=vendor_id).aggregate(
+            product_count=Count('id'),
+            active_product_count=Count('id', filter=Q(is_active=True))
+        )
+
+    @classmethod
+    def refresh_products(cls, vendor_id, create=True):
+        """Recount a vendor's products after one was added, changed or removed"""
+        counts = cls._product_counts(vendor_id)
+        if create:
+            cls.objects.update_or_create(vendor_id=vendor_id, defaults=counts)
+        else:
+            cls.objects.filter(vendor_id=vendor_id).update(**counts)
+
+    @classmethod
+    def rebuild(cls, vendor_ids=None):
+        """
+        Recompute stats from orders and products; all vendors when vendor_ids
+        is None. Returns the number of rows written.
+        """
+        items = OrderItem.objects.all()
+        products = Product.objects.all()
+        if vendor_ids is not None:
+            items = items.filter(product__vendor_id__in=vendor_ids)
+            products = products.filter(vendor_id__in=vendor_ids)
+
+        stats = {}
+        sales = items.values('product__vendor_id').annotate(
+            units_sold=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity')),
+            order_count=Count('order_id', distinct=True)
+        ).order_by()
+        for row in sales:
+            stats[row['product__vendor_id']] = cls(
+                vendor_id=row['product__vendor_id'],
+                units_sold=row['units_sold'] or 0,
+                revenue=row['revenue'] or Decimal('0.00'),
+                order_count=row['order_count']
+            )
+
+        counts = products.values('vendor_id').annotate(
+            product_count=Count('id'),
+            active_product_count=Count('id', filter=Q(is_active=True))
+        ).order_by()
+        for row in counts:
+            row_stats = stats.setdefault(row['vendor_id'], cls(vendor_id=row['vendor_id']))
+            row_stats.product_count = row['product_count']
+            row_stats.active_product_count = row['active_product_count']
+
+        existing = cls.objects.all()
+        if vendor_ids is not None:
+            existing = existing.filter(vendor_id__in=vendor_ids)
+        existing.delete()
+        cls.objects.bulk_create(stats.values(), batch_size=1000)
+        return len(stats)
+
+
+
+class VendorOrderCount(models.Model):
+    """
+    Number of a vendor's sub-orders in each status.
+    Checkout and status changes move the counters, so the vendor order page
+    reads a handful of rows instead of counting its order history.
+    """
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                               related_name='order_counts')
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['vendor', 'status'], name='unique_vendor_order_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor.username} {self.status}: {self.count}"
+
+    @classmethod
+    def bump(cls, vendor_ids, status, delta=1):
+        """Add delta to each vendor's counter for status (two queries)"""
+        vendor_ids = list(vendor_ids)
+        if not vendor_ids:
+            return
+        cls.objects.bulk_create(
+            [cls(vendor_id=vendor_id, status=status) for vendor_id in vendor_ids],
+            ignore_conflicts=True
+        )
+        cls.objects.filter(vendor_id__in=vendor_ids, status=status).update(count=F('count') + delta)
+
+    @classmethod
+    def move(cls, vendor_ids, old_status, new_status):
+        """Move each vendor's order from one status counter to another"""
+        if old_status == new_status:
+            return
+        cls.bump(vendor_ids, old_status, -1)
+        cls.bump(vendor_ids, new_status, 1)
+
+    @classmethod
+    def counts_for(cls, vendor):
+        """{status: count} for a vendor, with 'total' across all statuses"""
+        counts = dict(cls.objects.filter(vendor=vendor).values_list('status', 'count'))
+        counts['total'] = sum(counts.values())
+        return counts
+
+    @staticmethod
+    def count_from_vendor_orders(vendor_orders):
+        """
+        Per-vendor status breakdown of a VendorOrder queryset in one pass:
+        {vendor_id: {status: count}}
+        """
+        rows = vendor_orders.values('vendor_id').annotate(**{
+            status: Count('id', filter=Q(status=status))
+            for status in ORDER_STATUSES
+        }).order_by()
+        return {
+            row.pop('vendor_id'): {status: count for status, count in row.items() if count}
+            for row in rows
+        }
+
+    @classmethod
+    def rebuild(cls, vendor_ids=None):
+        """
+        Recompute counters from the vendor sub-orders; all vendors when
+        vendor_ids is None. Returns the number of rows written.
+        """
+        vendor_orders = VendorOrder.objects.all()
+        existing = cls.objects.all()
+        if vendor_ids is not None:
+            vendor_orders = vendor_orders.filter(vendor_id__in=vendor_ids)
+            existing = existing.filter(vendor_id__in=vendor_ids)
+
+        counters = [
+            cls(vendor_id=vendor_id, status=status, count=count)
+            for vendor_id, counts in cls.count_from_vendor_orders(vendor_orders).items()
+            for status, count in counts.items()
+        ]
+        existing.delete()
+        cls.objects.bulk_create(counters, batch_size=1000)
+        return len(counters)
+
+
+class DailySales(models.Model):
+    """
+    Sales rollup per vendor, product and day.
+    Checkout appends rows (one per product line plus one vendor total with
+    no product) without touching existing ones; compact() later merges rows
+    sharing a key. Readers always Sum() over the key, so compaction never
+    changes a result.
+    """
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                               related_name='daily_sales')
+    # Null on the vendor's total row for the day
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, blank=True, null=True,
+                                related_name='daily_sales')
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily sales'
+        indexes = [
+            models.Index(fields=['vendor', 'product', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.vendor.username} {self.day} - {self.units} sold, ${self.revenue}"
+
+    @classmethod
+    def record_order(cls, order, items):
+        """
+        Append the rollup rows for one order; items are its cart or order
+        items with product loaded. One INSERT whatever the order size.
+        """
+        day = timezone.localdate(order.created_at)
+        products = {}
+        vendors = {}
+        for item in items:
+            vendor_id = item.product.vendor_id
+            amount = item.get_total_price()
+            row = products.setdefault(item.product_id, cls(
+                vendor_id=vendor_id, product_id=item.product_id, day=day, order_count=1
+            ))
+            row.units += item.quantity
+            row.revenue += amount
+            total = vendors.setdefault(vendor_id, cls(vendor_id=vendor_id, day=day, order_count=1))
+            total.units += item.quantity
+            total.revenue += amount
+        cls.objects.bulk_create([*products.values(), *vendors.values()])
+
+    @classmethod
+    def compact(cls):
+        """
+        Merge rows sharing (vendor, product, day) into one.
+        Each key's rows are locked, summed and deleted by id in one
+        transaction; rows appended meanwhile are left for the next pass.
+        Returns (groups merged, rows removed).
+        """
+        groups = cls.objects.values('vendor_id', 'product_id', 'day').annotate(
+            rows=Count('id')
+        ).filter(rows__gt=1).order_by()
+
+        merged = removed = 0
+        for group in list(groups):
+            key = dict(vendor_id=group['vendor_id'], product_id=group['product_id'], day=group['day'])
+            with transaction.atomic():
+                # Sum and delete exactly the rows locked here: a row committed
+                # in between is neither counted nor deleted
+                ids = list(cls.objects.select_for_update().filter(**key).values_list('id', flat=True))
+                if len(ids) < 2:
+                    continue
+                rows = cls.objects.filter(id__in=ids)
+                totals = rows.aggregate(
+                    units=Sum('units'),
+                    revenue=Sum('revenue'),
+                    order_count=Sum('order_count')
+                )
+                rows.delete()
+                cls.objects.create(**key, **totals)
+            merged += 1
+            removed += len(ids) - 1
+        return merged, removed
+
+    @classmethod
+    def rebuild(cls):
+        """
+        Recompute the whole table from order history, already compacted.
+        Returns the number of rows written.
+        """
+        day = TruncDate('order__created_at')
+        totals = dict(
+            units=Sum('quantity'),
+            revenue=Sum(F('price') * F('quantity')),
+            orders=Count('order_id', distinct=True)
+        )
+        lines = OrderItem.objects.annotate(day=day)
+        rows = [
+            cls(vendor_id=row['product__vendor_id'], product_id=row.get('product_id'), day=row['day'],
+                units=row['units'], revenue=row['revenue'], order_count=row['orders'])
+            for grouping in (('product__vendor_id', 'product_id', 'day'), ('product__vendor_id', 'day'))
+            for row in lines.values(*grouping).annotate(**totals).order_by().iterator()
+        ]
+        cls.objects.all().delete()
+        cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    @classmethod
+    def series(cls, vendor, period='day', since=None):
+        """
+        Vendor totals per day, week or month, newest first:
+        [{'period': date, 'units': ..., 'revenue': ..., 'orders': ...}]
+        """
+        rows = cls.objects.filter(vendor=vendor, product__isnull=True)
+        if since is not None:
+            rows = rows.filter(day__gte=since)
+        if period != 'day':
+            rows = rows.annotate(period=SERIES_TRUNC[period]('day'))
+        else:
+            rows = rows.annotate(period=F('day'))
+        return list(rows.values('period').annotate(
+            units=Sum('units'),
+            revenue=Sum('revenue'),
+            orders=Sum('order_count')
+        ).order_by('-period'))
+
+    @classmethod
+    def top_products(cls, vendor, limit=10):
+        """
+        Best selling products by units over the vendor's whole history
+        """
+        return list(cls.objects.filter(vendor=vendor, product__isnull=False).values(
+            'product_id', 'product__name'
+        ).annotate(
+            total_sold=Sum('units'),
+            total_revenue=Sum('revenue')
+        ).order_by('-total_sold', 'product_id')[:limit])
+
+
+SERIES_TRUNC = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from shop.models import Product
+from .models import VendorStats
+
+
+PRODUCT_COUNT_FIELDS = {'is_active', 'vendor'}
+
+
+@receiver(post_save, sender=Product)
+def count_saved_product(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep the vendor's product counts current
+    """
+    if update_fields is not None and not PRODUCT_COUNT_FIELDS.intersection(update_fields):
+        return
+    VendorStats.refresh_products(instance.vendor_id)
+
+
+@receiver(post_delete, sender=Product)
+def count_deleted_product(sender, instance, **kwargs):
+    """
+    Recount without creating a row: the vendor itself may be being deleted
+    """
+    VendorStats.refresh_products(instance.vendor_id, create=False)
@@ -1,3 +1,148 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import User, Wallet
+from shop.models import Category, Product
+from . import kpis
+
+
+class AdminExportTests(TestCase):
+    """
+    Tests for the streaming admin exports
+    """
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='pass', role='admin')
+        self.vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        category = Category.objects.create(name='Books')
+        for i in range(5):
+            Product.objects.create(name=f'Novel {i}', description='d', price=Decimal('9.99'),
+                                   category=category, stock=i, vendor=self.vendor)
+        Product.objects.create(name='Atlas', description='d', price=Decimal('30.00'),
+                               category=category, stock=1, vendor=self.vendor)
+        self.client.login(username='admin', password='pass')
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_products_csv_uses_listing_search(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.download('/dashboard/admin/products/export/?format=csv&search=novel')
+        rows = list(csv.DictReader(io.StringIO(body)))
+
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['vendor'], 'vendor')
+        self.assertEqual(rows[0]['category'], 'Books')
+        self.assertEqual(rows[0]['price'], '9.99')
+        # Vendor and category come from the same query, not one per row
+        self.assertEqual(len([q for q in queries if 'shop_product' in q['sql']]), 1)
+
+    def test_csv_neutralizes_formulas(self):
+        Product.objects.filter(name='Atlas').update(name='=HYPERLINK("http://x")')
+        body = self.download('/dashboard/admin/products/export/?format=csv&search=hyperlink')
+        rows = list(csv.DictReader(io.StringIO(body)))
+
+        self.assertEqual(rows[0]['name'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(rows[0]['price'], '30.00')
+
+    def test_users_jsonl_uses_role_filter(self):
+        body = self.download('/dashboard/admin/users/export/?format=jsonl&role=vendor')
+        rows = [json.loads(line) for line in body.splitlines()]
+
+        self.assertEqual([row['username'] for row in rows], ['vendor'])
+        self.assertEqual(rows[0]['role'], 'vendor')
+
+    def test_requires_admin(self):
+        self.client.login(username='vendor', password='pass')
+        response = self.client.get('/dashboard/admin/orders/export/')
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+
+
+class VendorWalletTests(TestCase):
+    """
+    Tests for the vendor wallet page
+    """
+
+    def setUp(self):
+        self.vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.wallet = Wallet.objects.for_user(self.vendor)
+        self.wallet.add_money(Decimal('100.00'), 'Payment for order')
+        self.client.login(username='vendor', password='pass')
+
+    def test_withdrawn_total_counts_only_withdrawals(self):
+        self.client.post('/dashboard/withdraw-money/', {'amount': '30', 'description': 'Bank'})
+        self.wallet.deduct_money(Decimal('5.00'), 'Refund for order')
+
+        response = self.client.get('/dashboard/wallet/')
+        self.assertEqual(response.context['pending_withdrawals'], Decimal('30.00'))
+        self.assertEqual(response.context['total_earnings'], Decimal('100.00'))
+
+
+class KpiSnapshotTests(TestCase):
+    """
+    Tests for the admin dashboard KPI snapshot
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        User.objects.create_user('shopper', password='pass', role='user')
+
+    def test_fresh_snapshot_served_without_queries(self):
+        kpis.refresh()
+        with self.assertNumQueries(0):
+            values, age = kpis.get_snapshot()
+        self.assertEqual(values['total_users'], 1)
+        self.assertLess(age, kpis._max_age())
+
+    def test_stale_snapshot_triggers_one_background_refresh(self):
+        cache.set(kpis.SNAPSHOT_KEY, {'kpis': {'total_users': 7}, 'computed_at': time.time() - 3600}, None)
+        with mock.patch('dashboard.kpis.threading.Thread') as thread:
+            first, age = kpis.get_snapshot()
+            second, age = kpis.get_snapshot()
+        # Stale values are served at once; only the first caller starts a refresh
+        self.assertEqual((first['total_users'], second['total_users']), (7, 7))
+        self.assertEqual(thread.call_count, 1)
+
+    def test_cold_snapshot_computed_once(self):
+        calls = []
+
+        def slow_compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'total_users': 1}
+
+        results = []
+        with mock.patch('dashboard.kpis.compute', side_effect=slow_compute):
+            threads = [threading.Thread(target=lambda: results.append(kpis.get_snapshot())) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([values for values, age in results], [{'total_users': 1}] * 5)
+
+    @override_settings(KPI_COLD_WAIT_SECONDS=0.1)
+    def test_placeholder_while_another_request_computes(self):
+        cache.add(kpis.LOCK_KEY, True)
+        with mock.patch('dashboard.kpis.compute') as compute:
+            self.assertEqual(kpis.get_snapshot(), (None, None))
+        compute.assert_not_called()
+
+        User.objects.create_user('admin', password='pass', role='admin')
+        self.client.login(username='admin', password='pass')
+        response = self.client.get('/dashboard/')
+        self.assertContains(response, 'Stats are being computed')
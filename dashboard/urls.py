@@ -10,6 +10,7 @@ urlpatterns = [
     # Vendor URLs
     path('products/', views.vendor_products, name='vendor_products'),
     path('add-product/', views.add_product, name='add_product'),
+    path('import-products/', views.import_products, name='import_products'),
     path('edit-product/<int:product_id>/', views.edit_product, name='edit_product'),
     path('delete-product/<int:product_id>/', views.delete_product, name='delete_product'),
     path('analytics/', views.vendor_analytics, name='vendor_analytics'),
@@ -21,12 +22,15 @@ urlpatterns = [
     
     # Admin URLs
     path('admin/users/', views.admin_users, name='admin_users'),
+    path('admin/users/export/', views.admin_users_export, name='admin_users_export'),
     path('admin/users/remove/<int:user_id>/', views.admin_remove_user, name='admin_remove_user'),
     path('admin/users/<int:user_id>/products/', views.admin_user_products, name='admin_user_products'),
     path('admin/users/<int:user_id>/wallet/', views.admin_user_wallet, name='admin_user_wallet'),
     path('admin/products/', views.admin_products, name='admin_products'),
+    path('admin/products/export/', views.admin_products_export, name='admin_products_export'),
     path('admin/products/remove/<int:product_id>/', views.admin_remove_product, name='admin_remove_product'),
     path('admin/orders/', views.admin_orders, name='admin_orders'),
+    path('admin/orders/export/', views.admin_orders_export, name='admin_orders_export'),
     path('admin/contacts/', views.admin_contacts, name='admin_contacts'),
     path('admin/contacts/<int:contact_id>/', views.admin_contact_detail, name='admin_contact_detail'),
     path('admin/contacts/<int:contact_id>/update-status/', views.admin_update_contact_status, name='admin_update_contact_status'),
@@ -1,13 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count, Q
+from django.db import transaction
+from django.db.models import Sum, Count, Q, Prefetch
 from django.http import JsonResponse
-from django.core.paginator import Paginator
-from accounts.models import User, Wallet, WalletTransaction, MarketplaceWallet, MarketplaceTransaction
-from shop.models import Product, Order, OrderItem, Contact, Category
+from django.utils import timezone
+from accounts.models import User, Wallet, MarketplaceWallet, MarketplaceTransaction
+from shop.models import Product, Order, OrderItem, VendorOrder, Contact, Category
 from shop.forms import ProductForm
+from shop import importer
+from shop.pagination import get_keyset_page
+from .models import VendorStats, DailySales, VendorOrderCount, ORDER_STATUSES
+from . import exports, kpis as kpi_snapshot
 from decimal import Decimal
+from datetime import timedelta
+
+
+# Ledger description prefix of vendor withdrawals
+WITHDRAWAL_PREFIX = 'Withdrawal'
+
+# How far back each vendor analytics series goes
+ANALYTICS_PERIODS = {
+    'day': timedelta(days=30),
+    'week': timedelta(weeks=12),
+    'month': timedelta(days=365),
+}
 
 
 @login_required
@@ -32,7 +49,7 @@ def user_dashboard(request):
     """
     user = request.user
     recent_orders = Order.objects.filter(user=user)[:5]
-    wallet = user.wallet
+    wallet = Wallet.objects.for_user(user)
     
     # Statistics
     total_orders = Order.objects.filter(user=user).count()
@@ -59,32 +76,22 @@ def vendor_dashboard(request):
     vendor = request.user
     vendor_products = Product.objects.filter(vendor=vendor)
     
-    # Statistics
-    total_products = vendor_products.count()
-    active_products = vendor_products.filter(is_active=True).count()
+    # Statistics come from the pre-aggregated row, not the order history
+    stats = VendorStats.for_vendor(vendor)
     
-    # Sales data
-    sold_items = OrderItem.objects.filter(product__vendor=vendor)
-    total_sales = sold_items.aggregate(total=Sum('quantity'))['total'] or 0
-    
-    # Calculate total revenue properly
-    total_revenue = 0
-    for item in sold_items:
-        total_revenue += item.price * item.quantity
-    
-    # Recent orders that contain vendor's products
-    recent_orders = Order.objects.filter(
-        items__product__vendor=vendor
-    ).distinct().order_by('-created_at')[:5]
+    # Vendor's most recent sub-orders
+    recent_orders = VendorOrder.objects.filter(vendor=vendor).select_related('order')[:5]
     
     return render(request, 'dashboard/vendor_dashboard.html', {
-        'total_products': total_products,
-        'active_products': active_products,
-        'total_orders': recent_orders.count(),
-        'total_revenue': total_revenue,
+        'total_products': stats.product_count,
+        'active_products': stats.active_product_count,
+        'total_sales': stats.units_sold,
+        'total_orders': stats.order_count,
+        'total_revenue': stats.revenue,
         'recent_orders': recent_orders,
         'vendor_products': vendor_products[:5],  # Recent products
-        'categories': Category.objects.all()  # For add product modal
+        'categories': Category.objects.all(),  # For add product modal
+        'import_max_mb': importer.max_upload_bytes() // (1024 * 1024)
     })
 
 
@@ -92,34 +99,19 @@ def admin_dashboard(request):
     """
     Admin dashboard with overall system statistics
     """
-    # User statistics
-    total_users = User.objects.filter(role='user').count()
-    total_vendors = User.objects.filter(role='vendor').count()
-    total_admins = User.objects.filter(role='admin').count()
-    
-    # Product statistics
-    total_products = Product.objects.count()
-    active_products = Product.objects.filter(is_active=True).count()
-    
-    # Order statistics
-    total_orders = Order.objects.count()
-    total_revenue = Order.objects.aggregate(
-        revenue=Sum('total_amount')
-    )['revenue'] or 0
+    # Platform totals come from the KPI snapshot, refreshed in the background
+    kpis, kpis_age = kpi_snapshot.get_snapshot()
+    kpis_pending = kpis is None
     
     # Recent activities
-    recent_orders = Order.objects.all()[:10]
+    recent_orders = Order.objects.select_related('user')[:10]
     recent_products = Product.objects.all()[:10]
     recent_users = User.objects.filter(role__in=['user', 'vendor'])[:10]
     
     return render(request, 'dashboard/admin_dashboard.html', {
-        'total_users': total_users,
-        'total_vendors': total_vendors,
-        'total_admins': total_admins,
-        'total_products': total_products,
-        'active_products': active_products,
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
+        **(kpis or {}),
+        'kpis_age': int(kpis_age or 0),
+        'kpis_pending': kpis_pending,
         'recent_orders': recent_orders,
         'recent_products': recent_products,
         'recent_users': recent_users
@@ -138,9 +130,7 @@ def vendor_products(request):
     products = Product.objects.filter(vendor=request.user)
     
     # Pagination
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products = get_keyset_page(request, products, 10)
     
     return render(request, 'dashboard/vendor_products.html', {
         'products': products
@@ -186,6 +176,48 @@ def add_product(request):
     return redirect('dashboard:home')
 
 
+@login_required
+def import_products(request):
+    """
+    Bulk create/update products from an uploaded CSV or JSONL file (vendor only)
+    """
+    if request.user.role != 'vendor':
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard:home')
+    
+    upload = request.FILES.get('file')
+    if request.method != 'POST' or upload is None:
+        if request.method == 'POST':
+            messages.error(request, 'Choose a CSV or JSONL file to import.')
+        return redirect('dashboard:home')
+    
+    # The import runs inside this request; keep it short
+    if upload.size > importer.max_upload_bytes():
+        messages.error(
+            request,
+            f'Files over {importer.max_upload_bytes() // (1024 * 1024)} MB cannot be imported here. '
+            f'Please send the file to the marketplace team for a bulk import.'
+        )
+        return redirect('dashboard:home')
+    
+    try:
+        fmt = importer.detect_format(upload.name)
+        result = importer.import_products(request.user, upload.open('rb'), fmt)
+    except importer.ImportFileError as e:
+        messages.error(request, f'Import failed: {e}')
+        return redirect('dashboard:home')
+    
+    messages.success(
+        request,
+        f"Imported {result['rows']} rows: {result['created']} created, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged ({result['rate']:,.0f} rows/s)."
+    )
+    if result['failed']:
+        shown = '; '.join(f'line {line}: {message}' for line, message in result['errors'][:5])
+        messages.warning(request, f"{result['failed']} rows skipped. {shown}")
+    return redirect('dashboard:home')
+
+
 @login_required
 def edit_product(request, product_id):
     """
@@ -242,41 +274,77 @@ def vendor_analytics(request):
     
     vendor = request.user
     
-    # Product analytics
-    products = Product.objects.filter(vendor=vendor)
-    product_sales = OrderItem.objects.filter(product__vendor=vendor)
+    # Time series from the daily rollup, never from raw order lines
+    period = request.GET.get('period', 'month')
+    if period not in ANALYTICS_PERIODS:
+        period = 'month'
+    since = timezone.localdate() - ANALYTICS_PERIODS[period]
+    # Start on a bucket boundary so the oldest bucket is not partial
+    if period == 'week':
+        since -= timedelta(days=since.weekday())
+    elif period == 'month':
+        since = since.replace(day=1)
+    sales_series = DailySales.series(vendor, period, since=since)
     
     # Sales by product
-    sales_by_product = product_sales.values('product__name').annotate(
-        total_sold=Sum('quantity'),
-        total_revenue=Sum('quantity') * Sum('price')
-    ).order_by('-total_sold')
-    
-    # Calculate total revenue properly
-    total_revenue = 0
-    for item in product_sales:
-        total_revenue += item.price * item.quantity
-    
-    # Monthly sales (simplified)
-    monthly_sales = product_sales.values('order__created_at__month').annotate(
-        total_sales=Sum('quantity'),
-        total_revenue=Sum('quantity') * Sum('price')
-    ).order_by('-order__created_at__month')
-    
-    # Order statistics
-    vendor_orders = Order.objects.filter(items__product__vendor=vendor).distinct()
-    total_orders = vendor_orders.count()
+    sales_by_product = DailySales.top_products(vendor)
+    
+    # Totals
+    stats = VendorStats.for_vendor(vendor)
     
     return render(request, 'dashboard/vendor_analytics.html', {
         'sales_by_product': sales_by_product,
-        'monthly_sales': monthly_sales,
-        'total_products': products.count(),
-        'total_sales': product_sales.aggregate(total=Sum('quantity'))['total'] or 0,
-        'total_revenue': total_revenue,
-        'total_orders': total_orders
+        'sales_series': sales_series,
+        'series_max': max((row['revenue'] for row in sales_series), default=0),
+        'period': period,
+        'total_products': stats.product_count,
+        'total_sales': stats.units_sold,
+        'total_revenue': stats.revenue,
+        'total_orders': stats.order_count
     })
 
 
+def _filter_users(request):
+    """Users listed by admin_users and its export, with the role filter applied"""
+    users = User.objects.all().order_by('-date_joined')
+    
+    # Filter by role
+    role_filter = request.GET.get('role', '')
+    if role_filter:
+        users = users.filter(role=role_filter)
+    return users, role_filter
+
+
+def _filter_products(request):
+    """Products listed by admin_products and its export, with the search applied"""
+    products = Product.objects.select_related('vendor', 'category').order_by('-created_at')
+    
+    # Search functionality
+    search_query = request.GET.get('search', '')
+    if search_query:
+        products = products.filter(
+            Q(name__icontains=search_query) |
+            Q(description__icontains=search_query) |
+            Q(vendor__username__icontains=search_query) |
+            Q(category__name__icontains=search_query)
+        )
+    return products, search_query
+
+
+def _filter_orders(request):
+    """Orders listed by admin_orders and its export"""
+    return Order.objects.select_related('user').order_by('-created_at')
+
+
+def _export_format(request):
+    """Requested export format, or None after flagging an unknown one"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        messages.error(request, 'Unsupported export format.')
+        return None
+    return fmt
+
+
 @login_required
 def admin_users(request):
     """
@@ -286,17 +354,10 @@ def admin_users(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    users = User.objects.all().order_by('-date_joined')
-    
-    # Filter by role
-    role_filter = request.GET.get('role', '')
-    if role_filter:
-        users = users.filter(role=role_filter)
+    users, role_filter = _filter_users(request)
     
     # Pagination
-    paginator = Paginator(users, 20)
-    page_number = request.GET.get('page')
-    users = paginator.get_page(page_number)
+    users = get_keyset_page(request, users, 20, keys=('-date_joined', '-id'))
     
     return render(request, 'dashboard/admin_users.html', {
         'users': users,
@@ -313,22 +374,10 @@ def admin_products(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    products = Product.objects.all().order_by('-created_at')
-    
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(vendor__username__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+    products, search_query = _filter_products(request)
     
     # Pagination
-    paginator = Paginator(products, 20)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products = get_keyset_page(request, products, 20)
     
     return render(request, 'dashboard/admin_products.html', {
         'products': products,
@@ -345,18 +394,63 @@ def admin_orders(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    orders = Order.objects.all().order_by('-created_at')
+    orders = _filter_orders(request)
     
     # Pagination
-    paginator = Paginator(orders, 20)
-    page_number = request.GET.get('page')
-    orders = paginator.get_page(page_number)
+    orders = get_keyset_page(request, orders, 20)
     
     return render(request, 'dashboard/admin_orders.html', {
         'orders': orders
     })
 
 
+@login_required
+def admin_users_export(request):
+    """
+    Admin: Download the filtered user list as CSV or JSON Lines
+    """
+    if not (request.user.role == 'admin' or request.user.is_superuser):
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard:home')
+    
+    fmt = _export_format(request)
+    if fmt is None:
+        return redirect('dashboard:admin_users')
+    users, role_filter = _filter_users(request)
+    return exports.export_response(users, exports.USER_COLUMNS, fmt, 'users')
+
+
+@login_required
+def admin_products_export(request):
+    """
+    Admin: Download the filtered product list as CSV or JSON Lines
+    """
+    if not (request.user.role == 'admin' or request.user.is_superuser):
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard:home')
+    
+    fmt = _export_format(request)
+    if fmt is None:
+        return redirect('dashboard:admin_products')
+    products, search_query = _filter_products(request)
+    return exports.export_response(products, exports.PRODUCT_COLUMNS, fmt, 'products')
+
+
+@login_required
+def admin_orders_export(request):
+    """
+    Admin: Download the order list as CSV or JSON Lines
+    """
+    if not (request.user.role == 'admin' or request.user.is_superuser):
+        messages.error(request, 'Access denied.')
+        return redirect('dashboard:home')
+    
+    fmt = _export_format(request)
+    if fmt is None:
+        return redirect('dashboard:admin_orders')
+    return exports.export_response(_filter_orders(request), exports.ORDER_COLUMNS, fmt, 'orders')
+
+
 @login_required
 def admin_remove_product(request, product_id):
     """
@@ -440,15 +534,15 @@ def admin_user_products(request, user_id):
         return redirect('dashboard:admin_users')
     
     products = Product.objects.filter(vendor=user).order_by('-created_at')
+    active_products = products.filter(is_active=True).count()
     
     # Pagination
-    paginator = Paginator(products, 10)
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products = get_keyset_page(request, products, 10)
     
     return render(request, 'dashboard/admin_user_products.html', {
         'user': user,
-        'products': products
+        'products': products,
+        'active_products': active_products
     })
 
 
@@ -462,21 +556,20 @@ def admin_user_wallet(request, user_id):
         return redirect('dashboard:home')
     
     user = get_object_or_404(User, id=user_id)
-    wallet = user.wallet
+    wallet = Wallet.objects.for_user(user)
     transactions = wallet.transactions.all().order_by('-date')[:20]
     
-    # Calculate statistics
-    total_credits = wallet.transactions.filter(transaction_type='credit').aggregate(
-        total=Sum('amount'))['total'] or 0
-    total_debits = wallet.transactions.filter(transaction_type='debit').aggregate(
-        total=Sum('amount'))['total'] or 0
+    # Lifetime totals are kept on the wallet by the ledger
+    total_credits = wallet.total_credits
+    total_debits = wallet.total_debits
     
     return render(request, 'dashboard/admin_user_wallet.html', {
         'user': user,
         'wallet': wallet,
         'transactions': transactions,
         'total_credits': total_credits,
-        'total_debits': total_debits
+        'total_debits': total_debits,
+        'net_flow': total_credits - total_debits
     })
 
 
@@ -489,10 +582,14 @@ def vendor_orders(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    # Get all orders that contain vendor's products
-    orders = Order.objects.filter(
-        items__product__vendor=request.user
-    ).distinct().order_by('-created_at')
+    # Vendor's sub-orders, with only this vendor's lines loaded for display
+    orders = VendorOrder.objects.filter(vendor=request.user).select_related('order__user').prefetch_related(
+        Prefetch(
+            'order__items',
+            queryset=OrderItem.objects.filter(product__vendor=request.user).select_related('product'),
+            to_attr='vendor_items'
+        )
+    )
     
     # Filter by status if requested
     status_filter = request.GET.get('status', '')
@@ -500,25 +597,19 @@ def vendor_orders(request):
         orders = orders.filter(status=status_filter)
     
     # Pagination
-    paginator = Paginator(orders, 10)
-    page_number = request.GET.get('page')
-    orders = paginator.get_page(page_number)
+    orders = get_keyset_page(request, orders, 10)
     
-    # Order statistics
-    total_orders = Order.objects.filter(items__product__vendor=request.user).distinct().count()
-    confirmed_orders = Order.objects.filter(items__product__vendor=request.user, status='confirmed').distinct().count()
-    processing_orders = Order.objects.filter(items__product__vendor=request.user, status='processing').distinct().count()
-    shipped_orders = Order.objects.filter(items__product__vendor=request.user, status='shipped').distinct().count()
-    delivered_orders = Order.objects.filter(items__product__vendor=request.user, status='delivered').distinct().count()
+    # Order statistics from the per-status counters
+    order_counts = VendorOrderCount.counts_for(request.user)
     
     return render(request, 'dashboard/vendor_orders.html', {
         'orders': orders,
         'status_filter': status_filter,
-        'total_orders': total_orders,
-        'confirmed_orders': confirmed_orders,
-        'processing_orders': processing_orders,
-        'shipped_orders': shipped_orders,
-        'delivered_orders': delivered_orders
+        'total_orders': order_counts['total'],
+        'confirmed_orders': order_counts.get('confirmed', 0),
+        'processing_orders': order_counts.get('processing', 0),
+        'shipped_orders': order_counts.get('shipped', 0),
+        'delivered_orders': order_counts.get('delivered', 0)
     })
 
 
@@ -531,14 +622,18 @@ def vendor_order_detail(request, order_id):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    # Get order that contains vendor's products
-    order = get_object_or_404(Order, order_id=order_id, items__product__vendor=request.user)
+    # This vendor's share of the order
+    vendor_order = get_object_or_404(
+        VendorOrder.objects.select_related('order__user'), order__order_id=order_id, vendor=request.user
+    )
+    order = vendor_order.order
     
     # Get only the vendor's items from this order
-    vendor_items = order.items.filter(product__vendor=request.user)
+    vendor_items = order.items.filter(product__vendor=request.user).select_related('product__category')
     
     return render(request, 'dashboard/vendor_order_detail.html', {
         'order': order,
+        'vendor_order': vendor_order,
         'vendor_items': vendor_items
     })
 
@@ -546,20 +641,28 @@ def vendor_order_detail(request, order_id):
 @login_required
 def update_order_status(request, order_id):
     """
-    Update order status (vendor only)
+    Update the vendor's own fulfillment status for an order (vendor only)
     """
     if request.user.role != 'vendor':
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    order = get_object_or_404(Order, order_id=order_id, items__product__vendor=request.user)
+    vendor_order = get_object_or_404(VendorOrder, order__order_id=order_id, vendor=request.user)
     
     if request.method == 'POST':
         new_status = request.POST.get('status')
-        if new_status in ['confirmed', 'processing', 'shipped', 'delivered', 'cancelled']:
-            order.status = new_status
-            order.save()
-            messages.success(request, f'Order status updated to {order.get_status_display()}')
+        if new_status in ORDER_STATUSES and new_status != 'pending':
+            with transaction.atomic():
+                # Lock the order, then the sub-order, so concurrent updates move the
+                # counters once each and the order status sees every vendor's change
+                order = Order.objects.select_for_update().get(pk=vendor_order.order_id)
+                vendor_order = VendorOrder.objects.select_for_update().get(pk=vendor_order.pk)
+                old_status = vendor_order.status
+                vendor_order.status = new_status
+                vendor_order.save(update_fields=['status', 'updated_at'])
+                VendorOrderCount.move([request.user.pk], old_status, new_status)
+                order.sync_status()
+            messages.success(request, f'Order status updated to {vendor_order.get_status_display()}')
         else:
             messages.error(request, 'Invalid status.')
     
@@ -575,35 +678,20 @@ def vendor_wallet(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    wallet = request.user.wallet
+    wallet = Wallet.objects.for_user(request.user)
     transactions = wallet.transactions.all().order_by('-date')[:20]  # Latest 20 transactions
     
-    # Calculate earnings this month
-    from django.utils import timezone
-    from datetime import timedelta
-    
+    # Earnings this month from the running totals and the latest snapshot
     current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    next_month = (current_month + timedelta(days=32)).replace(day=1)
-    
-    monthly_earnings = WalletTransaction.objects.filter(
-        wallet=wallet,
-        transaction_type='credit',
-        date__gte=current_month,
-        date__lt=next_month
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Calculate total earnings
-    total_earnings = WalletTransaction.objects.filter(
-        wallet=wallet,
-        transaction_type='credit'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    monthly_earnings = wallet.statement(current_month)['credits']
+    total_earnings = wallet.total_credits
     
-    # Calculate pending withdrawals
-    pending_withdrawals = WalletTransaction.objects.filter(
-        wallet=wallet,
+    # Withdrawals are the debits posted by withdraw_money; other debits
+    # (purchases, adjustments) are not counted
+    pending_withdrawals = wallet.transactions.filter(
         transaction_type='debit',
-        description__icontains='Withdrawal'
-    ).aggregate(total=Sum('amount'))['total'] or 0
+        description__startswith=WITHDRAWAL_PREFIX
+    ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
     
     return render(request, 'dashboard/vendor_wallet.html', {
         'wallet': wallet,
@@ -632,23 +720,13 @@ def withdraw_money(request):
                 messages.error(request, 'Please enter a valid amount.')
                 return redirect('dashboard:vendor_wallet')
             
-            wallet = request.user.wallet
+            wallet = Wallet.objects.for_user(request.user)
             
-            if not wallet.can_deduct(amount):
+            # The ledger checks the balance under a row lock
+            if not wallet.deduct_money(amount, f'{WITHDRAWAL_PREFIX} - {description}'):
                 messages.error(request, f'Insufficient balance. Available: ${wallet.balance}')
                 return redirect('dashboard:vendor_wallet')
             
-            # Deduct money from wallet
-            wallet.deduct_money(amount)
-            
-            # Create withdrawal transaction
-            WalletTransaction.objects.create(
-                wallet=wallet,
-                transaction_type='debit',
-                amount=amount,
-                description=f'Withdrawal - {description}'
-            )
-            
             messages.success(request, f'${amount} withdrawal request processed successfully!')
             
         except (ValueError, TypeError):
@@ -699,9 +777,7 @@ def admin_contacts(request):
     resolved_contacts = Contact.objects.filter(status='resolved').count()
     
     # Pagination
-    paginator = Paginator(contacts, 20)
-    page_number = request.GET.get('page')
-    contacts = paginator.get_page(page_number)
+    contacts = get_keyset_page(request, contacts, 20)
     
     return render(request, 'dashboard/admin_contacts.html', {
         'contacts': contacts,
@@ -789,16 +865,14 @@ def admin_marketplace_earnings(request):
     # Get marketplace transactions
     transactions = marketplace_wallet.transactions.all().order_by('-date')
     
-    # Statistics
-    total_commissions = marketplace_wallet.total_commission_earned
-    current_balance = marketplace_wallet.balance
+    # Statistics (last rollup snapshot plus transactions appended since)
+    live_totals = marketplace_wallet.live_totals()
+    total_commissions = live_totals['total_commission_earned']
+    current_balance = live_totals['balance']
     commission_rate = float(marketplace_wallet.commission_rate) * 100
     vendor_percentage = 100 - commission_rate
     
     # Monthly commission earnings
-    from django.utils import timezone
-    from datetime import timedelta
-    
     current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     next_month = (current_month + timedelta(days=32)).replace(day=1)
     
@@ -823,10 +897,8 @@ def admin_marketplace_earnings(request):
         else:
             vendor_data['avg_commission'] = 0
     
-    # Recent transactions with pagination
-    paginator = Paginator(transactions, 20)
-    page_number = request.GET.get('page')
-    transactions = paginator.get_page(page_number)
+    # Pagination
+    transactions = get_keyset_page(request, transactions, 20, keys=('-date', '-id'))
     
     return render(request, 'dashboard/admin_marketplace_earnings.html', {
         'marketplace_wallet': marketplace_wallet,
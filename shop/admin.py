@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Product, CartItem, Order, OrderItem, Contact
+from .models import Category, Product, MediaBlob, CartItem, Order, OrderItem, VendorOrder, Contact
 
 
 @admin.register(Category)
@@ -41,6 +41,23 @@ class ProductAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(MediaBlob)
+class MediaBlobAdmin(admin.ModelAdmin):
+    """
+    Admin for MediaBlob model
+    """
+    list_display = ('name', 'ref_count', 'created_at', 'updated_at')
+    search_fields = ('name',)
+    ordering = ('-updated_at',)
+    
+    def has_add_permission(self, request):
+        # Blobs are counted from product saves
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     """
@@ -66,17 +83,27 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ('product', 'quantity', 'price')
 
 
+class VendorOrderInline(admin.TabularInline):
+    """
+    Inline admin for per-vendor sub-orders
+    """
+    model = VendorOrder
+    extra = 0
+    readonly_fields = ('vendor', 'subtotal', 'created_at')
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """
     Admin for Order model
     """
-    list_display = ('order_id', 'user', 'total_amount', 'status', 'tracking_id', 'created_at')
+    list_display = ('order_id', 'user', 'total_amount', 'item_count', 'status', 'tracking_id', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('order_id', 'user__username', 'tracking_id')
     ordering = ('-created_at',)
-    readonly_fields = ('order_id', 'tracking_id', 'created_at', 'updated_at')
-    inlines = [OrderItemInline]
+    readonly_fields = ('order_id', 'tracking_id', 'item_count', 'first_item_name', 'vendor_count',
+                       'created_at', 'updated_at')
+    inlines = [OrderItemInline, VendorOrderInline]
     
     fieldsets = (
         ('Order Information', {
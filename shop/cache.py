@@ -0,0 +1,145 @@
+"""
+Full-page cache for anonymous visitors.
+
+Each cached page is stored under a key that embeds the current version of
+every tag it depends on, e.g. 'catalog' or 'product:42'. Model signals bump
+tag versions instead of deleting keys, so editing one product only makes the
+pages tagged with it unreachable; stale entries simply age out.
+
+Tags a view only learns while rendering (the related products a detail page
+shows) are added with add_page_tags(); their versions are stored with the
+page and checked again on every hit.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+KEY_PREFIX = 'pagecache'
+HITS_KEY = f'{KEY_PREFIX}:hits'
+MISSES_KEY = f'{KEY_PREFIX}:misses'
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def tag_versions(tags):
+    """
+    Return the current version of each tag, initialising missing ones
+    """
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock so a version lost to eviction never repeats
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    """
+    Bump tag versions so pages cached under them are never served again
+    """
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def invalidate_products(product_ids):
+    invalidate('catalog', *[f'product:{product_id}' for product_id in product_ids])
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def stats():
+    """
+    Hit/miss counters since the cache was last cleared
+    """
+    counters = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+    }
+
+
+def add_page_tags(request, tags):
+    """
+    Make the page being rendered depend on more tags, e.g. the products it
+    links to; a no-op when the page is not being cached
+    """
+    if hasattr(request, '_page_cache_tags'):
+        request._page_cache_tags.extend(tags)
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # A session means a guest cart (cart_count) or pending flash messages
+    if request.session.session_key or 'messages' in request.COOKIES:
+        return False
+    return True
+
+
+def _is_cacheable_response(request, response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    # Pages rendering {% csrf_token %} carry a per-visitor token
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+        return False
+    return True
+
+
+def cache_anonymous_page(tags=()):
+    """
+    Cache a view's response for anonymous GET requests.
+    tags is a list of tag names or a callable (request, *args, **kwargs) -> tags.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            page_tags = tags(request, *args, **kwargs) if callable(tags) else tags
+            versions = tag_versions(page_tags)
+            fingerprint = f'{request.get_full_path()}|{versions}'
+            key = f'{KEY_PREFIX}:entry:{hashlib.md5(fingerprint.encode()).hexdigest()}'
+
+            entry = cache.get(key)
+            if entry is not None:
+                response, extra_tags, extra_versions = entry
+                if not extra_tags or tag_versions(extra_tags) == extra_versions:
+                    _count(HITS_KEY)
+                    response['X-Page-Cache'] = 'HIT'
+                    return response
+
+            _count(MISSES_KEY)
+            request._page_cache_tags = []
+            response = view_func(request, *args, **kwargs)
+            if _is_cacheable_response(request, response):
+                extra_tags = request._page_cache_tags
+                entry = (response, extra_tags, tag_versions(extra_tags))
+                cache.set(key, entry, getattr(settings, 'PAGE_CACHE_TIMEOUT', 300))
+                response['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
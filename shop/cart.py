@@ -0,0 +1,149 @@
+"""
+Cart helpers.
+
+The navbar cart count is kept in the session together with the id of the user
+it was computed for, so templates do not COUNT cart rows on every render. Cart
+writes adjust it in place and it is only recounted on a miss.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from .models import CartItem, Product
+
+
+SESSION_KEY = 'cart_count'
+
+
+def _owner(request):
+    return request.user.pk if request.user.is_authenticated else None
+
+
+def get_cart_items(request):
+    """
+    Cart rows for the logged-in user or the guest session
+    """
+    if request.user.is_authenticated:
+        return CartItem.objects.filter(user=request.user)
+    if hasattr(request, 'session') and request.session.session_key:
+        return CartItem.objects.filter(session_key=request.session.session_key)
+    return CartItem.objects.none()
+
+
+def get_cart_count(request):
+    """
+    Number of distinct products in the cart, counted only on a cache miss
+    """
+    if not request.user.is_authenticated:
+        if not (hasattr(request, 'session') and request.session.session_key):
+            return 0
+
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached[0] == _owner(request):
+        return cached[1]
+
+    count = get_cart_items(request).count()
+    set_cart_count(request, count)
+    return count
+
+
+def set_cart_count(request, count):
+    request.session[SESSION_KEY] = [_owner(request), count]
+
+
+def adjust_cart_count(request, delta):
+    """
+    Apply a known change to the cached count, or drop it if it is not cached
+    """
+    cached = request.session.get(SESSION_KEY)
+    if cached and cached[0] == _owner(request):
+        set_cart_count(request, max(cached[1] + delta, 0))
+    else:
+        request.session.pop(SESSION_KEY, None)
+
+
+# Insert the row if the product is active and has enough stock, otherwise bump
+# the existing row's quantity, never past the product's current stock.
+_UPSERT_SQL = """
+    INSERT INTO shop_cartitem (user_id, session_key, product_id, quantity, added_at)
+    SELECT %s, %s, p.id, %s, %s FROM shop_product p
+    WHERE p.id = %s AND p.is_active AND p.stock >= %s AND %s > 0
+    ON CONFLICT ({owner}, product_id) WHERE {owner} IS NOT NULL
+    DO UPDATE SET quantity = {least}(
+        shop_cartitem.quantity + excluded.quantity,
+        (SELECT stock FROM shop_product WHERE id = excluded.product_id)
+    )
+"""
+
+# SQLite evaluates RETURNING subqueries after the write
+_SQLITE_SQL = _UPSERT_SQL + """
+    RETURNING quantity, (SELECT COUNT(*) FROM shop_cartitem WHERE {owner} = %s)
+"""
+
+# PostgreSQL subqueries see the snapshot from before the write, so add the new row
+_POSTGRES_SQL = """
+    WITH upsert AS (
+        """ + _UPSERT_SQL + """
+        RETURNING quantity, (xmax = 0) AS inserted
+    )
+    SELECT upsert.quantity,
+           (SELECT COUNT(*) FROM shop_cartitem WHERE {owner} = %s)
+           + CASE WHEN upsert.inserted THEN 1 ELSE 0 END
+    FROM upsert
+"""
+
+
+def _add_item_orm(owner_filter, product_id, quantity):
+    """
+    Portable fallback for databases without the upsert dialects above
+    """
+    with transaction.atomic():
+        product = Product.objects.select_for_update().filter(
+            id=product_id, is_active=True, stock__gte=quantity
+        ).first()
+        if product is None or quantity <= 0:
+            return None
+        updated = CartItem.objects.filter(product=product, **owner_filter).update(
+            quantity=Least(F('quantity') + quantity, product.stock)
+        )
+        if not updated:
+            CartItem.objects.create(product=product, quantity=quantity, **owner_filter)
+        cart_item = CartItem.objects.get(product=product, **owner_filter)
+        return cart_item.quantity, CartItem.objects.filter(**owner_filter).count()
+
+
+def add_item(request, product_id, quantity):
+    """
+    Add quantity of a product to the request's cart in one statement.
+    Returns (quantity now in cart, cart count), or None if the product is
+    inactive, missing or short on stock. The guest session must exist.
+    """
+    if request.user.is_authenticated:
+        owner, user_id, session_key = 'user_id', request.user.pk, None
+        owner_value, owner_filter = user_id, {'user': request.user}
+    else:
+        owner, user_id, session_key = 'session_key', None, request.session.session_key
+        owner_value, owner_filter = session_key, {'session_key': session_key}
+
+    if connection.vendor == 'postgresql':
+        sql = _POSTGRES_SQL.format(owner=owner, least='LEAST')
+    elif connection.vendor == 'sqlite':
+        sql = _SQLITE_SQL.format(owner=owner, least='MIN')
+    else:
+        result = _add_item_orm(owner_filter, product_id, quantity)
+        if result is not None:
+            set_cart_count(request, result[1])
+        return result
+
+    added_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    params = [user_id, session_key, quantity, added_at, product_id, quantity, quantity, owner_value]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    if row is None:
+        return None
+
+    quantity_in_cart, count = row
+    set_cart_count(request, count)
+    return quantity_in_cart, count
@@ -0,0 +1,163 @@
+"""
+Checkout service.
+
+place_order turns a user's cart into an order with a constant number of
+queries regardless of how many items or vendors are involved: rows are locked
+up front, stock is decremented with one conditional UPDATE that fails on
+oversell, and order lines, vendor sub-orders, the wallet ledger posting,
+commission rows and vendor sales statistics are written in bulk.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, PositiveIntegerField
+
+from accounts.models import Wallet, MarketplaceWallet, MarketplaceTransaction
+from accounts.ledger import post, InsufficientFunds
+from dashboard.models import VendorStats, DailySales, VendorOrderCount
+from .models import CartItem, Order, OrderItem, Product, VendorOrder
+from . import cache as page_cache
+
+
+CENT = Decimal('0.01')
+
+
+class CheckoutError(Exception):
+    """
+    An order could not be placed; the message is safe to show the user
+    """
+
+    def __init__(self, message, redirect_to='shop:checkout'):
+        super().__init__(message)
+        self.redirect_to = redirect_to
+
+
+def _per_row(key_field, values, output_field):
+    """
+    CASE expression mapping key_field values to per-row amounts
+    """
+    return Case(
+        *[When(**{key_field: key}, then=Value(value)) for key, value in values.items()],
+        output_field=output_field
+    )
+
+
+def place_order(user, shipping_address):
+    """
+    Place an order for everything in the user's cart and pay for it from
+    the user's wallet. Raises CheckoutError if the cart is empty, the wallet
+    is short or any product would be oversold; nothing is written then.
+    """
+    with transaction.atomic():
+        cart_items = list(
+            CartItem.objects.filter(user=user)
+            .select_related('product__vendor__wallet')
+            .select_for_update(of=('self',))
+        )
+        if not cart_items:
+            raise CheckoutError('Your cart is empty.', 'shop:cart')
+
+        total_amount = sum(item.get_total_price() for item in cart_items)
+
+        # Decrement all stock in one statement; a short product makes it match fewer rows
+        quantities = {item.product_id: item.quantity for item in cart_items}
+        sold = _per_row('id', quantities, PositiveIntegerField())
+        updated = Product.objects.filter(id__in=quantities, stock__gte=sold).update(stock=F('stock') - sold)
+        if updated != len(quantities):
+            short = Product.objects.filter(id__in=quantities).exclude(stock__gte=sold).first()
+            raise CheckoutError(
+                f'Insufficient stock for {short.name}. Available: {short.stock}' if short
+                else 'Some products in your cart are no longer available.',
+                'shop:cart'
+            )
+
+        order = Order.objects.create(
+            user=user,
+            total_amount=total_amount,
+            shipping_address=shipping_address,
+            status='confirmed',
+            item_count=len(cart_items),
+            first_item_name=cart_items[0].product.name,
+            vendor_count=len({item.product.vendor_id for item in cart_items})
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=item.product,
+                quantity=item.quantity,
+                price=item.product.price
+            )
+            for item in cart_items
+        ])
+
+        # Gross sales and units per vendor
+        vendor_payments = {}
+        vendor_units = {}
+        for item in cart_items:
+            vendor = item.product.vendor
+            vendor_payments[vendor] = vendor_payments.get(vendor, Decimal('0.00')) + item.get_total_price()
+            vendor_units[vendor.pk] = vendor_units.get(vendor.pk, 0) + item.quantity
+
+        # Split each vendor's sale between the vendor and the marketplace commission
+        marketplace_wallet = MarketplaceWallet.get_instance()
+        legs = [(Wallet.objects.for_user(user).pk, 'debit', total_amount, f'Purchase - Order {order.order_id}')]
+        marketplace_transactions = []
+        for vendor, gross_amount in vendor_payments.items():
+            commission_info = marketplace_wallet.calculate_commission(gross_amount)
+            commission_amount = commission_info['commission'].quantize(CENT)
+            vendor_net_amount = gross_amount - commission_amount
+
+            legs.append((
+                Wallet.objects.for_user(vendor).pk,
+                'credit',
+                vendor_net_amount,
+                f'Sale - Order {order.order_id} (Net: ${vendor_net_amount}, Commission: ${commission_amount})'
+            ))
+            marketplace_transactions.append(MarketplaceTransaction(
+                marketplace_wallet=marketplace_wallet,
+                transaction_type='commission',
+                amount=commission_amount,
+                description=f'Commission from Order {order.order_id} (8%)',
+                related_order_id=str(order.order_id),
+                vendor_username=vendor.username
+            ))
+
+        # Debit the buyer and credit every vendor as one posting; the buyer's
+        # locked balance is what decides whether the order goes through
+        try:
+            post(legs)
+        except InsufficientFunds as e:
+            raise CheckoutError(
+                f'Insufficient wallet balance. Required: ${total_amount}, Available: ${e.wallet.balance}'
+            )
+
+        # Append-only: the marketplace wallet row is rolled up periodically, never
+        # rewritten at checkout, so concurrent checkouts do not queue on it
+        MarketplaceTransaction.objects.bulk_create(marketplace_transactions)
+
+        # One fulfillment record per vendor, each tracking its own status
+        VendorOrder.objects.bulk_create([
+            VendorOrder(
+                order=order,
+                vendor=vendor,
+                subtotal=gross_amount,
+                status=order.status,
+                created_at=order.created_at
+            )
+            for vendor, gross_amount in vendor_payments.items()
+        ])
+
+        VendorStats.record_sales({
+            vendor.pk: (vendor_units[vendor.pk], gross_amount)
+            for vendor, gross_amount in vendor_payments.items()
+        })
+        DailySales.record_order(order, cart_items)
+        VendorOrderCount.bump(vendor_units, order.status)
+
+        # Clear cart
+        CartItem.objects.filter(id__in=[item.id for item in cart_items]).delete()
+
+        # Stock changed without model signals, purge what caches it
+        transaction.on_commit(lambda: page_cache.invalidate_products(list(quantities)))
+
+    return order
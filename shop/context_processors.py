@@ -1,15 +1,9 @@
-from .models import CartItem
+from .cart import get_cart_count
 
 
 def cart_count(request):
     """
     Context processor to provide cart count across all templates
+    Served from the session, see shop.cart
     """
-    count = 0
-    
-    if request.user.is_authenticated:
-        count = CartItem.objects.filter(user=request.user).count()
-    elif hasattr(request, 'session') and request.session.session_key:
-        count = CartItem.objects.filter(session_key=request.session.session_key).count()
-    
-    return {'cart_count': count} 
\ No newline at end of file
+    return {'cart_count': get_cart_count(request)}
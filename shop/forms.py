@@ -41,6 +41,16 @@ class ProductForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields['category'].queryset = Category.objects.all()
+        if 'category' in self.fields:
+            self.fields['category'].queryset = Category.objects.all()
         for field in self.fields:
-            self.fields[field].required = True 
\ No newline at end of file
+            self.fields[field].required = True
+
+
+class ProductImportForm(ProductForm):
+    """
+    ProductForm's rules for one bulk-imported row; the category is resolved
+    by shop.importer and imports carry no image
+    """
+    class Meta(ProductForm.Meta):
+        fields = ['name', 'description', 'price', 'stock'] 
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Product image derivatives.
+
+Uploaded product images are resized with Pillow into a few fixed widths,
+each as WebP plus a JPEG (PNG for images with transparency) fallback.
+Derivative names carry a hash of the original's bytes, so they never need
+cache busting and an unchanged upload maps onto the files it already has.
+
+Generation is CPU-bound and runs in a process pool, off the request path:
+saving a product with a new image schedules it once the transaction
+commits, and the product's image_variants manifest is filled in when the
+worker finishes. Until then, and for products without variants, templates
+fall back to the original. build_image_variants backfills existing images.
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (160, 320, 640)
+DERIVED_DIR = 'products/derived'
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def init_worker():
+    """
+    Process pool initializer; a no-op for forked workers, needed for spawned ones
+    """
+    django.setup()
+
+
+def _fallback_format(image):
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        return 'png'
+    return 'jpeg'
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif fmt == 'png':
+        image.save(buffer, 'PNG', optimize=True)
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_variants(name):
+    """
+    Build every derivative of the stored image `name` and return its
+    manifest: {'source': name, 'width': original width,
+    'webp': [[width, path], ...], '<fallback format>': [...], 'fallback': fmt}.
+    Derivatives that already exist are not rewritten.
+    """
+    with default_storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original)
+        fallback = _fallback_format(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            original = original.convert('RGBA' if fallback == 'png' else 'RGB')
+
+        manifest = {'source': name, 'width': original.width, 'fallback': fallback, 'webp': [], fallback: []}
+        widths = sorted({min(width, original.width) for width in VARIANT_WIDTHS})
+        for width in widths:
+            resized = None
+            for fmt in ('webp', fallback):
+                path = f'{DERIVED_DIR}/{digest}-{width}.{"jpg" if fmt == "jpeg" else fmt}'
+                if not default_storage.exists(path):
+                    if resized is None:
+                        height = max(1, round(original.height * width / original.width))
+                        resized = original.resize((width, height), Image.Resampling.LANCZOS)
+                    path = default_storage.save(path, ContentFile(_encode(resized, fmt)))
+                manifest[fmt].append([width, path])
+    return manifest
+
+
+def store_manifest(product_id, manifest):
+    """
+    Attach a finished manifest to the product, unless its image has been
+    replaced in the meantime. Returns True if the product was updated.
+    """
+    from .models import Product
+    from . import cache as page_cache
+
+    updated = Product.objects.filter(pk=product_id, image=manifest['source']).update(
+        image_variants=manifest, updated_at=timezone.now()
+    )
+    if updated:
+        # update() sends no signals; the typeahead picks it up from updated_at
+        page_cache.invalidate_products([product_id])
+    return bool(updated)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+                initializer=init_worker,
+            )
+        return _pool
+
+
+def _finished(product_id, future):
+    try:
+        store_manifest(product_id, future.result())
+    except Exception:
+        logger.exception('Image variants for product %s failed', product_id)
+    finally:
+        # Runs on the pool's management thread, which keeps its own connection
+        connection.close()
+
+
+def _submit(product_id, name):
+    if not getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2):
+        # No pool configured: generate inline, after the response's commit
+        try:
+            store_manifest(product_id, generate_variants(name))
+        except Exception:
+            logger.exception('Image variants for product %s failed', product_id)
+        return
+    future = _get_pool().submit(generate_variants, name)
+    future.add_done_callback(lambda done: _finished(product_id, done))
+
+
+def schedule(product):
+    """
+    Generate variants for the product's current image after commit
+    """
+    product_id, name = product.pk, product.image.name
+    transaction.on_commit(lambda: _submit(product_id, name))
+
+
+def needs_variants(product):
+    """
+    True if the product has an image whose variants are missing or stale
+    """
+    return bool(product.image) and (product.image_variants or {}).get('source') != product.image.name
+
+
+def srcset(manifest, fmt):
+    """
+    srcset attribute value for one format of a manifest
+    """
+    return ', '.join(f'{default_storage.url(path)} {width}w' for width, path in manifest.get(fmt, []))
+
+
+def variant_url(manifest, width, fmt=None):
+    """
+    URL of the smallest variant at least `width` wide (or the largest one)
+    """
+    variants = manifest.get(fmt or manifest.get('fallback'), [])
+    if not variants:
+        return None
+    for variant_width, path in variants:
+        if variant_width >= width:
+            return default_storage.url(path)
+    return default_storage.url(variants[-1][1])
+
@@ -0,0 +1,183 @@
+"""
+Bulk product import from CSV or JSON Lines.
+
+Files are read one row at a time, so an import of any size runs in constant
+memory. Each row is checked with ProductForm's field rules and its category
+looked up in a name -> id map loaded once per import. Products are matched
+on (vendor, name): rows are collected into batches, each batch loads the
+products it names in one query, and only new or changed products are written,
+with one bulk_create and one bulk_update per batch. Rows identical to the
+stored product are skipped without a write.
+
+bulk_create/bulk_update send no signals, so each batch refreshes the search
+index and purges cached pages itself; the typeahead picks the changes up from
+updated_at and the vendor's product counts are recomputed once at the end.
+
+The dashboard upload runs inside the request, so it only accepts files up to
+PRODUCT_IMPORT_MAX_UPLOAD_BYTES; larger catalogs are imported with the
+import_products management command.
+"""
+import csv
+import io
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.models import VendorStats
+from .forms import ProductImportForm
+from .models import Category, Product
+from . import cache as page_cache, search
+
+
+FORMATS = {
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+}
+DEFAULT_BATCH_SIZE = 500
+# Errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+COMPARED_FIELDS = ('description', 'price', 'stock', 'category_id')
+UPDATE_FIELDS = ['description', 'price', 'stock', 'category', 'updated_at']
+
+
+class ImportFileError(Exception):
+    """
+    The file as a whole cannot be imported; the message is safe to show
+    """
+
+
+def max_upload_bytes():
+    return getattr(settings, 'PRODUCT_IMPORT_MAX_UPLOAD_BYTES', 5 * 1024 * 1024)
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in FORMATS:
+        raise ImportFileError('Unsupported file type; upload a .csv or .jsonl file.')
+    return FORMATS[extension]
+
+
+def read_rows(binary_file, fmt):
+    """
+    Yield (line number, row dict) from a binary CSV or JSON Lines file;
+    rows that cannot be parsed are yielded as (line number, error message)
+    """
+    text = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            missing = {'name', 'price', 'category', 'stock', 'description'} - set(reader.fieldnames or ())
+            if missing:
+                raise ImportFileError(f'Missing column(s): {", ".join(sorted(missing))}.')
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(text, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_number, 'Invalid JSON.'
+                    continue
+                yield line_number, row if isinstance(row, dict) else 'Expected a JSON object.'
+    except UnicodeDecodeError:
+        raise ImportFileError('The file is not UTF-8 encoded.')
+    finally:
+        # Leave the caller's file open
+        text.detach()
+
+
+def category_map():
+    """
+    Category name (case-insensitive) or id -> category id
+    """
+    categories = {}
+    for pk, name in Category.objects.values_list('id', 'name'):
+        categories[name.strip().lower()] = pk
+        categories[str(pk)] = pk
+    return categories
+
+
+def import_products(vendor, binary_file, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create or update `vendor`'s products from a CSV/JSONL file. Returns
+    counts of rows created, updated, unchanged and failed, the first
+    MAX_REPORTED_ERRORS errors as (line, message), elapsed seconds and rows/s.
+    """
+    started = time.monotonic()
+    categories = category_map()
+    result = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+    batch = {}
+
+    def fail(line_number, message):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append((line_number, message))
+
+    for line_number, row in read_rows(binary_file, fmt):
+        result['rows'] += 1
+        if isinstance(row, str):
+            fail(line_number, row)
+            continue
+        data = {key: value for key, value in row.items() if key is not None}
+        form = ProductImportForm(data)
+        category_id = categories.get(str(data.get('category') or '').strip().lower())
+        if not form.is_valid() or category_id is None:
+            messages = [f'{field}: {" ".join(errors)}' for field, errors in form.errors.items()]
+            if category_id is None:
+                messages.append(f'category: Unknown category "{data.get("category") or ""}".')
+            fail(line_number, '; '.join(messages))
+            continue
+        values = dict(form.cleaned_data, category_id=category_id)
+        # A name repeated within the batch: the last row wins
+        batch.pop(values['name'], None)
+        batch[values['name']] = values
+        if len(batch) >= batch_size:
+            _write_batch(vendor, batch, result)
+            batch = {}
+    if batch:
+        _write_batch(vendor, batch, result)
+
+    if result['created']:
+        VendorStats.refresh_products(vendor.pk)
+    result['elapsed'] = time.monotonic() - started
+    result['rate'] = result['rows'] / result['elapsed'] if result['elapsed'] else 0
+    return result
+
+
+def _write_batch(vendor, batch, result):
+    existing = {}
+    for product in (Product.objects.filter(vendor=vendor, name__in=list(batch))
+                    .only('id', 'name', 'is_active', *COMPARED_FIELDS).order_by('id')):
+        existing.setdefault(product.name, product)
+
+    now = timezone.now()
+    created, updated = [], []
+    for name, values in batch.items():
+        product = existing.get(name)
+        if product is None:
+            created.append(Product(vendor=vendor, created_at=now, **values))
+        elif any(getattr(product, field) != values[field] for field in COMPARED_FIELDS):
+            for field in COMPARED_FIELDS:
+                setattr(product, field, values[field])
+            product.updated_at = now
+            updated.append(product)
+        else:
+            result['unchanged'] += 1
+
+    if not created and not updated:
+        return
+    with transaction.atomic():
+        Product.objects.bulk_create(created)
+        Product.objects.bulk_update(updated, UPDATE_FIELDS)
+        product_ids = [product.pk for product in created + updated]
+        search.index_products(product_ids)
+        transaction.on_commit(lambda: page_cache.invalidate_products(product_ids))
+    result['created'] += len(created)
+    result['updated'] += len(updated)
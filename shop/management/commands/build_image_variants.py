@@ -0,0 +1,56 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from shop import images
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generates resized WebP/JPEG variants for product images that lack them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes resizing images',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate manifests for every product image',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+        pending = {
+            product.pk: product.image.name
+            for product in products.iterator(chunk_size=2000)
+            if options['force'] or images.needs_variants(product)
+        }
+        if not pending:
+            self.stdout.write('All product images have variants.')
+            return
+
+        done = failed = 0
+        # Workers only touch storage; they must not share this connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=images.init_worker) as pool:
+            futures = {pool.submit(images.generate_variants, name): pk for pk, name in pending.items()}
+            for future in as_completed(futures):
+                product_id = futures[future]
+                try:
+                    images.store_manifest(product_id, future.result())
+                    done += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'Product {product_id} ({pending[product_id]}): {e}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {done} product images in {elapsed:.1f}s ({failed} failed).'
+        ))
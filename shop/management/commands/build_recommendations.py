@@ -0,0 +1,102 @@
+import heapq
+import math
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shop.models import OrderItem, ProductRecommendation
+from shop import cache
+
+
+class Command(BaseCommand):
+    help = 'Builds "customers also bought" recommendations from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=8,
+            help='Number of neighbours to keep per product',
+        )
+        parser.add_argument(
+            '--min-support',
+            type=int,
+            default=1,
+            help='Minimum number of shared orders for a pair to count',
+        )
+        parser.add_argument(
+            '--max-basket',
+            type=int,
+            default=50,
+            help='Ignore orders with more distinct products than this (bulk buys add noise)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        product_orders, co_orders, order_count = self.count_baskets(options['max_basket'])
+        self.stdout.write(
+            f'Scanned {order_count} orders: {len(product_orders)} products, '
+            f'{sum(len(row) for row in co_orders.values()) // 2} co-purchased pairs'
+        )
+
+        recommendations = []
+        for product_id, neighbours in co_orders.items():
+            # Cosine similarity between the products' order vectors
+            scored = (
+                (shared / math.sqrt(product_orders[product_id] * product_orders[other_id]), other_id)
+                for other_id, shared in neighbours.items()
+                if shared >= options['min_support']
+            )
+            top = heapq.nlargest(options['top'], scored)
+            recommendations.extend(
+                ProductRecommendation(
+                    product_id=product_id,
+                    recommended_id=other_id,
+                    score=score,
+                    rank=rank
+                )
+                for rank, (score, other_id) in enumerate(top)
+            )
+
+        with transaction.atomic():
+            ProductRecommendation.objects.all().delete()
+            ProductRecommendation.objects.bulk_create(recommendations, batch_size=1000)
+        cache.invalidate('recommendations')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {len(recommendations)} recommendations in {elapsed:.1f}s.'
+        ))
+
+    def count_baskets(self, max_basket):
+        """
+        Stream order lines once and build the sparse item-item co-occurrence
+        matrix as {product_id: Counter({other_id: shared_orders})}
+        """
+        product_orders = Counter()
+        co_orders = defaultdict(Counter)
+        order_count = 0
+
+        lines = OrderItem.objects.order_by('order_id').values_list('order_id', 'product_id')
+        current_order, basket = None, set()
+        for order_id, product_id in lines.iterator(chunk_size=5000):
+            if order_id != current_order:
+                order_count += self.add_basket(basket, max_basket, product_orders, co_orders)
+                current_order, basket = order_id, set()
+            basket.add(product_id)
+        order_count += self.add_basket(basket, max_basket, product_orders, co_orders)
+
+        return product_orders, co_orders, order_count
+
+    @staticmethod
+    def add_basket(basket, max_basket, product_orders, co_orders):
+        if not basket or len(basket) > max_basket:
+            return 0
+        product_orders.update(basket)
+        for product_id in basket:
+            row = co_orders[product_id]
+            for other_id in basket:
+                if other_id != product_id:
+                    row[other_id] += 1
+        return 1
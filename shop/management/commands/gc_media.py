@@ -0,0 +1,106 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from shop import images
+from shop.models import Product, MediaBlob
+from shop.storage import product_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Deletes product images and derivatives that no product references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Only delete files unreferenced for at least this long',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Rebuild reference counts from the products first',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would be deleted without deleting it',
+        )
+
+    def handle(self, *args, **options):
+        storage = product_image_storage
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+        self.freed = 0
+
+        if options['recount']:
+            changed = MediaBlob.recount()
+            self.stdout.write(f'Recounted references, {changed} blob(s) corrected.')
+
+        referenced = set(
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .values_list('image', flat=True).distinct()
+        )
+
+        # Blobs whose last reference went away before the grace period
+        blobs = 0
+        unreferenced = MediaBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff)
+        for blob in unreferenced.iterator():
+            if blob.name in referenced:
+                continue
+            if self.dry_run:
+                self.delete(storage, blob.name)
+                blobs += 1
+                continue
+            with transaction.atomic():
+                # Check again under the row lock: an upload of the same bytes
+                # (MediaBlob.claim) or a product using it may have come since
+                # the scan, and waits here until the file and row are gone
+                blob = unreferenced.select_for_update().filter(pk=blob.pk).first()
+                if blob is None or Product.objects.filter(image=blob.name).exists():
+                    continue
+                self.delete(storage, blob.name)
+                blob.delete()
+            blobs += 1
+
+        # Files nothing knows about: failed uploads, partial writes, legacy copies,
+        # and derivatives no product manifest lists
+        known = set(MediaBlob.objects.values_list('name', flat=True)) | referenced
+        derived = set()
+        for manifest in Product.objects.exclude(image_variants={}).values_list('image_variants', flat=True).iterator():
+            for key, value in manifest.items():
+                if isinstance(value, list):
+                    derived.update(path for width, path in value)
+        orphans = 0
+        for name in self.walk(storage, 'products'):
+            in_use = derived if name.startswith(images.DERIVED_DIR + '/') else known
+            if name not in in_use and storage.get_modified_time(name) < cutoff:
+                self.delete(storage, name)
+                orphans += 1
+
+        verb = 'Would free' if self.dry_run else 'Freed'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {self.freed / 1024 / 1024:.1f} MB: {blobs} unreferenced blob(s), {orphans} orphaned file(s).'
+        ))
+
+    def walk(self, storage, path):
+        if not storage.exists(path):
+            return
+        directories, files = storage.listdir(path)
+        for name in files:
+            yield posixpath.join(path, name)
+        for directory in directories:
+            yield from self.walk(storage, posixpath.join(path, directory))
+
+    def delete(self, storage, name):
+        if not storage.exists(name):
+            return
+        self.freed += storage.size(name)
+        if self.verbosity > 1 or self.dry_run:
+            self.stdout.write(f'  {name}')
+        if not self.dry_run:
+            storage.delete(name)
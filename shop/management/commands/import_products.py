@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from shop import importer
+
+
+class Command(BaseCommand):
+    help = "Creates or updates a vendor's products from a CSV or JSON Lines file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSONL file with name, description, price, category and stock')
+        parser.add_argument(
+            '--vendor',
+            required=True,
+            help='Username of the vendor the products belong to',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(set(importer.FORMATS.values())),
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=importer.DEFAULT_BATCH_SIZE,
+            help='Rows written per bulk query',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            vendor = User.objects.get(username=options['vendor'], role='vendor')
+        except User.DoesNotExist:
+            raise CommandError(f"No vendor named {options['vendor']!r}.")
+
+        try:
+            fmt = options['format'] or importer.detect_format(options['path'])
+            with open(options['path'], 'rb') as source:
+                result = importer.import_products(vendor, source, fmt, options['batch_size'])
+        except (OSError, importer.ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for line_number, message in result['errors']:
+            self.stdout.write(self.style.WARNING(f'Line {line_number}: {message}'))
+        if result['failed'] > len(result['errors']):
+            self.stdout.write(self.style.WARNING(f"... and {result['failed'] - len(result['errors'])} more."))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['rows']} rows in {result['elapsed']:.1f}s ({result['rate']:,.0f} rows/s): "
+            f"{result['created']} created, {result['updated']} updated, "
+            f"{result['unchanged']} unchanged, {result['failed']} failed."
+        ))
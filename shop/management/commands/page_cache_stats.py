@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shop import cache
+
+
+class Command(BaseCommand):
+    help = 'Shows anonymous page cache hit/miss counters'
+
+    def handle(self, *args, **options):
+        stats = cache.stats()
+        self.stdout.write(
+            f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+            f"Hit rate: {stats['hit_rate']:.1%}"
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from shop.models import Product
+from shop.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text product search index'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        self.stdout.write(f'Rebuilding search index with {backend.__class__.__name__}...')
+        backend.rebuild()
+
+        indexed = Product.objects.filter(is_active=True).count()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} active products.'))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from shop.models import Category, Product
-from accounts.models import Wallet, WalletTransaction
+from accounts.models import Wallet
 from decimal import Decimal
 
 User = get_user_model()
@@ -160,13 +160,7 @@ class Command(BaseCommand):
                 
                 # Add money to user wallets
                 wallet = user.wallet
-                wallet.add_money(Decimal('1000.00'))
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type='credit',
-                    amount=Decimal('1000.00'),
-                    description='Initial wallet balance'
-                )
+                wallet.add_money(Decimal('1000.00'), 'Initial wallet balance')
                 self.stdout.write(f'Created user: {user.username}/user123 (Wallet: $1000)')
 
         # Create sample products
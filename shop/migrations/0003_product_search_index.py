@@ -0,0 +1,50 @@
+from django.db import migrations, DatabaseError
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE shop_productsearch ("
+            "product_id bigint PRIMARY KEY REFERENCES shop_product (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX shop_productsearch_document_gin ON shop_productsearch USING GIN (document)"
+        )
+        schema_editor.execute(
+            "INSERT INTO shop_productsearch (product_id, document) "
+            "SELECT id, setweight(to_tsvector('english', name), 'A') || "
+            "setweight(to_tsvector('english', description), 'B') "
+            "FROM shop_product WHERE is_active"
+        )
+    elif vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                "CREATE VIRTUAL TABLE shop_productsearch USING fts5("
+                "name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except DatabaseError:
+            # SQLite built without FTS5, search falls back to LIKE lookups
+            return
+        schema_editor.execute(
+            "INSERT INTO shop_productsearch (rowid, name, description) "
+            "SELECT id, name, description FROM shop_product WHERE is_active"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute("DROP TABLE IF EXISTS shop_productsearch")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_contact'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def split_existing_orders(apps, schema_editor):
+    # One sub-order per (order, vendor), inheriting the order's status
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    VendorOrder = apps.get_model('shop', 'VendorOrder')
+    orders = {
+        order_id: (status, created_at)
+        for order_id, status, created_at in Order.objects.values_list('id', 'status', 'created_at').iterator()
+    }
+    shares = OrderItem.objects.values('order_id', 'product__vendor_id').annotate(
+        subtotal=Sum(F('price') * F('quantity'))
+    ).order_by()
+    VendorOrder.objects.bulk_create([
+        VendorOrder(
+            order_id=share['order_id'],
+            vendor_id=share['product__vendor_id'],
+            subtotal=share['subtotal'],
+            status=orders[share['order_id']][0],
+            created_at=orders[share['order_id']][1]
+        )
+        for share in shares.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_productrecommendation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='VendorOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_orders', to='shop.order')),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vendor_orders', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['vendor', 'status', 'created_at'], name='shop_vendor_vendor__778ce0_idx'), models.Index(fields=['vendor', 'created_at'], name='shop_vendor_vendor__513076_idx')],
+                'constraints': [models.UniqueConstraint(fields=('order', 'vendor'), name='unique_vendor_order')],
+            },
+        ),
+        migrations.RunPython(split_existing_orders, migrations.RunPython.noop),
+    ]
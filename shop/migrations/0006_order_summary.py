@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:53
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def fill_order_summaries(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    first_item = OrderItem.objects.filter(order=OuterRef('pk')).order_by('pk').values('product__name')[:1]
+    orders = Order.objects.annotate(
+        lines=Count('items'),
+        vendors=Count('items__product__vendor', distinct=True),
+        first_name=Subquery(first_item)
+    ).order_by()
+
+    batch = []
+    for order in orders.iterator(chunk_size=1000):
+        order.item_count = order.lines
+        order.vendor_count = order.vendors
+        order.first_item_name = order.first_name or ''
+        batch.append(order)
+        if len(batch) == 1000:
+            Order.objects.bulk_update(batch, ['item_count', 'vendor_count', 'first_item_name'])
+            batch = []
+    Order.objects.bulk_update(batch, ['item_count', 'vendor_count', 'first_item_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_vendororder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='first_item_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='vendor_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_order_summaries, migrations.RunPython.noop),
+    ]
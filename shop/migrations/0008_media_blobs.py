@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:12
+
+import django.utils.timezone
+import shop.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_existing_images(apps, schema_editor):
+    # Images uploaded before content addressing keep their names; each
+    # becomes a blob referenced by the products that use it
+    Product = apps.get_model('shop', 'Product')
+    MediaBlob = apps.get_model('shop', 'MediaBlob')
+    counts = (
+        Product.objects.exclude(image='').exclude(image__isnull=True)
+        .values_list('image').annotate(n=Count('id')).order_by()
+    )
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, ref_count=n) for name, n in counts], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=shop.storage.get_product_image_storage, upload_to='products/'),
+        ),
+        migrations.RunPython(count_existing_images, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,14 @@
 from django.db import models
 from django.utils import timezone
 from django.conf import settings
+from django.urls import reverse
 import uuid
 import random
 import string
 
+from . import images
+from .storage import get_product_image_storage
+
 
 class Category(models.Model):
     """
@@ -28,7 +32,9 @@ class Product(models.Model):
     """
     name = models.CharField(max_length=200)
     description = models.TextField()
-    image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image = models.ImageField(upload_to='products/', storage=get_product_image_storage, blank=True, null=True)
+    # Resized WebP/JPEG derivatives of image, filled in by shop.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     stock = models.PositiveIntegerField(default=0)
@@ -41,22 +47,115 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} - ${self.price}"
     
+    def image_url(self, width=320):
+        """Smallest derivative at least width pixels wide, else the original"""
+        if not self.image:
+            return None
+        return images.variant_url(self.image_variants or {}, width) or self.image.url
+    
+    @property
+    def card_image_url(self):
+        return self.image_url(320)
+    
+    @property
+    def thumbnail_url(self):
+        return self.image_url(160)
+    
+    def resized_image_url(self, width, height):
+        """Crop of the original rendered on demand (see shop.resize)"""
+        if not self.image:
+            return None
+        return reverse('shop:resize_image', args=[width, height, self.image.name])
+    
+    @property
+    def square_thumbnail_url(self):
+        # 2x the largest square slot (cart lines) for high-density screens
+        return self.resized_image_url(160, 160)
+    
+    @property
+    def image_srcset(self):
+        variants = self.image_variants or {}
+        return images.srcset(variants, variants.get('fallback'))
+    
+    @property
+    def webp_srcset(self):
+        return images.srcset(self.image_variants or {}, 'webp')
+    
     def is_in_stock(self):
         """Check if product is available in stock"""
         return self.stock > 0
     
     def reduce_stock(self, quantity):
-        """Reduce stock when product is sold"""
-        if self.stock >= quantity:
-            self.stock -= quantity
-            self.save()
-            return True
-        return False
+        """Reduce stock when product is sold (conditional UPDATE, never oversells)"""
+        updated = Product.objects.filter(pk=self.pk, stock__gte=quantity).update(
+            stock=models.F('stock') - quantity
+        )
+        if updated:
+            self.refresh_from_db(fields=['stock'])
+        return bool(updated)
     
     class Meta:
         ordering = ['-created_at']
 
 
+class MediaBlob(models.Model):
+    """
+    A stored product image and the number of products using it.
+    Content-addressed names (shop.storage) make identical uploads share one
+    blob; gc_media deletes blobs whose count has stayed at zero.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+    
+    @classmethod
+    def adjust(cls, deltas):
+        """Apply {name: delta} to the reference counts (two queries)"""
+        deltas = {name: delta for name, delta in deltas.items() if name and delta}
+        if not deltas:
+            return
+        cls.objects.bulk_create([cls(name=name) for name in deltas], ignore_conflicts=True)
+        for delta in set(deltas.values()):
+            names = [name for name, d in deltas.items() if d == delta]
+            cls.objects.filter(name__in=names).update(
+                ref_count=models.F('ref_count') + delta, updated_at=timezone.now()
+            )
+    
+    @classmethod
+    def claim(cls, name):
+        """
+        Create or lock the blob row for a file about to be stored and restart
+        its grace period, so gc_media leaves the file alone; call inside the
+        transaction that writes the file
+        """
+        cls.objects.bulk_create([cls(name=name)], ignore_conflicts=True)
+        cls.objects.filter(name=name).update(updated_at=timezone.now())
+    
+    @classmethod
+    def recount(cls):
+        """
+        Rebuild every count from the products, e.g. after bulk edits that
+        sent no signals. Returns the number of blobs whose count changed.
+        """
+        counts = dict(
+            Product.objects.exclude(image='').exclude(image__isnull=True)
+            .values_list('image').annotate(n=models.Count('id')).order_by()
+        )
+        cls.objects.bulk_create([cls(name=name) for name in counts], ignore_conflicts=True)
+        changed = []
+        for blob in cls.objects.all():
+            if blob.ref_count != counts.get(blob.name, 0):
+                blob.ref_count = counts.get(blob.name, 0)
+                blob.updated_at = timezone.now()
+                changed.append(blob)
+        cls.objects.bulk_update(changed, ['ref_count', 'updated_at'], batch_size=1000)
+        return len(changed)
+
+
 class CartItem(models.Model):
     """
     Shopping cart items for users
@@ -100,6 +199,7 @@ class Order(models.Model):
     ORDER_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('confirmed', 'Confirmed'),
+        ('processing', 'Processing'),
         ('shipped', 'Shipped'),
         ('delivered', 'Delivered'),
         ('cancelled', 'Cancelled'),
@@ -112,6 +212,10 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending')
     shipping_address = models.TextField()
+    # Summary written once at checkout so order listings need no per-row queries
+    item_count = models.PositiveIntegerField(default=0)
+    first_item_name = models.CharField(max_length=200, blank=True)
+    vendor_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -129,6 +233,22 @@ class Order(models.Model):
         suffix = ''.join(random.choices(string.digits, k=6))
         return f"{prefix}{suffix}"
     
+    def sync_status(self):
+        """
+        Derive the order status from its vendor sub-orders: the least advanced
+        one that is not cancelled, or cancelled when all of them are
+        """
+        statuses = set(self.vendor_orders.values_list('status', flat=True))
+        if not statuses:
+            return self.status
+        progress = [status for status, label in self.ORDER_STATUS_CHOICES]
+        open_statuses = statuses - {'cancelled'}
+        status = min(open_statuses, key=progress.index) if open_statuses else 'cancelled'
+        if status != self.status:
+            self.status = status
+            self.save(update_fields=['status', 'updated_at'])
+        return status
+    
     class Meta:
         ordering = ['-created_at']
 
@@ -150,6 +270,56 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+class VendorOrder(models.Model):
+    """
+    One vendor's share of an order, fulfilled and tracked independently
+    Created at checkout so vendor listings never join through order items
+    """
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='vendor_orders')
+    vendor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                               related_name='vendor_orders')
+    subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(default=timezone.now)  # Copied from the order
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Order {self.order.order_id} - {self.vendor.username} ({self.status})"
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'vendor'], name='unique_vendor_order'),
+        ]
+        indexes = [
+            models.Index(fields=['vendor', 'status', 'created_at']),
+            models.Index(fields=['vendor', 'created_at']),
+        ]
+
+
+class ProductRecommendation(models.Model):
+    """
+    Precomputed "customers also bought" neighbours for a product
+    Rebuilt in batch by the build_recommendations command
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    def __str__(self):
+        return f"{self.product.name} -> {self.recommended.name} ({self.score:.3f})"
+    
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'rank'],
+                name='unique_product_recommendation_rank'
+            ),
+        ]
+
+
 class Contact(models.Model):
     """
     Contact form submissions
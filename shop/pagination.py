@@ -0,0 +1,227 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with a WHERE clause on the last row's sort key instead of
+OFFSET, so every page costs the same regardless of depth, and no COUNT(*) is
+issued unless the template asks for an approximate total.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, values):
+    """
+    Pack a direction ('next' or 'prev') and key values into an opaque token
+    """
+    encoded = []
+    for value in values:
+        if isinstance(value, datetime):
+            encoded.append({'dt': value.isoformat()})
+        elif isinstance(value, date):
+            encoded.append({'d': value.isoformat()})
+        elif isinstance(value, Decimal):
+            encoded.append({'dec': str(value)})
+        else:
+            encoded.append(value)
+    payload = json.dumps([direction, encoded], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Unpack a token produced by encode_cursor
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, encoded = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ('next', 'prev') or not isinstance(encoded, list):
+        raise InvalidCursor(cursor)
+
+    values = []
+    for value in encoded:
+        if isinstance(value, dict):
+            try:
+                if 'dt' in value:
+                    value = datetime.fromisoformat(value['dt'])
+                elif 'd' in value:
+                    value = date.fromisoformat(value['d'])
+                else:
+                    value = Decimal(value['dec'])
+            except (KeyError, ValueError, ArithmeticError):
+                raise InvalidCursor(cursor)
+        values.append(value)
+    return direction, values
+
+
+class KeysetPage:
+    """
+    One page of results with cursors to its neighbours
+    """
+
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next_page = has_next
+        self.has_previous_page = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.has_next_page
+
+    def has_previous(self):
+        return self.has_previous_page
+
+    def has_other_pages(self):
+        return self.has_next_page or self.has_previous_page
+
+    @property
+    def next_cursor(self):
+        if not self.has_next_page:
+            return None
+        return encode_cursor('next', self.paginator.key_values(self.object_list[-1]))
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous_page:
+            return None
+        return encode_cursor('prev', self.paginator.key_values(self.object_list[0]))
+
+    @property
+    def approximate_count(self):
+        return self.paginator.approximate_count
+
+    @property
+    def count_label(self):
+        """Total for display, e.g. '37' or '1000+'"""
+        count = self.paginator.approximate_count
+        if count > self.paginator.count_limit:
+            return f'{self.paginator.count_limit}+'
+        return str(count)
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset on a unique key tuple such as ('-created_at', '-id').
+    All keys must sort in the same direction.
+    """
+
+    def __init__(self, queryset, per_page, keys=('-created_at', '-id'), count_limit=1000):
+        descending = {key.startswith('-') for key in keys}
+        if len(descending) != 1:
+            raise ValueError('Keyset pagination keys must all sort in the same direction.')
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keys = tuple(keys)
+        self.fields = [key.lstrip('-') for key in keys]
+        self.descending = descending.pop()
+        self.count_limit = count_limit
+        self._approximate_count = None
+
+    def key_values(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def coerce(self, values):
+        """
+        Convert decoded cursor values to the types of the key fields (model
+        fields or annotations); raise InvalidCursor if any is missing or null
+        or cannot be converted
+        """
+        if len(values) != len(self.fields):
+            raise InvalidCursor(values)
+        annotations = self.queryset.query.annotations
+
+        def key_field(name):
+            if name in annotations:
+                return annotations[name].output_field
+            return self.queryset.model._meta.get_field(name)
+
+        try:
+            values = [key_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        except (ValidationError, ValueError, TypeError):
+            raise InvalidCursor(values)
+        if any(value is None for value in values):
+            raise InvalidCursor(values)
+        return values
+
+    def _seek(self, values, forward):
+        """
+        Build (f1 > v1) OR (f1 = v1 AND f2 > v2) ... in the requested direction
+        """
+        lookup = 'lt' if self.descending == forward else 'gt'
+        condition = Q()
+        for position, field in enumerate(self.fields):
+            clause = Q(**{f'{field}__{lookup}': values[position]})
+            for previous, value in zip(self.fields[:position], values):
+                clause &= Q(**{previous: value})
+            condition |= clause
+        return condition
+
+    def get_page(self, cursor=None):
+        """
+        Return the page addressed by cursor, or the first page if the cursor
+        is missing, malformed or holds values of the wrong type
+        """
+        direction, values = 'next', None
+        if cursor:
+            try:
+                direction, values = decode_cursor(cursor)
+                values = self.coerce(values)
+            except InvalidCursor:
+                direction, values = 'next', None
+
+        queryset = self.queryset
+        if direction == 'prev':
+            reverse_keys = [key.lstrip('-') if self.descending else f'-{key}' for key in self.keys]
+            queryset = queryset.filter(self._seek(values, forward=False)).order_by(*reverse_keys)
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(self, rows, has_next=True, has_previous=has_previous)
+
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward=True))
+        rows = list(queryset.order_by(*self.keys)[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(self, rows[:self.per_page], has_next=has_next, has_previous=values is not None)
+
+    @property
+    def approximate_count(self):
+        """
+        Row count capped at count_limit + 1, so large tables are never fully counted
+        """
+        if self._approximate_count is None:
+            capped = self.queryset.order_by().values('pk')[:self.count_limit + 1]
+            self._approximate_count = capped.count()
+        return self._approximate_count
+
+
+def get_keyset_page(request, queryset, per_page, keys=('-created_at', '-id')):
+    """
+    Paginate a queryset using the request's ?cursor= parameter
+    """
+    paginator = KeysetPaginator(queryset, per_page, keys=keys)
+    return paginator.get_page(request.GET.get('cursor'))
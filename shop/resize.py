@@ -0,0 +1,196 @@
+"""
+On-demand product image resizing for /media/resize/<w>x<h>/<path>.
+
+Originals are cropped with Pillow to one of the RESIZE_ALLOWED_SIZES boxes on
+first request, and the result is kept in a disk cache under RESIZE_CACHE_DIR.
+Cached files are named after the original's name, size and modification time
+plus the box and output format, so a replaced original never serves a stale
+variant. Every hit touches the file's mtime; once the cache grows past
+RESIZE_CACHE_MAX_BYTES the least recently used files are evicted.
+
+A cold variant requested by many clients at once is resized only once: the
+first request creates a lock file with O_EXCL, the others wait for the
+finished file to appear. The lock works across threads and processes that
+share the cache directory.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+LOCK_WAIT_SECONDS = 10
+STALE_LOCK_SECONDS = 30
+
+_usage_lock = threading.Lock()
+_usage = {}
+
+
+class ResizeError(Exception):
+    """
+    The request cannot be served (bad size, unknown or unreadable image)
+    """
+
+
+class ResizeBusy(ResizeError):
+    """
+    Another request kept rendering the same variant for too long
+    """
+
+
+def _cache_dir():
+    return str(getattr(settings, 'RESIZE_CACHE_DIR', settings.BASE_DIR / 'resize_cache'))
+
+
+def _max_bytes():
+    return getattr(settings, 'RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+
+def _allowed_sizes():
+    return {tuple(size) for size in getattr(settings, 'RESIZE_ALLOWED_SIZES', [(160, 160)])}
+
+
+def validate(width, height, path):
+    """
+    Only resize originals under products/, to one of RESIZE_ALLOWED_SIZES:
+    arbitrary sizes would let any client force a fresh render per request
+    """
+    if (width, height) not in _allowed_sizes():
+        raise ResizeError('Unsupported size')
+    parts = path.split('/')
+    if parts[0] != 'products' or '..' in parts or not default_storage.exists(path):
+        raise ResizeError('Unknown image')
+
+
+def pick_format(path, accept):
+    if 'image/webp' in (accept or ''):
+        return 'webp'
+    return 'png' if path.lower().endswith(('.png', '.gif', '.webp')) else 'jpeg'
+
+
+def variant_key(path, width, height, fmt):
+    """
+    Cache key and ETag: changes whenever the original does
+    """
+    stamp = f'{path}:{default_storage.size(path)}:{default_storage.get_modified_time(path).timestamp()}'
+    return hashlib.sha256(f'{stamp}:{width}x{height}:{fmt}'.encode()).hexdigest()
+
+
+def _render(path, width, height, fmt):
+    with default_storage.open(path, 'rb') as source:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if fmt == 'jpeg' or image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGB' if fmt == 'jpeg' else 'RGBA')
+            image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, FORMATS[fmt][0], quality=82)
+    return buffer.getvalue()
+
+
+def _scan(directory):
+    entries = []
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            if entry.is_file() and not entry.name.endswith(('.lock', '.tmp')):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    return entries
+
+
+def _account(added):
+    """
+    Track the cache size in this process; evict once it passes the cap
+    """
+    directory = _cache_dir()
+    with _usage_lock:
+        if directory not in _usage:
+            _usage[directory] = sum(size for mtime, size, name in _scan(directory))
+        _usage[directory] += added
+        if _usage[directory] <= _max_bytes():
+            return
+        # Rescan: other processes write here too. Trim to 90% of the cap.
+        entries = sorted(_scan(directory))
+        usage = sum(size for mtime, size, name in entries)
+        for mtime, size, name in entries:
+            if usage <= _max_bytes() * 0.9:
+                break
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            usage -= size
+        _usage[directory] = usage
+
+
+def _read(target):
+    try:
+        with open(target, 'rb') as cached:
+            data = cached.read()
+        os.utime(target)
+        return data
+    except FileNotFoundError:
+        # Never cached, or evicted just now
+        return None
+
+
+def get_variant(path, width, height, fmt, key):
+    """
+    Return the bytes of the resized variant keyed `key`, rendering and
+    caching it if needed
+    """
+    target = os.path.join(_cache_dir(), key)
+    data = _read(target)
+    if data is not None:
+        return data
+
+    os.makedirs(_cache_dir(), exist_ok=True)
+    lock = f'{target}.lock'
+    deadline = time.monotonic() + LOCK_WAIT_SECONDS
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # Someone else is rendering it; wait for their result
+            data = _read(target)
+            if data is not None:
+                return data
+            try:
+                if time.time() - os.path.getmtime(lock) > STALE_LOCK_SECONDS:
+                    os.remove(lock)
+            except FileNotFoundError:
+                pass
+            if time.monotonic() > deadline:
+                raise ResizeBusy('Timed out waiting for resize')
+            time.sleep(0.05)
+            continue
+        break
+
+    try:
+        os.close(fd)
+        data = _read(target)
+        if data is None:
+            data = _render(path, width, height, fmt)
+            tmp = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as out:
+                out.write(data)
+            os.replace(tmp, target)
+            _account(len(data))
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ResizeError(str(e))
+    finally:
+        try:
+            os.remove(lock)
+        except FileNotFoundError:
+            pass
+    return data
@@ -0,0 +1,250 @@
+"""
+Full-text product search.
+
+Active products are indexed into the shop_productsearch side table, which is
+kept in sync by the Product signals in shop.signals. PostgreSQL stores a
+weighted tsvector behind a GIN index, SQLite uses an FTS5 virtual table and
+any other database falls back to icontains lookups.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, When, IntegerField, Q, Value
+from django.utils.module_loading import import_string
+
+from .models import Product
+
+
+SEARCH_TABLE = 'shop_productsearch'
+SEARCH_CONFIG = 'english'
+MAX_TERMS = 8
+
+_TERM_RE = re.compile(r'\w+')
+_backend = None
+
+
+def tokenize(query):
+    """
+    Split a raw query into lowercase search terms
+    """
+    return _TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+class BaseSearchBackend:
+    """
+    Fallback backend that scans the product table with LIKE lookups
+    """
+
+    def is_available(self):
+        return True
+
+    def index_product(self, product):
+        pass
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_product(self, product_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def ranked_ids(self, query, limit):
+        """Return ids of matching active products, best match first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        products = Product.objects.filter(is_active=True)
+        for term in terms:
+            products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return list(products.values_list('id', flat=True)[:limit])
+
+
+class IndexedSearchBackend(BaseSearchBackend):
+    """
+    Base class for backends that keep rows in the search table
+    """
+
+    def is_available(self):
+        return SEARCH_TABLE in connection.introspection.table_names()
+
+
+class PostgresSearchBackend(IndexedSearchBackend):
+    """
+    tsvector column with a GIN index, ranked with ts_rank
+    """
+    document_sql = (
+        "setweight(to_tsvector(%s::regconfig, {name}), 'A') || "
+        "setweight(to_tsvector(%s::regconfig, {description}), 'B')"
+    )
+
+    def index_product(self, product):
+        document = self.document_sql.format(name='%s', description='%s')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) VALUES (%s, {document}) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                [product.pk, SEARCH_CONFIG, product.name, SEARCH_CONFIG, product.description]
+            )
+
+    def index_products(self, product_ids):
+        document = self.document_sql.format(name='name', description='description')
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE product_id = ANY(%s)", [product_ids])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) "
+                f"SELECT id, {document} FROM shop_product WHERE is_active AND id = ANY(%s)",
+                [SEARCH_CONFIG, SEARCH_CONFIG, product_ids]
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE product_id = %s", [product_id])
+
+    def rebuild(self):
+        document = self.document_sql.format(name='name', description='description')
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (product_id, document) "
+                f"SELECT id, {document} FROM shop_product WHERE is_active",
+                [SEARCH_CONFIG, SEARCH_CONFIG]
+            )
+
+    def ranked_ids(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {SEARCH_TABLE}, to_tsquery(%s::regconfig, %s) query "
+                f"WHERE document @@ query "
+                f"ORDER BY ts_rank(document, query) DESC, product_id DESC LIMIT %s",
+                [SEARCH_CONFIG, tsquery, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class SQLiteSearchBackend(IndexedSearchBackend):
+    """
+    FTS5 virtual table keyed by product id, ranked with bm25
+    """
+
+    def index_product(self, product):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product.pk])
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, description) VALUES (%s, %s, %s)",
+                [product.pk, product.name, product.description]
+            )
+
+    def index_products(self, product_ids):
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, description) "
+                f"SELECT id, name, description FROM shop_product WHERE is_active AND id IN ({placeholders})",
+                product_ids
+            )
+
+    def remove_product(self, product_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [product_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, name, description) "
+                f"SELECT id, name, description FROM shop_product WHERE is_active"
+            )
+
+    def ranked_ids(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Quoted prefix terms are implicitly ANDed and cannot inject FTS syntax
+        match = ' '.join(f'"{term}"*' for term in terms)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 1.0) LIMIT %s",
+                [match, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend():
+    """
+    Return the configured search backend, falling back to LIKE lookups
+    when the search table is missing
+    """
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+        if backend_path:
+            backend = import_string(backend_path)()
+        else:
+            backend = VENDOR_BACKENDS.get(connection.vendor, BaseSearchBackend)()
+        if not backend.is_available():
+            backend = BaseSearchBackend()
+        _backend = backend
+    return _backend
+
+
+def index_product(product):
+    """
+    Add, refresh or drop a product's search row after it was saved
+    """
+    if product.is_active:
+        get_backend().index_product(product)
+    else:
+        get_backend().remove_product(product.pk)
+
+
+def index_products(product_ids):
+    """
+    Refresh the search rows of many products in two statements, e.g. after
+    bulk_create/bulk_update, which send no signals
+    """
+    if product_ids:
+        get_backend().index_products(list(product_ids))
+
+
+def remove_product(product_id):
+    get_backend().remove_product(product_id)
+
+
+def rebuild_index():
+    get_backend().rebuild()
+
+
+def search(query, queryset=None, limit=None):
+    """
+    Return products matching the query, best matches first.
+    Results are annotated with search_rank, where 0 is the best match.
+    """
+    if queryset is None:
+        queryset = Product.objects.filter(is_active=True)
+    limit = limit or getattr(settings, 'SEARCH_RESULT_LIMIT', 500)
+
+    product_ids = get_backend().ranked_ids(query, limit)
+    if not product_ids:
+        # Still annotated, so callers can order or paginate on search_rank
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField())).none()
+
+    search_rank = Case(
+        *[When(id=product_id, then=position) for position, product_id in enumerate(product_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(id__in=product_ids).annotate(search_rank=search_rank).order_by('search_rank', 'id')
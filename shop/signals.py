@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, Category, MediaBlob
+from . import cache, images, search, typeahead
+
+
+SEARCH_FIELDS = {'name', 'description', 'is_active'}
+TYPEAHEAD_FIELDS = {'name', 'price', 'image', 'image_variants', 'is_active'}
+DEFERRED = object()
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the product's search index row in sync
+    """
+    if update_fields is not None and not SEARCH_FIELDS.intersection(update_fields):
+        return
+    search.index_product(instance)
+
+
+@receiver(post_save, sender=Product)
+def update_typeahead(sender, instance, update_fields=None, **kwargs):
+    """
+    Apply the saved product to this worker's typeahead once committed;
+    other workers pick it up on their next refresh
+    """
+    if update_fields is not None and not TYPEAHEAD_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(lambda: typeahead.index.update(instance))
+
+
+@receiver(post_save, sender=Product)
+def process_product_image(sender, instance, update_fields=None, **kwargs):
+    """
+    Queue resized variants for a new image; forget them when it is cleared
+    """
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if images.needs_variants(instance):
+        images.schedule(instance)
+    elif not instance.image and instance.image_variants:
+        instance.image_variants = {}
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+
+
+@receiver(post_init, sender=Product)
+def remember_product_image(sender, instance, **kwargs):
+    """
+    Note the stored image so a save can tell whether it changed
+    """
+    image = instance.__dict__.get('image', DEFERRED)
+    instance._stored_image = getattr(image, 'name', image) or None
+
+
+@receiver(post_save, sender=Product)
+def count_image_references(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Move the product's reference from its old image blob to the new one
+    """
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    old = None if created else instance._stored_image
+    new = instance.image.name or None
+    if old is DEFERRED:
+        # Loaded without its image; gc_media --recount settles the count
+        old = new
+    if old != new:
+        MediaBlob.adjust({name: delta for name, delta in ((old, -1), (new, 1)) if name})
+    instance._stored_image = new
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """
+    Drop the product from the search index and this worker's typeahead
+    """
+    search.remove_product(instance.pk)
+    typeahead.index.discard(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def release_product_image(sender, instance, **kwargs):
+    """
+    Drop the deleted product's reference to its image blob
+    """
+    if instance.image:
+        MediaBlob.adjust({instance.image.name: -1})
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_pages(sender, instance, **kwargs):
+    """
+    Purge cached pages that show this product
+    """
+    cache.invalidate_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    """
+    Purge cached pages that list categories
+    """
+    cache.invalidate('catalog', 'categories')
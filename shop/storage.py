@@ -0,0 +1,88 @@
+"""
+Content-addressed storage for product images.
+
+Files are named after the SHA-256 of their bytes, products/ab/ab12...ef.jpg,
+so every distinct image is stored exactly once however many products or
+uploads use it, a name always refers to the same content (its URL can be
+cached forever) and Django's collision renaming never kicks in. Products
+reference-count the blobs they use (MediaBlob); gc_media deletes blobs
+nothing references any more. Saving a file claims its blob row first, under
+the same row lock gc_media deletes with, so an upload of bytes that are
+about to be collected either waits for the delete and writes the file again
+or keeps it.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that stores files under the hash of their content
+    """
+
+    def content_name(self, name, content):
+        """
+        products/photo.JPG -> products/<h[:2]>/<h>.jpg, h = SHA-256 of content
+        """
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        h = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()[:10]
+        return posixpath.join(posixpath.dirname(name), h[:2], f'{h}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return super().save(self.content_name(name, content), content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # Same name, same bytes: an existing file is the one we want
+        return name
+
+    def _save(self, name, content):
+        # shop.models imports this module for the image field's storage
+        from .models import MediaBlob
+
+        with transaction.atomic():
+            MediaBlob.claim(name)
+            if not self.exists(name):
+                self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Write aside and rename into place, so concurrent uploads of the same
+        # image never expose a partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    out.write(chunk)
+            # mkstemp creates files readable by the owner only
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+product_image_storage = ContentAddressedStorage()
+
+
+def get_product_image_storage():
+    return product_image_storage
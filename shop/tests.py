@@ -1,3 +1,1008 @@
-from django.test import TestCase
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet, Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from accounts.models import User, Wallet, MarketplaceWallet, MarketplaceTransaction
+from accounts.sessions import SessionStore
+from dashboard.models import VendorStats, DailySales, VendorOrderCount
+from . import cache as page_cache, cart, images, importer, resize, search, typeahead
+from .checkout import place_order, CheckoutError
+from .models import Category, Product, MediaBlob, CartItem, Order, OrderItem, VendorOrder
+from .pagination import KeysetPaginator, InvalidCursor, decode_cursor, encode_cursor
+from .storage import product_image_storage
+
+
+# Queries allowed for one checkout, whatever the number of items or vendors
+CHECKOUT_QUERY_BUDGET = 18
+
+
+class CheckoutTests(TestCase):
+    """
+    Tests for the checkout service
+    """
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Electronics')
+        self.buyer = User.objects.create_user('buyer', password='pass', role='user')
+        self.buyer.wallet.balance = Decimal('1000.00')
+        self.buyer.wallet.save()
+        self.vendors = [
+            User.objects.create_user(f'vendor{i}', password='pass', role='vendor')
+            for i in range(3)
+        ]
+        MarketplaceWallet.get_instance()
+
+    def add_product(self, vendor, price='10.00', stock=5, quantity=1):
+        product = Product.objects.create(
+            name=f'Product {Product.objects.count()}',
+            description='Test product',
+            price=Decimal(price),
+            category=self.category,
+            vendor=vendor,
+            stock=stock
+        )
+        CartItem.objects.create(user=self.buyer, product=product, quantity=quantity)
+        return product
+
+    def checkout_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.buyer, 'Somewhere 1')
+        return len(queries)
+
+    def test_places_order_and_moves_money(self):
+        first = self.add_product(self.vendors[0], price='25.00', quantity=2)
+        second = self.add_product(self.vendors[1], price='50.00')
+
+        order = place_order(self.buyer, 'Somewhere 1')
+
+        self.assertEqual(order.total_amount, Decimal('100.00'))
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual((order.item_count, order.vendor_count), (2, 2))
+        self.assertEqual(order.first_item_name, order.items.order_by('pk').first().product.name)
+        self.assertFalse(CartItem.objects.filter(user=self.buyer).exists())
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, second.stock), (3, 4))
+
+        self.buyer.wallet.refresh_from_db()
+        self.assertEqual(self.buyer.wallet.balance, Decimal('900.00'))
+        self.vendors[0].wallet.refresh_from_db()
+        self.vendors[1].wallet.refresh_from_db()
+        self.assertEqual(self.vendors[0].wallet.balance, Decimal('46.00'))
+        self.assertEqual(self.vendors[1].wallet.balance, Decimal('46.00'))
+
+        marketplace_wallet = MarketplaceWallet.get_instance()
+        self.assertEqual(MarketplaceTransaction.objects.count(), 2)
+        self.assertEqual(marketplace_wallet.total_commission_earned, Decimal('0.00'))
+        self.assertEqual(marketplace_wallet.live_totals()['total_commission_earned'], Decimal('8.00'))
+
+        marketplace_wallet.rollup()
+        self.assertEqual(marketplace_wallet.balance, Decimal('8.00'))
+        self.assertEqual(marketplace_wallet.pending_totals()['balance'], Decimal('0.00'))
+
+        stats = VendorStats.objects.get(vendor=self.vendors[0])
+        self.assertEqual((stats.units_sold, stats.revenue, stats.order_count), (2, Decimal('50.00'), 1))
+        VendorStats.rebuild()
+        self.assertEqual(VendorStats.objects.get(vendor=self.vendors[0]).revenue, stats.revenue)
+
+    def test_vendor_without_wallet_gets_one_at_checkout(self):
+        self.add_product(self.vendors[2], price='10.00')
+        self.vendors[2].wallet.delete()
+
+        place_order(self.buyer, 'Somewhere 1')
+
+        self.assertEqual(Wallet.objects.get(user=self.vendors[2]).balance, Decimal('9.20'))
+
+    def test_vendor_sub_orders(self):
+        self.add_product(self.vendors[0], price='10.00', quantity=2)
+        self.add_product(self.vendors[0], price='5.00')
+        self.add_product(self.vendors[1], price='30.00')
+        order = place_order(self.buyer, 'Somewhere 1')
+
+        subtotals = dict(order.vendor_orders.values_list('vendor_id', 'subtotal'))
+        self.assertEqual(subtotals, {self.vendors[0].pk: Decimal('25.00'), self.vendors[1].pk: Decimal('30.00')})
+        self.assertEqual(VendorOrderCount.counts_for(self.vendors[0]), {'confirmed': 1, 'total': 1})
+
+        # One vendor shipping leaves the order at the least advanced status
+        VendorOrder.objects.filter(order=order, vendor=self.vendors[0]).update(status='shipped')
+        self.assertEqual(order.sync_status(), 'confirmed')
+        VendorOrder.objects.filter(order=order, vendor=self.vendors[1]).update(status='cancelled')
+        self.assertEqual(order.sync_status(), 'shipped')
+
+        self.assertEqual(
+            VendorOrderCount.count_from_vendor_orders(VendorOrder.objects.all()),
+            {self.vendors[0].pk: {'shipped': 1}, self.vendors[1].pk: {'cancelled': 1}}
+        )
+        VendorOrderCount.rebuild()
+        self.assertEqual(VendorOrderCount.counts_for(self.vendors[0]), {'shipped': 1, 'total': 1})
+
+    def test_daily_sales_compaction_keeps_rows_appended_meanwhile(self):
+        product = self.add_product(self.vendors[0], price='10.00', quantity=1)
+        day = timezone.localdate()
+        for units in (1, 2):
+            DailySales.objects.create(vendor=self.vendors[0], product=product, day=day,
+                                      units=units, revenue=Decimal(units * 10), order_count=1)
+        aggregate = QuerySet.aggregate
+
+        def checkout_commits_first(queryset, *args, **kwargs):
+            # A checkout appends to the key after compact() picked its rows
+            if queryset.model is DailySales and not DailySales.objects.filter(units=4).exists():
+                DailySales.objects.create(vendor=self.vendors[0], product=product, day=day,
+                                          units=4, revenue=Decimal('40.00'), order_count=1)
+            return aggregate(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'aggregate', checkout_commits_first):
+            DailySales.compact()
+
+        totals = DailySales.objects.filter(product=product).aggregate(units=Sum('units'))
+        self.assertEqual(totals['units'], 7)
+        self.assertEqual(DailySales.objects.filter(product=product).count(), 2)
+
+    def test_daily_sales_rollup(self):
+        product = self.add_product(self.vendors[0], price='10.00', quantity=2)
+        place_order(self.buyer, 'Somewhere 1')
+        CartItem.objects.create(user=self.buyer, product=product, quantity=1)
+        place_order(self.buyer, 'Somewhere 1')
+
+        self.assertEqual(DailySales.objects.filter(product=product).count(), 2)
+        before = DailySales.series(self.vendors[0], 'month')
+        self.assertEqual(DailySales.compact(), (2, 2))
+        self.assertEqual(DailySales.objects.filter(product=product).count(), 1)
+        after = DailySales.series(self.vendors[0], 'month')
+
+        self.assertEqual(before, after)
+        self.assertEqual(
+            (after[0]['units'], after[0]['revenue'], after[0]['orders']),
+            (3, Decimal('30.00'), 2)
+        )
+        top = DailySales.top_products(self.vendors[0])
+        self.assertEqual((top[0]['total_sold'], top[0]['total_revenue']), (3, Decimal('30.00')))
+
+        DailySales.rebuild()
+        self.assertEqual(DailySales.series(self.vendors[0], 'day')[0]['revenue'], Decimal('30.00'))
+
+    def test_oversell_rolls_back(self):
+        available = self.add_product(self.vendors[0], stock=5)
+        short = self.add_product(self.vendors[1], stock=1, quantity=2)
+
+        with self.assertRaises(CheckoutError) as raised:
+            place_order(self.buyer, 'Somewhere 1')
+
+        self.assertIn(short.name, str(raised.exception))
+        available.refresh_from_db()
+        self.assertEqual(available.stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.buyer.wallet.refresh_from_db()
+        self.assertEqual(self.buyer.wallet.balance, Decimal('1000.00'))
+
+    def test_insufficient_balance(self):
+        self.add_product(self.vendors[0], price='2000.00')
+
+        with self.assertRaises(CheckoutError):
+            place_order(self.buyer, 'Somewhere 1')
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_budget_does_not_grow_with_cart(self):
+        self.add_product(self.vendors[0])
+        single = self.checkout_queries()
+
+        for vendor in self.vendors:
+            for _ in range(3):
+                self.add_product(vendor)
+        many = self.checkout_queries()
+
+        self.assertLessEqual(single, CHECKOUT_QUERY_BUDGET)
+        self.assertEqual(single, many)
+
+
+class SearchTests(TestCase):
+    """
+    Tests for the full-text product search
+    """
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Electronics')
+        self.vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+
+    def add_product(self, name, description='d'):
+        return Product.objects.create(name=name, description=description, price=Decimal('10.00'),
+                                      category=self.category, stock=5, vendor=self.vendor)
+
+    def names(self, query):
+        return [product.name for product in search.search(query)]
+
+    def test_uses_indexed_backend(self):
+        self.assertIsInstance(search.get_backend(), search.SQLiteSearchBackend)
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.add_product('Wireless charger', description='Fast pad for any phone')
+        self.add_product('Phone case', description='Slim case')
+        self.add_product('Desk lamp', description='Warm light')
+
+        self.assertEqual(self.names('phone'), ['Phone case', 'Wireless charger'])
+        self.assertEqual(self.names('pho cas'), ['Phone case'])
+        self.assertEqual(self.names('lamp OR "phone'), [])
+
+    def test_signals_keep_index_in_sync(self):
+        product = self.add_product('Desk lamp')
+        product.name = 'Floor lamp'
+        product.save()
+        self.assertEqual(self.names('floor'), ['Floor lamp'])
+        self.assertEqual(self.names('desk'), [])
+
+        product.is_active = False
+        product.save()
+        self.assertEqual(search.get_backend().ranked_ids('floor', 10), [])
+
+        product.is_active = True
+        product.save()
+        product.delete()
+        self.assertEqual(search.get_backend().ranked_ids('floor', 10), [])
+
+    def test_index_products_refreshes_bulk_writes(self):
+        lamp = self.add_product('Desk lamp')
+        Product.objects.filter(pk=lamp.pk).update(name='Reading lamp')
+        self.assertEqual(self.names('reading'), [])
+
+        search.index_products([lamp.pk])
+        self.assertEqual(self.names('reading'), ['Reading lamp'])
+
+    def test_no_match_keeps_search_rank(self):
+        self.add_product('Desk lamp')
+        for query in ['zzzzqq', '"']:
+            results = search.search(query)
+            self.assertEqual(list(results.order_by('search_rank', 'id')), [])
+
+    def test_listing_without_matches(self):
+        self.add_product('Desk lamp')
+        for query in ['zzzzqq', '"']:
+            response = self.client.get('/products/', {'search': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['products']), [])
+
+    def test_listing_orders_by_rank(self):
+        self.add_product('Cable', description='Works with any phone')
+        self.add_product('Phone stand')
+        response = self.client.get('/products/?search=phone')
+        self.assertEqual([product.name for product in response.context['products']], ['Phone stand', 'Cable'])
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Tests for cursor-based pagination
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Books')
+        vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        for i in range(7):
+            Product.objects.create(name=f'Novel {i}', description='d', price=Decimal('9.99'),
+                                   category=category, stock=1, vendor=vendor)
+        # Ties on created_at are broken by id
+        Product.objects.filter(name__in=['Novel 2', 'Novel 3', 'Novel 4']).update(created_at=timezone.now())
+        self.expected = list(Product.objects.order_by('-created_at', '-id').values_list('name', flat=True))
+        self.paginator = KeysetPaginator(Product.objects.all(), 3)
+
+    def names(self, page):
+        return [product.name for product in page]
+
+    def test_cursor_round_trip(self):
+        values = [timezone.now(), datetime.date(2024, 5, 1), Decimal('9.99'), 42, 'name']
+        cursor = encode_cursor('prev', values)
+        self.assertEqual(decode_cursor(cursor), ('prev', values))
+        self.assertNotIn('=', cursor)
+
+    def test_rejects_malformed_cursors(self):
+        for cursor in ['not base64!', encode_cursor('sideways', [1]), 'eyJhIjoxfQ', encode_cursor('next', [{'dt': 'x'}])]:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+        # Well-formed tokens whose values do not fit the key fields
+        for values in [['abc', 'xyz'], [1, 2], [None, None], [timezone.now(), 'x'], [timezone.now()]]:
+            with self.assertRaises(InvalidCursor):
+                self.paginator.coerce(values)
+
+    def test_next_and_previous_pages(self):
+        first = self.paginator.get_page()
+        self.assertEqual(self.names(first), self.expected[:3])
+        self.assertEqual((first.has_previous(), first.has_next()), (False, True))
+        self.assertIsNone(first.previous_cursor)
+
+        second = self.paginator.get_page(first.next_cursor)
+        third = self.paginator.get_page(second.next_cursor)
+        self.assertEqual(self.names(second), self.expected[3:6])
+        self.assertEqual(self.names(third), self.expected[6:])
+        self.assertEqual((third.has_previous(), third.has_next()), (True, False))
+
+        back = self.paginator.get_page(third.previous_cursor)
+        self.assertEqual(self.names(back), self.expected[3:6])
+        back = self.paginator.get_page(back.previous_cursor)
+        self.assertEqual(self.names(back), self.expected[:3])
+        self.assertFalse(back.has_previous())
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        for cursor in ['garbage', encode_cursor('next', [1])]:
+            self.assertEqual(self.names(self.paginator.get_page(cursor)), self.expected[:3])
+
+    def test_listing_ignores_cursors_with_wrong_types(self):
+        for direction, values in [('next', ['abc', 'xyz']), ('next', [1, 2]), ('prev', [None, None])]:
+            cursor = encode_cursor(direction, values)
+            response = self.client.get('/products/', {'cursor': cursor})
+            self.assertEqual(len(response.context['products']), 7)
+            # [1, 2] is a valid (search_rank, id) cursor, the others are not
+            response = self.client.get('/products/', {'search': 'novel', 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+
+    def test_page_query_does_not_depend_on_depth(self):
+        page = self.paginator.get_page()
+        with self.assertNumQueries(1):
+            page = self.paginator.get_page(page.next_cursor)
+        self.assertEqual(page.count_label, '7')
+        self.assertEqual(KeysetPaginator(Product.objects.all(), 3, count_limit=5).get_page().count_label, '5+')
+
+    def test_mixed_key_directions_rejected(self):
+        with self.assertRaises(ValueError):
+            KeysetPaginator(Product.objects.all(), 3, keys=('-created_at', 'id'))
+
+
+class CartCountTests(TestCase):
+    """
+    Tests for the session-cached navbar cart count
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Electronics')
+        vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.customer = User.objects.create_user('customer', password='pass', role='user')
+        self.products = [
+            Product.objects.create(name=name, description='d', price=Decimal('10.00'),
+                                   category=category, stock=5, vendor=vendor)
+            for name in ('Phone', 'Charger')
+        ]
+        self.client.login(username='customer', password='pass')
+
+    def post(self, url, data):
+        return self.client.post(url, data, content_type='application/json').json()
+
+    def request(self):
+        request = RequestFactory().get('/')
+        request.user = self.customer
+        request.session = self.client.session
+        return request
+
+    def test_count_served_from_session(self):
+        for product in self.products:
+            response = self.post('/add-to-cart/', {'product_id': product.pk})
+        self.assertEqual(response['cart_count'], 2)
+        self.assertEqual(self.client.session[cart.SESSION_KEY], [self.customer.pk, 2])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_cart_count(self.request()), 2)
+
+    def test_removal_adjusts_count(self):
+        for product in self.products:
+            self.post('/add-to-cart/', {'product_id': product.pk})
+        item = CartItem.objects.get(user=self.customer, product=self.products[0])
+        self.post('/update-cart-item/', {'cart_item_id': item.pk, 'quantity': 0})
+        self.assertEqual(self.client.session[cart.SESSION_KEY], [self.customer.pk, 1])
+
+    def test_count_of_another_owner_is_recounted(self):
+        CartItem.objects.create(user=self.customer, product=self.products[0])
+        session = self.client.session
+        # Left over from browsing as a guest before logging in
+        session[cart.SESSION_KEY] = [None, 4]
+        session.save()
+
+        request = self.request()
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.get_cart_count(request), 1)
+        self.assertEqual(request.session[cart.SESSION_KEY], [self.customer.pk, 1])
+
+    def test_guest_without_session_counts_nothing(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.session = SessionStore()
+        with self.assertNumQueries(0):
+            self.assertEqual(cart.get_cart_count(request), 0)
+
+
+class CartUpsertTests(TestCase):
+    """
+    Tests for the single-statement add to cart
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Electronics')
+        vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.customer = User.objects.create_user('customer', password='pass', role='user')
+        self.product = Product.objects.create(name='Phone', description='d', price=Decimal('10.00'),
+                                              category=category, stock=5, vendor=vendor)
+
+    def add(self, quantity, product=None):
+        request = RequestFactory().post('/')
+        request.user = self.customer
+        request.session = SessionStore()
+        return cart.add_item(request, (product or self.product).pk, quantity)
+
+    def test_insert_then_increment_in_one_statement(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.add(2), (2, 1))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.add(1), (3, 1))
+        self.assertEqual(CartItem.objects.get(user=self.customer).quantity, 3)
+
+    def test_quantity_clamped_to_stock(self):
+        self.add(4)
+        self.assertEqual(self.add(4), (5, 1))
+
+    def test_rejects_unavailable_products_and_bad_quantities(self):
+        self.assertIsNone(self.add(6))
+        self.assertIsNone(self.add(0))
+        self.assertIsNone(self.add(-1))
+        self.product.is_active = False
+        self.product.save()
+        self.assertIsNone(self.add(1))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_guest_carts_keyed_by_session(self):
+        self.client.post('/add-to-cart/', {'product_id': self.product.pk, 'quantity': 2},
+                         content_type='application/json')
+        response = self.client.post('/add-to-cart/', {'product_id': self.product.pk},
+                                    content_type='application/json')
+        self.assertEqual(response.json()['cart_count'], 1)
+        item = CartItem.objects.get()
+        self.assertEqual((item.user, item.session_key, item.quantity), (None, self.client.session.session_key, 3))
+
+    def test_orm_fallback_matches(self):
+        with mock.patch('shop.cart.connection') as other_database:
+            other_database.vendor = 'other'
+            self.assertEqual(self.add(4), (4, 1))
+            self.assertEqual(self.add(4), (5, 1))
+            self.assertIsNone(self.add(6))
+
+
+class RecommendationTests(TestCase):
+    """
+    Tests for the build_recommendations command
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Kitchen')
+        vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.customer = User.objects.create_user('customer', password='pass', role='user')
+        self.products = {
+            name: Product.objects.create(name=name, description='d', price=Decimal('5.00'),
+                                         category=category, stock=50, vendor=vendor)
+            for name in 'ABCDE'
+        }
+        for basket in ['AB', 'AB', 'AC', 'ABCDE']:
+            self.order(basket)
+
+    def order(self, names):
+        order = Order.objects.create(user=self.customer, total_amount=Decimal('5.00'), shipping_address='x')
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=self.products[name], quantity=1, price=Decimal('5.00'))
+            for name in names
+        )
+
+    def build(self, **options):
+        call_command('build_recommendations', stdout=io.StringIO(), max_basket=4, **options)
+        return {
+            product.name: [(recommendation.recommended.name, round(recommendation.score, 3))
+                           for recommendation in product.recommendations.select_related('recommended')]
+            for product in Product.objects.order_by('name')
+        }
+
+    def test_scores_by_cosine_similarity(self):
+        # The five-item basket is over max_basket and ignored
+        self.assertEqual(self.build(), {
+            'A': [('B', 0.816), ('C', 0.577)],
+            'B': [('A', 0.816)],
+            'C': [('A', 0.577)],
+            'D': [],
+            'E': [],
+        })
+
+    def test_min_support_and_top(self):
+        recommendations = self.build(min_support=2)
+        self.assertEqual(recommendations['A'], [('B', 0.816)])
+        self.assertEqual(recommendations['C'], [])
+        self.assertEqual(self.build(top=1)['A'], [('B', 0.816)])
+
+    def test_rebuild_replaces_and_refreshes_detail_page(self):
+        cache.clear()
+        self.build()
+        url = f'/product/{self.products["C"].pk}/'
+        self.client.get(url)
+        self.order('CD')
+        self.order('CD')
+        self.build()
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertEqual([product.name for product in response.context['related_products']], ['D', 'A'])
+
+
+class TypeaheadTests(TestCase):
+    """
+    Tests for the in-process typeahead index
+    """
+
+    def setUp(self):
+        category = Category.objects.create(name='Groceries')
+        vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.products = {
+            name: Product.objects.create(name=name, description='d', price=Decimal('1.00'),
+                                         category=category, stock=5, vendor=vendor)
+            for name in ('Red Apple', 'Green Apple Juice', 'Banana')
+        }
+        self.index = typeahead.TypeaheadIndex()
+        self.index.build()
+
+    def names(self, query, index=None):
+        return [entry['name'] for entry in (index or self.index).suggest(query)]
+
+    def test_name_prefix_then_word_prefixes(self):
+        self.assertEqual(self.names('red'), ['Red Apple'])
+        self.assertEqual(self.names('app'), ['Green Apple Juice', 'Red Apple'])
+        self.assertEqual(self.names('ju app'), ['Green Apple Juice'])
+        self.assertEqual(self.names('cherry'), [])
+
+    def test_refresh_applies_changes_made_elsewhere(self):
+        # update() sends no signals, like a save in another worker
+        Product.objects.filter(pk=self.products['Banana'].pk).update(name='Blue Banana', updated_at=timezone.now())
+        Product.objects.filter(pk=self.products['Red Apple'].pk).update(is_active=False, updated_at=timezone.now())
+        self.assertEqual(self.names('blue'), [])
+
+        self.index.refresh()
+        self.assertEqual(self.names('blue'), ['Blue Banana'])
+        self.assertEqual(self.names('app'), ['Green Apple Juice'])
+
+    @override_settings(TYPEAHEAD_REFRESH_SECONDS=3600)
+    def test_saves_and_deletes_applied_at_once(self):
+        index = typeahead.TypeaheadIndex()
+        index.build()
+        with mock.patch.object(typeahead, 'index', index):
+            product = self.products['Banana']
+            product.name = 'Yellow Banana'
+            with self.captureOnCommitCallbacks(execute=True):
+                product.save()
+            self.assertEqual(self.names('yellow', index), ['Yellow Banana'])
+
+            self.products['Red Apple'].delete()
+            self.assertEqual(self.names('app', index), ['Green Apple Juice'])
+
+    def test_concurrent_callers_build_once(self):
+        index = typeahead.TypeaheadIndex()
+        calls = []
+
+        def slow_build():
+            calls.append(1)
+            time.sleep(0.1)
+            index._built_at = index._refreshed_at = time.monotonic()
+
+        with mock.patch.object(index, '_build', side_effect=slow_build):
+            threads = [threading.Thread(target=index.ensure_fresh) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+
+
+class PageCacheTests(TestCase):
+    """
+    Tests for the anonymous full-page cache
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Electronics')
+        self.vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.product = self.add_product('Phone')
+
+    def add_product(self, name):
+        return Product.objects.create(name=name, description='d', price=Decimal('10.00'),
+                                      category=self.category, stock=5, vendor=self.vendor)
+
+    def test_anonymous_miss_then_hit(self):
+        first = self.client.get('/products/')
+        second = self.client.get('/products/')
+        self.assertEqual((first['X-Page-Cache'], second['X-Page-Cache']), ('MISS', 'HIT'))
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(page_cache.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.get('/products/')
+        self.client.login(username='vendor', password='pass')
+        response = self.client.get('/products/')
+        self.assertNotIn('X-Page-Cache', response)
+
+    def test_product_change_invalidates_its_tags_only(self):
+        other = self.add_product('Novel')
+        other.category = Category.objects.create(name='Books')
+        other.save()
+        for url in ['/products/', f'/product/{self.product.pk}/', f'/product/{other.pk}/']:
+            self.client.get(url)
+
+        self.product.price = Decimal('12.00')
+        self.product.save()
+        self.assertEqual(self.client.get('/products/')['X-Page-Cache'], 'MISS')
+        self.assertEqual(self.client.get(f'/product/{self.product.pk}/')['X-Page-Cache'], 'MISS')
+        # The novel's page does not link to the phone
+        self.assertEqual(self.client.get(f'/product/{other.pk}/')['X-Page-Cache'], 'HIT')
+
+    def test_category_change_invalidates_catalog(self):
+        self.client.get('/products/')
+        self.category.name = 'Gadgets'
+        self.category.save()
+        response = self.client.get('/products/')
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Gadgets')
+
+    def test_related_product_change_refreshes_detail(self):
+        related = self.add_product('Charger')
+        url = f'/product/{self.product.pk}/'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'HIT')
+
+        related.name = 'Fast charger'
+        related.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertContains(response, 'Fast charger')
+
+
+class MediaTestCase(TestCase):
+    """
+    Base for tests that store files: each test gets an empty temporary
+    MEDIA_ROOT, images are processed inline, and upload()/add_product()
+    create images and products using them
+    """
+
+    def media_settings(self):
+        """
+        Extra settings for each test; may use self.media_root
+        """
+        return {}
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_PIPELINE_WORKERS=0,
+                                              **self.media_settings())
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+        self.category = Category.objects.create(name='Electronics')
+
+    def upload(self, size=(500, 250), color=(0, 0, 0), mode='RGB', fmt='JPEG', name='photo.jpg'):
+        buffer = io.BytesIO()
+        Image.new(mode, size, color).save(buffer, fmt)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def add_product(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name='Camera', description='A camera', price=Decimal('10.00'),
+                category=self.category, stock=1, vendor=self.vendor, image=image
+            )
+        product.refresh_from_db()
+        return product
+
+
+class ProductImageTests(MediaTestCase):
+    """
+    Tests for the product image derivative pipeline
+    """
+
+    def test_upload_generates_capped_variants(self):
+        product = self.add_product(self.upload())
+        variants = product.image_variants
+
+        self.assertEqual(variants['source'], product.image.name)
+        self.assertEqual(variants['fallback'], 'jpeg')
+        self.assertEqual([width for width, path in variants['webp']], [160, 320, 500])
+        width, path = variants['webp'][0]
+        self.assertRegex(path, r'^products/derived/[0-9a-f]{16}-160\.webp$')
+        with Image.open(f'{self.media_root}/{path}') as derived:
+            self.assertEqual((derived.format, derived.size), ('WEBP', (160, 80)))
+        self.assertTrue(product.card_image_url.endswith('-320.jpg'))
+        self.assertIn('500w', product.webp_srcset)
+
+    def test_transparent_image_falls_back_to_png(self):
+        product = self.add_product(self.upload(mode='RGBA', fmt='PNG', name='logo.png'))
+        self.assertEqual(product.image_variants['fallback'], 'png')
+        self.assertTrue(product.image_srcset.endswith('500w'))
+
+    def test_same_bytes_reuse_derivatives(self):
+        first = self.add_product(self.upload())
+        second = self.add_product(self.upload())
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants['webp'], second.image_variants['webp'])
+
+    def test_stale_manifest_is_not_stored(self):
+        product = self.add_product(self.upload())
+        manifest = images.generate_variants(product.image.name)
+        Product.objects.filter(pk=product.pk).update(image='products/other.jpg')
+        self.assertFalse(images.store_manifest(product.pk, manifest))
+
+    def test_original_served_until_variants_exist(self):
+        product = Product.objects.create(
+            name='Camera', description='A camera', price=Decimal('10.00'),
+            category=self.category, stock=1, vendor=self.vendor, image=self.upload()
+        )
+        self.assertEqual(product.card_image_url, product.image.url)
+        self.assertEqual(product.webp_srcset, '')
+
+
+class ResizeImageTests(MediaTestCase):
+    """
+    Tests for the on-demand resize endpoint
+    """
+
+    def media_settings(self):
+        self.cache_dir = os.path.join(self.media_root, 'resize-cache')
+        return {'RESIZE_CACHE_DIR': self.cache_dir, 'RESIZE_ALLOWED_SIZES': [(120, 90)]}
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'products'))
+        Image.new('RGB', (600, 400)).save(os.path.join(self.media_root, 'products', 'photo.jpg'))
+        self.url = '/media/resize/120x90/products/photo.jpg'
+
+    def test_resizes_and_caches(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept')
+        with Image.open(io.BytesIO(response.content)) as image:
+            self.assertEqual(image.size, (120, 90))
+
+        with mock.patch('shop.resize._render') as render:
+            cached = self.client.get(self.url, HTTP_ACCEPT='image/webp,*/*')
+            not_modified = self.client.get(self.url, HTTP_ACCEPT='image/webp,*/*',
+                                           HTTP_IF_NONE_MATCH=response['ETag'])
+        render.assert_not_called()
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+        jpeg = self.client.get(self.url)
+        self.assertEqual(jpeg['Content-Type'], 'image/jpeg')
+        self.assertNotEqual(jpeg['ETag'], response['ETag'])
+
+    def test_rejects_unknown_paths_and_sizes(self):
+        for url in ['/media/resize/120x90/products/missing.jpg',
+                    '/media/resize/120x90/products/../products/photo.jpg',
+                    '/media/resize/5000x90/products/photo.jpg',
+                    '/media/resize/121x90/products/photo.jpg',
+                    '/media/resize/0x90/products/photo.jpg']:
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_oversized_original_is_not_rendered(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_concurrent_requests_render_once(self):
+        render = resize._render
+        calls = []
+
+        def slow_render(*args):
+            calls.append(args)
+            time.sleep(0.2)
+            return render(*args)
+
+        key = resize.variant_key('products/photo.jpg', 120, 90, 'jpeg')
+        results = []
+        with mock.patch('shop.resize._render', side_effect=slow_render):
+            threads = [
+                threading.Thread(target=lambda: results.append(
+                    resize.get_variant('products/photo.jpg', 120, 90, 'jpeg', key)))
+                for _ in range(5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(results), 5)
+
+    def test_least_recently_used_evicted(self):
+        keys = []
+        for size in [100, 110, 120]:
+            key = resize.variant_key('products/photo.jpg', size, size, 'jpeg')
+            resize.get_variant('products/photo.jpg', size, size, 'jpeg', key)
+            keys.append(key)
+        # The middle one was used longest ago
+        os.utime(os.path.join(self.cache_dir, keys[1]), (0, 0))
+        kept = sum(os.path.getsize(os.path.join(self.cache_dir, key)) for key in (keys[0], keys[2]))
+
+        with override_settings(RESIZE_CACHE_MAX_BYTES=int(kept / 0.9) + 1):
+            resize._account(0)
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), sorted([keys[0], keys[2]]))
+
+
+class MediaBlobTests(MediaTestCase):
+    """
+    Tests for content-addressed product images and their garbage collection
+    """
+
+    def refs(self):
+        return dict(MediaBlob.objects.values_list('name', 'ref_count'))
+
+    def test_identical_uploads_stored_once(self):
+        first = self.add_product(self.upload(name='Stock Photo.JPG'))
+        second = self.add_product(self.upload(name='Stock Photo.JPG'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^products/([0-9a-f]{2})/\1[0-9a-f]{62}\.jpg$')
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory), [os.path.basename(first.image.path)])
+        self.assertEqual(self.refs(), {first.image.name: 2})
+
+    def test_references_follow_image_changes(self):
+        shared = self.add_product(self.upload()).image.name
+        product = self.add_product(self.upload())
+        product.image = self.upload(color=(255, 0, 0))
+        product.save()
+        self.assertEqual(self.refs(), {shared: 1, product.image.name: 1})
+
+        Product.objects.get(pk=product.pk).delete()
+        self.assertEqual(self.refs()[product.image.name], 0)
+
+    def test_gc_deletes_only_unreferenced_files(self):
+        kept = self.add_product(self.upload())
+        dropped = self.add_product(self.upload(color=(255, 0, 0)))
+        dropped_path = dropped.image.path
+        dropped.delete()
+        orphan = os.path.join(self.media_root, 'products', 'leftover.jpg')
+        with open(orphan, 'wb') as out:
+            out.write(b'x')
+
+        call_command('gc_media', grace_hours=0, stdout=io.StringIO())
+
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertFalse(os.path.exists(dropped_path))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(self.refs(), {kept.image.name: 1})
+
+    def test_upload_claims_blob_waiting_for_gc(self):
+        product = self.add_product(self.upload())
+        name, path = product.image.name, product.image.path
+        product.delete()
+        MediaBlob.objects.filter(name=name).update(updated_at=timezone.now() - datetime.timedelta(days=2))
+
+        # Same bytes uploaded again, before the product using them is saved
+        self.assertEqual(product_image_storage.save('products/again.jpg', self.upload()), name)
+        call_command('gc_media', stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+
+        # A file already collected is written again
+        os.remove(path)
+        product_image_storage.save('products/again.jpg', self.upload())
+        self.assertTrue(os.path.exists(path))
+
+    def test_gc_rechecks_blob_before_deleting(self):
+        product = self.add_product(self.upload())
+        path = product.image.path
+        product.delete()
+        scan = QuerySet.iterator
+
+        def upload_after_scan(queryset, *args, **kwargs):
+            for obj in scan(queryset, *args, **kwargs):
+                if isinstance(obj, MediaBlob):
+                    product_image_storage.save('products/again.jpg', self.upload())
+                yield obj
+
+        with mock.patch.object(QuerySet, 'iterator', upload_after_scan):
+            call_command('gc_media', grace_hours=0, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+
+class ProductImportTests(TestCase):
+    """
+    Tests for bulk product import
+    """
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Electronics')
+        self.other = Category.objects.create(name='Books')
+        self.vendor = User.objects.create_user('vendor', password='pass', role='vendor')
+
+    def run_import(self, text, fmt='csv', batch_size=importer.DEFAULT_BATCH_SIZE):
+        return importer.import_products(self.vendor, io.BytesIO(text.encode()), fmt, batch_size)
+
+    def test_creates_updates_and_skips_unchanged(self):
+        Product.objects.create(name='Lamp', description='Desk lamp', price=Decimal('20.00'),
+                               category=self.category, stock=5, vendor=self.vendor)
+        Product.objects.create(name='Cable', description='USB cable', price=Decimal('5.00'),
+                               category=self.category, stock=50, vendor=self.vendor)
+        result = self.run_import(
+            'name,description,price,category,stock\n'
+            'Lamp,Desk lamp,20,electronics,5\n'
+            'Cable,USB cable,4.50,Electronics,50\n'
+            'Novel,A novel,12.99,Books,3\n'
+            'Phone,A phone,-,Electronics,2\n'
+            'Radio,A radio,30,Toys,1\n'
+        )
+
+        self.assertEqual((result['created'], result['updated'], result['unchanged'], result['failed']), (1, 1, 1, 2))
+        self.assertEqual([line for line, message in result['errors']], [5, 6])
+        self.assertIn('Unknown category', result['errors'][1][1])
+        self.assertEqual(Product.objects.get(name='Cable').price, Decimal('4.50'))
+        self.assertEqual(Product.objects.get(name='Novel').category, self.other)
+        self.assertEqual(VendorStats.objects.get(vendor=self.vendor).product_count, 3)
+        self.assertEqual(search.search('novel').get().name, 'Novel')
+
+    def jsonl(self, count, stock=0):
+        return ''.join(
+            f'{{"name": "Item {i}", "description": "d", "price": 1, "category": "Books", "stock": {stock}}}\n'
+            for i in range(count)
+        )
+
+    def import_queries(self, rows, batch_size):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.run_import(rows, 'jsonl', batch_size=batch_size)
+        return result, len(queries)
+
+    def test_writes_in_batches(self):
+        VendorStats.refresh_products(self.vendor.pk)
+        # Category map up front; vendor counts at the end (aggregate, savepoint,
+        # select, update, release)
+        fixed = 1 + 5
+        # Per batch: lookup, savepoint, insert, two search statements, release,
+        # plus one UPDATE when rows changed; never one query per row
+        created_batch, mixed_batch = 6, 7
+
+        result, queries = self.import_queries(self.jsonl(10), batch_size=5)
+        self.assertEqual(result['created'], 10)
+        self.assertEqual(queries, fixed + 2 * created_batch)
+        result, queries = self.import_queries(self.jsonl(20, stock=1), batch_size=20)
+        self.assertEqual((result['created'], result['updated']), (10, 10))
+        self.assertEqual(queries, fixed + mixed_batch)
+
+        # Nothing changed: categories, then one lookup per batch and no writes
+        result, queries = self.import_queries(self.jsonl(20, stock=1), batch_size=5)
+        self.assertEqual(result['unchanged'], 20)
+        self.assertEqual(queries, 1 + 4)
+        self.assertEqual(search.search('item').count(), 20)
+
+    def test_rejects_files_without_required_columns(self):
+        with self.assertRaises(importer.ImportFileError):
+            self.run_import('name,price\nLamp,20\n')
+
+    def test_vendor_upload(self):
+        self.client.login(username='vendor', password='pass')
+        upload = SimpleUploadedFile('catalog.csv', b'name,description,price,category,stock\nLamp,Desk lamp,20,Electronics,5\n')
+        response = self.client.post('/dashboard/import-products/', {'file': upload})
+
+        self.assertRedirects(response, '/dashboard/', fetch_redirect_response=False)
+        self.assertTrue(Product.objects.filter(vendor=self.vendor, name='Lamp').exists())
+
+    @override_settings(PRODUCT_IMPORT_MAX_UPLOAD_BYTES=64)
+    def test_vendor_upload_size_capped(self):
+        self.client.login(username='vendor', password='pass')
+        upload = SimpleUploadedFile('catalog.csv', b'name,description,price,category,stock\n' + b'Lamp,Desk lamp,20,Electronics,5\n' * 3)
+        self.client.post('/dashboard/import-products/', {'file': upload})
+
+        self.assertFalse(Product.objects.exists())
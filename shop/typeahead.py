@@ -0,0 +1,223 @@
+"""
+In-process typeahead index for the /search/ endpoint.
+
+Each worker keeps sorted arrays of (key, product_id) pairs over active product
+names and their words, and answers prefix lookups with bisect. The index is
+built on first use, refreshed incrementally from a Product.updated_at
+watermark and rebuilt from scratch periodically to drop deleted products
+that other workers removed. Products saved or deleted in this worker are
+applied at once through the Product signals.
+"""
+import bisect
+import heapq
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Product
+from .search import tokenize
+
+
+MAX_CANDIDATES = 1000
+
+
+class TypeaheadIndex:
+    """
+    Prefix index over active product names
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (sorted (name, id) keys, sorted (word, id) keys, id -> suggestion),
+        # swapped as one tuple so readers never need the lock
+        self._state = ([], [], {})
+        self._watermark = None
+        self._built_at = None
+        self._refreshed_at = 0.0
+
+    @staticmethod
+    def _entry(product):
+        return {
+            'id': product.id,
+            'name': product.name,
+            'price': str(product.price),
+            'image': product.thumbnail_url,
+            'image_srcset': product.webp_srcset,
+        }
+
+    @staticmethod
+    def _keys(product):
+        name = product.name.lower()
+        names = [(name, product.id)]
+        terms = [(term, product.id) for term in set(tokenize(name))]
+        return names, terms
+
+    def _products(self):
+        return Product.objects.only('id', 'name', 'price', 'image', 'image_variants', 'is_active', 'updated_at')
+
+    def _build(self):
+        names, terms, entries = [], [], {}
+        watermark = None
+        for product in self._products().filter(is_active=True).iterator(chunk_size=2000):
+            product_names, product_terms = self._keys(product)
+            names.extend(product_names)
+            terms.extend(product_terms)
+            entries[product.id] = self._entry(product)
+            if watermark is None or product.updated_at > watermark:
+                watermark = product.updated_at
+        names.sort()
+        terms.sort()
+
+        self._state = (names, terms, entries)
+        self._watermark = watermark
+        self._built_at = self._refreshed_at = time.monotonic()
+
+    def _apply(self, changed):
+        """Replace the given products' keys; inactive ones are dropped"""
+        names, terms, entries = self._state
+        changed_ids = {product.id for product in changed}
+        entries = {pk: entry for pk, entry in entries.items() if pk not in changed_ids}
+        new_names, new_terms = [], []
+        for product in changed:
+            if not product.is_active:
+                continue
+            product_names, product_terms = self._keys(product)
+            new_names.extend(product_names)
+            new_terms.extend(product_terms)
+            entries[product.id] = self._entry(product)
+
+        # Merge the sorted survivors with the sorted changes
+        names = list(heapq.merge(
+            [key for key in names if key[1] not in changed_ids], sorted(new_names)))
+        terms = list(heapq.merge(
+            [key for key in terms if key[1] not in changed_ids], sorted(new_terms)))
+        self._state = (names, terms, entries)
+
+    def _refresh(self):
+        changed = self._products()
+        if self._watermark is not None:
+            # Re-read the boundary timestamp so rows committed late are not missed
+            changed = changed.filter(updated_at__gte=self._watermark)
+        changed = list(changed)
+
+        self._refreshed_at = time.monotonic()
+        if not changed:
+            return
+        self._apply(changed)
+        latest = max(product.updated_at for product in changed)
+        if self._watermark is None or latest > self._watermark:
+            self._watermark = latest
+
+    def build(self):
+        """Load every active product into a fresh index"""
+        with self._lock:
+            self._build()
+
+    def refresh(self):
+        """Apply products changed since the watermark"""
+        with self._lock:
+            self._refresh()
+
+    def update(self, product):
+        """
+        Apply a product saved by this worker right away. The watermark stays
+        put, so changes committed elsewhere in the meantime are still found
+        by the next refresh.
+        """
+        with self._lock:
+            if self._built_at is not None:
+                self._apply([product])
+
+    def discard(self, product_id):
+        """Drop a deleted product from this worker's index"""
+        with self._lock:
+            names, terms, entries = self._state
+            if product_id in entries:
+                self._state = (
+                    [key for key in names if key[1] != product_id],
+                    [key for key in terms if key[1] != product_id],
+                    {pk: entry for pk, entry in entries.items() if pk != product_id},
+                )
+
+    def _stale(self):
+        """'build', 'refresh' or None"""
+        now = time.monotonic()
+        if self._built_at is None or now - self._built_at > getattr(settings, 'TYPEAHEAD_REBUILD_SECONDS', 3600):
+            return 'build'
+        if now - self._refreshed_at > getattr(settings, 'TYPEAHEAD_REFRESH_SECONDS', 30):
+            return 'refresh'
+        return None
+
+    def ensure_fresh(self):
+        """
+        Build or refresh the index if due. Only one thread does the work:
+        the others keep answering from the current state, or wait for the
+        first build when there is none yet.
+        """
+        if self._stale() is None:
+            return
+        if not self._lock.acquire(blocking=self._built_at is None):
+            return
+        try:
+            # Re-check: another thread may have finished it while we waited
+            stale = self._stale()
+            if stale == 'build':
+                self._build()
+            elif stale == 'refresh':
+                self._refresh()
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _prefix_ids(keys, prefix):
+        start = bisect.bisect_left(keys, (prefix,))
+        for key, product_id in keys[start:start + MAX_CANDIDATES]:
+            if not key.startswith(prefix):
+                break
+            yield product_id
+
+    def suggest(self, query, limit=10):
+        """
+        Return up to limit suggestions whose name starts with the query,
+        followed by names where every query word prefixes a name word
+        """
+        self.ensure_fresh()
+        names, terms, entries = self._state
+
+        query = ' '.join(query.lower().split())
+        results = []
+        seen = set()
+        for product_id in self._prefix_ids(names, query):
+            if product_id not in seen:
+                seen.add(product_id)
+                results.append(entries[product_id])
+                if len(results) >= limit:
+                    return results
+
+        query_terms = tokenize(query)
+        if not query_terms:
+            return results
+        # Scan the most selective (longest) word and check the others per candidate
+        anchor = max(query_terms, key=len)
+        others = [term for term in query_terms if term != anchor]
+        matches = []
+        for product_id in self._prefix_ids(terms, anchor):
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            entry = entries[product_id]
+            if others:
+                words = tokenize(entry['name'])
+                if not all(any(word.startswith(term) for word in words) for term in others):
+                    continue
+            matches.append(entry)
+        matches.sort(key=lambda entry: entry['name'].lower())
+        return results + matches[:limit - len(results)]
+
+
+index = TypeaheadIndex()
+
+
+def suggest(query, limit=10):
+    return index.suggest(query, limit)
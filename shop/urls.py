@@ -24,4 +24,7 @@ urlpatterns = [
     
     # AJAX endpoints
     path('search/', views.search_products, name='search'),
+    
+    # Images resized on demand
+    path('media/resize/<int:width>x<int:height>/<path:path>', views.resize_image, name='resize_image'),
 ] 
\ No newline at end of file
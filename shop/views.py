@@ -1,17 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
-from django.db.models import Q
-from django.db import transaction
-from django.core.paginator import Paginator
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, Http404
+from django.views.decorators.http import require_http_methods, require_GET
+from django.db.models import Prefetch
 import json
-from .models import Category, Product, CartItem, Order, OrderItem, Contact
-from accounts.models import WalletTransaction, MarketplaceWallet, MarketplaceTransaction
-from decimal import Decimal
+from accounts.models import Wallet
+from .models import Category, Product, CartItem, Order, OrderItem, Contact, ProductRecommendation
+from .search import search
+from .pagination import get_keyset_page
+from .cache import cache_anonymous_page, add_page_tags
+from .cart import add_item, set_cart_count, adjust_cart_count
+from .checkout import place_order, CheckoutError
+from . import typeahead, resize
 
 
+# Item thumbnails shown per order in the order history
+ORDER_PREVIEW_ITEMS = 4
+
+
+@cache_anonymous_page(['catalog'])
 def home(request):
     """
     Home page view with featured products
@@ -25,6 +33,7 @@ def home(request):
     })
 
 
+@cache_anonymous_page()
 def about_us(request):
     """
     About Us page
@@ -32,6 +41,7 @@ def about_us(request):
     return render(request, 'shop/about_us.html')
 
 
+@cache_anonymous_page()
 def contact_us(request):
     """
     Contact Us page
@@ -62,6 +72,7 @@ def contact_us(request):
     return render(request, 'shop/contact_us.html')
 
 
+@cache_anonymous_page(['catalog'])
 def product_list(request):
     """
     Product listing with search and filtering
@@ -69,23 +80,21 @@ def product_list(request):
     products = Product.objects.filter(is_active=True)
     categories = Category.objects.all()
     
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
-    
     # Category filtering
     category_id = request.GET.get('category', '')
     if category_id:
         products = products.filter(category_id=category_id)
     
+    # Search functionality (ranked, best matches first)
+    search_query = request.GET.get('search', '')
+    if search_query:
+        products = search(search_query, products)
+        page_keys = ('search_rank', 'id')
+    else:
+        page_keys = ('-created_at', '-id')
+    
     # Pagination
-    paginator = Paginator(products, 12)  # 12 products per page
-    page_number = request.GET.get('page')
-    products = paginator.get_page(page_number)
+    products = get_keyset_page(request, products, 12, keys=page_keys)  # 12 products per page
     
     return render(request, 'shop/products.html', {
         'products': products,
@@ -95,15 +104,29 @@ def product_list(request):
     })
 
 
+@cache_anonymous_page(lambda request, product_id: [f'product:{product_id}', 'categories', 'recommendations'])
 def product_detail(request, product_id):
     """
     Individual product detail view
     """
     product = get_object_or_404(Product, id=product_id, is_active=True)
-    related_products = Product.objects.filter(
-        category=product.category, 
-        is_active=True
-    ).exclude(id=product.id)[:4]
+    
+    # Customers also bought (precomputed by build_recommendations)
+    recommendations = ProductRecommendation.objects.filter(
+        product=product,
+        recommended__is_active=True
+    ).select_related('recommended')[:4]
+    related_products = [recommendation.recommended for recommendation in recommendations]
+    
+    # Fall back to the same category for products nobody has bought yet
+    if not related_products:
+        related_products = list(Product.objects.filter(
+            category=product.category, 
+            is_active=True
+        ).exclude(id=product.id)[:4])
+    
+    # Renaming or deactivating a related product must refresh this page too
+    add_page_tags(request, [f'product:{related.id}' for related in related_products])
     
     return render(request, 'shop/product_detail.html', {
         'product': product,
@@ -118,47 +141,23 @@ def add_to_cart(request):
     """
     try:
         data = json.loads(request.body)
-        product_id = data.get('product_id')
+        product_id = int(data.get('product_id'))
         quantity = int(data.get('quantity', 1))
         
-        product = get_object_or_404(Product, id=product_id, is_active=True)
+        # Guest carts are keyed by session
+        if not request.user.is_authenticated and not request.session.session_key:
+            request.session.create()
         
-        if quantity <= 0 or quantity > product.stock:
+        # Insert or increment in one statement, clamped to stock
+        result = add_item(request, product_id, quantity)
+        if result is None:
+            product = get_object_or_404(Product, id=product_id, is_active=True)
             return JsonResponse({
                 'success': False, 
                 'message': f'Invalid quantity. Available stock: {product.stock}'
             })
         
-        if request.user.is_authenticated:
-            # For logged-in users
-            cart_item, created = CartItem.objects.get_or_create(
-                user=request.user,
-                product=product,
-                defaults={'quantity': quantity}
-            )
-            if not created:
-                cart_item.quantity += quantity
-                if cart_item.quantity > product.stock:
-                    cart_item.quantity = product.stock
-                cart_item.save()
-        else:
-            # For guest users using session
-            if not request.session.session_key:
-                request.session.create()
-            
-            cart_item, created = CartItem.objects.get_or_create(
-                session_key=request.session.session_key,
-                product=product,
-                defaults={'quantity': quantity}
-            )
-            if not created:
-                cart_item.quantity += quantity
-                if cart_item.quantity > product.stock:
-                    cart_item.quantity = product.stock
-                cart_item.save()
-        
-        # Get cart count
-        cart_count = get_cart_count(request)
+        quantity_in_cart, cart_count = result
         
         return JsonResponse({
             'success': True,
@@ -166,21 +165,10 @@ def add_to_cart(request):
             'cart_count': cart_count
         })
         
-    except (json.JSONDecodeError, ValueError, Product.DoesNotExist):
+    except (json.JSONDecodeError, ValueError, TypeError):
         return JsonResponse({'success': False, 'message': 'Invalid request'})
 
 
-def get_cart_count(request):
-    """
-    Helper function to get cart item count
-    """
-    if request.user.is_authenticated:
-        return CartItem.objects.filter(user=request.user).count()
-    elif request.session.session_key:
-        return CartItem.objects.filter(session_key=request.session.session_key).count()
-    return 0
-
-
 @login_required
 def cart_view(request):
     """
@@ -210,6 +198,7 @@ def update_cart_item(request):
         
         if quantity <= 0:
             cart_item.delete()
+            adjust_cart_count(request, -1)
         else:
             if quantity > cart_item.product.stock:
                 quantity = cart_item.product.stock
@@ -242,117 +231,29 @@ def checkout(request):
         messages.error(request, 'Only users can make purchases.')
         return redirect('shop:home')
     
-    cart_items = CartItem.objects.filter(user=request.user)
-    if not cart_items:
-        messages.warning(request, 'Your cart is empty.')
-        return redirect('shop:cart')
-    
-    total_amount = sum(item.get_total_price() for item in cart_items)
-    wallet = request.user.wallet
-    
     if request.method == 'POST':
         shipping_address = request.POST.get('shipping_address', request.user.address)
         
-        if not wallet.can_deduct(total_amount):
-            messages.error(request, f'Insufficient wallet balance. Required: ${total_amount}, Available: ${wallet.balance}')
-            return redirect('shop:checkout')
-        
-        # Check stock availability
-        for item in cart_items:
-            if item.quantity > item.product.stock:
-                messages.error(request, f'Insufficient stock for {item.product.name}. Available: {item.product.stock}')
-                return redirect('shop:cart')
-        
         try:
-            with transaction.atomic():
-                # Create order
-                order = Order.objects.create(
-                    user=request.user,
-                    total_amount=total_amount,
-                    shipping_address=shipping_address,
-                    status='confirmed'
-                )
-                
-                # Create order items and update stock
-                for item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        product=item.product,
-                        quantity=item.quantity,
-                        price=item.product.price
-                    )
-                    
-                    # Reduce product stock
-                    item.product.reduce_stock(item.quantity)
-                
-                # Deduct money from user wallet
-                wallet.deduct_money(total_amount)
-                
-                # Create user wallet transaction
-                WalletTransaction.objects.create(
-                    wallet=wallet,
-                    transaction_type='debit',
-                    amount=total_amount,
-                    description=f'Purchase - Order {order.order_id}'
-                )
-                
-                # Transfer money to vendor wallets
-                vendor_payments = {}
-                for item in cart_items:
-                    vendor = item.product.vendor
-                    item_total = item.get_total_price()
-                    
-                    if vendor in vendor_payments:
-                        vendor_payments[vendor] += item_total
-                    else:
-                        vendor_payments[vendor] = item_total
-                
-                # Process vendor payments with marketplace commission
-                marketplace_wallet = MarketplaceWallet.get_instance()
-                total_commission = Decimal('0.00')
-                
-                for vendor, gross_amount in vendor_payments.items():
-                    # Calculate commission (8% to marketplace, 92% to vendor)
-                    commission_info = marketplace_wallet.calculate_commission(gross_amount)
-                    commission_amount = commission_info['commission']
-                    vendor_net_amount = commission_info['vendor_amount']
-                    
-                    # Add net amount to vendor wallet
-                    vendor_wallet = vendor.wallet
-                    vendor_wallet.add_money(vendor_net_amount)
-                    
-                    # Create vendor wallet transaction (net amount after commission)
-                    WalletTransaction.objects.create(
-                        wallet=vendor_wallet,
-                        transaction_type='credit',
-                        amount=vendor_net_amount,
-                        description=f'Sale - Order {order.order_id} (Net: ${vendor_net_amount}, Commission: ${commission_amount})'
-                    )
-                    
-                    # Add commission to marketplace wallet
-                    marketplace_wallet.add_commission(commission_amount)
-                    
-                    # Create marketplace commission transaction record
-                    MarketplaceTransaction.objects.create(
-                        marketplace_wallet=marketplace_wallet,
-                        transaction_type='commission',
-                        amount=commission_amount,
-                        description=f'Commission from Order {order.order_id} (8%)',
-                        related_order_id=str(order.order_id),
-                        vendor_username=vendor.username
-                    )
-                    
-                    total_commission += commission_amount
-                
-                # Clear cart
-                cart_items.delete()
-                
-                messages.success(request, f'Order placed successfully! Order ID: {order.order_id}')
-                return redirect('shop:order_confirmation', order_id=order.order_id)
-                
+            order = place_order(request.user, shipping_address)
+        except CheckoutError as e:
+            messages.error(request, str(e))
+            return redirect(e.redirect_to)
         except Exception as e:
             messages.error(request, 'An error occurred while processing your order.')
             return redirect('shop:checkout')
+        
+        set_cart_count(request, 0)
+        messages.success(request, f'Order placed successfully! Order ID: {order.order_id}')
+        return redirect('shop:order_confirmation', order_id=order.order_id)
+    
+    cart_items = CartItem.objects.filter(user=request.user).select_related('product')
+    if not cart_items:
+        messages.warning(request, 'Your cart is empty.')
+        return redirect('shop:cart')
+    
+    total_amount = sum(item.get_total_price() for item in cart_items)
+    wallet = Wallet.objects.for_user(request.user)
     
     return render(request, 'shop/checkout.html', {
         'cart_items': cart_items,
@@ -379,7 +280,12 @@ def order_list(request):
         messages.error(request, 'Access denied.')
         return redirect('dashboard:home')
     
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
+    # First few lines of each order for the thumbnails; counts come from the order row
+    preview_items = OrderItem.objects.select_related('product').order_by('pk')[:ORDER_PREVIEW_ITEMS]
+    orders = Order.objects.filter(user=request.user).order_by('-created_at').prefetch_related(
+        Prefetch('items', queryset=preview_items, to_attr='preview_items')
+    )
+    orders = get_keyset_page(request, orders, 10)
     
     return render(request, 'shop/orders.html', {'orders': orders})
 
@@ -395,22 +301,43 @@ def order_detail(request, order_id):
 
 def search_products(request):
     """
-    AJAX product search endpoint
+    AJAX product search endpoint (typeahead suggestions)
     """
     query = request.GET.get('q', '').strip()
     results = []
     
     if query and len(query) >= 2:
-        products = Product.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query),
-            is_active=True
-        )[:10]
-        
-        results = [{
-            'id': product.id,
-            'name': product.name,
-            'price': str(product.price),
-            'image': product.image.url if product.image else None
-        } for product in products]
+        # Served from the in-process prefix index, no database round trip
+        results = typeahead.suggest(query, limit=10)
     
     return JsonResponse({'results': results})
+
+
+@require_GET
+def resize_image(request, width, height, path):
+    """
+    Product image cropped to width x height, rendered on first request and
+    then served from the disk cache
+    """
+    try:
+        resize.validate(width, height, path)
+        fmt = resize.pick_format(path, request.headers.get('Accept'))
+        key = resize.variant_key(path, width, height, fmt)
+        etag = f'"{key}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(resize.get_variant(path, width, height, fmt, key),
+                                    content_type=resize.FORMATS[fmt][1])
+    except resize.ResizeBusy:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '1'
+        return response
+    except resize.ResizeError:
+        raise Http404('Image not available')
+
+    # The URL names a fixed rendition of a fixed original, so it never changes
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['Vary'] = 'Accept'
+    return response
@@ -320,8 +320,11 @@ function displaySearchResults(results) {
             <div class="search-result-item p-2">
                 <a href="/shop/product/${product.id}/" class="text-decoration-none">
                     <div class="d-flex align-items-center">
-                        <img src="${product.image || '/static/images/placeholder.jpg'}" 
-                             alt="${product.name}" class="me-2" style="width: 40px; height: 40px; object-fit: cover;">
+                        <picture>
+                            ${product.image_srcset ? `<source type="image/webp" srcset="${product.image_srcset}" sizes="40px">` : ''}
+                            <img src="${product.image || '/static/images/placeholder.jpg'}" 
+                                 alt="${product.name}" class="me-2" style="width: 40px; height: 40px; object-fit: cover;">
+                        </picture>
                         <div>
                             <div class="fw-bold">${product.name}</div>
                             <div class="text-muted small">$${product.price}</div>
@@ -50,7 +50,7 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -101,6 +101,36 @@ else:
         }
     }
 
+# Cache
+# Set REDIS_URL in production so page cache invalidations reach every worker
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Anonymous full-page cache lifetime in seconds (see shop.cache)
+PAGE_CACHE_TIMEOUT = 300
+
+# Seconds a user's identity fields stay in the shared cache (see
+# accounts.middleware); AUTH_USER_CACHE = True/False forces it on or off
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Admin dashboard KPI snapshot (see dashboard.kpis): age in seconds after which
+# a background refresh starts, and how long a refresh may hold its lock
+KPI_SNAPSHOT_MAX_AGE = 60
+KPI_REFRESH_LOCK_TIMEOUT = 300
+# How long a request waits for another one computing a missing snapshot
+KPI_COLD_WAIT_SECONDS = 2
+
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
 
@@ -168,4 +198,31 @@ LOGOUT_REDIRECT_URL = '/'
 
 # Session settings
 SESSION_COOKIE_AGE = 86400  # 24 hours
+# Sessions live in the cache and are written to the database only when their
+# data changes or the stored expiry is older than SESSION_FLUSH_THRESHOLD of
+# SESSION_COOKIE_AGE (see accounts.sessions)
+SESSION_ENGINE = 'accounts.sessions'
 SESSION_SAVE_EVERY_REQUEST = True
+SESSION_FLUSH_THRESHOLD = 0.1
+
+# Search settings
+# SEARCH_BACKEND = 'shop.search.PostgresSearchBackend'  # Defaults to the database vendor
+SEARCH_RESULT_LIMIT = 500
+
+# Typeahead index refresh intervals (per worker)
+TYPEAHEAD_REFRESH_SECONDS = 30
+TYPEAHEAD_REBUILD_SECONDS = 3600
+
+# Worker processes resizing product images (0 resizes inline after commit)
+IMAGE_PIPELINE_WORKERS = 2
+
+# On-demand resizes (/media/resize/<w>x<h>/<path>), LRU-evicted past the cap
+RESIZE_CACHE_DIR = BASE_DIR / 'resize_cache'
+RESIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Only these (width, height) boxes are rendered; keep in step with the
+# sizes templates request through Product.resized_image_url
+RESIZE_ALLOWED_SIZES = [(160, 160)]
+
+# Largest catalog file vendors may import through the dashboard; bigger files
+# go through manage.py import_products, outside the request cycle
+PRODUCT_IMPORT_MAX_UPLOAD_BYTES = 5 * 1024 * 1024